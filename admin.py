@@ -1,15 +1,18 @@
 import webapp2
-import jinja2
-import os
 import json
 import logging
+import datetime
 from urllib import quote, urlencode
 from google.appengine.api import urlfetch
 
 import configuration
+import defaults
+import http_client
+import caches
+import templates
+import circuit_breaker
 
-jinja_environment = jinja2.Environment(
-    loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), "template")))
+jinja_environment = templates.build_environment()
 
 class ConfigurationPage(webapp2.RequestHandler):
 	def get(self):
@@ -30,5 +33,30 @@ class ConfigurationPage(webapp2.RequestHandler):
 		return webapp2.redirect('/admin/configuration')
 		
 
-app = webapp2.WSGIApplication([('/admin/configuration', ConfigurationPage)],
+def circuits():
+	upstreams = sorted(defaults.UPSTREAMS.keys())
+	local_states = http_client.circuit_states()
+	published = circuit_breaker.published_snapshots(upstreams)
+
+	for snapshot in published.values():
+		if snapshot:
+			snapshot['changed'] = datetime.datetime.utcfromtimestamp(snapshot['changed_at']).strftime('%Y-%m-%d %H:%M:%S UTC')
+
+	return [(upstream, local_states.get(upstream), published.get(upstream)) for upstream in upstreams]
+
+class UpstreamsPage(webapp2.RequestHandler):
+	def get(self):
+		template = jinja_environment.get_template('admin/upstreams.html')
+
+		template_values = {
+			'host_stats': sorted(http_client.host_stats().items()),
+			'cache_stats': caches.cache.stats(),
+			'circuits': circuits(),
+		}
+
+		self.response.out.write(template.render(template_values))
+
+
+app = webapp2.WSGIApplication([('/admin/configuration', ConfigurationPage),
+                               ('/admin/upstreams', UpstreamsPage)],
                               debug=True)
\ No newline at end of file
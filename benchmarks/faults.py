@@ -0,0 +1,75 @@
+"""
+Faults the upstream stand-in adds to its responses, and the command line
+options the benchmark scripts take for them and for recording.
+"""
+
+import json
+import random
+import threading
+
+TIMEOUT = 'timeout'
+ERROR = 'error'
+
+class Faults(object):
+	"""
+	Latency, jitter, errors and timeouts to add to the responses of the
+	given upstreams (all of them by default). Latency and jitter are in
+	seconds and the rates are fractions of requests.
+	"""
+	def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, timeout_rate=0.0, upstreams=None, seed=None):
+		self.latency = latency
+		self.jitter = jitter
+		self.error_rate = error_rate
+		self.timeout_rate = timeout_rate
+		self.upstreams = upstreams
+		self.random = random.Random(seed)
+		self.lock = threading.Lock()
+
+	def applies(self, upstream):
+		return self.upstreams is None or upstream in self.upstreams
+
+	def delay(self, upstream):
+		if not self.applies(upstream):
+			return 0.0
+
+		with self.lock:
+			return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+	def fault(self, upstream):
+		if not self.applies(upstream):
+			return None
+
+		with self.lock:
+			chance = self.random.random()
+
+		if chance < self.timeout_rate:
+			return TIMEOUT
+		if chance < self.timeout_rate + self.error_rate:
+			return ERROR
+		return None
+
+
+def add_options(parser):
+	"""
+	Adds the options for faults and recording to an optparse parser.
+	"""
+	parser.add_option('--latency', type='float', default=0, help='milliseconds added to each upstream response')
+	parser.add_option('--jitter', type='float', default=0, help='milliseconds the latency varies by either way')
+	parser.add_option('--errors', type='float', default=0, help='fraction of upstream requests that get a 503')
+	parser.add_option('--timeouts', type='float', default=0, help='fraction of upstream requests that time out')
+	parser.add_option('--faulty', action='append', metavar='UPSTREAM',
+		help='only add faults to this upstream (capi, container, fronts, ophan or discussion); repeatable')
+	parser.add_option('--seed', type='int', help='seed for the faults, to repeat a run exactly')
+	parser.add_option('--record', metavar='CONFIGURATION',
+		help='JSON file of the real upstreams\' configuration; requests without a recording are fetched and saved')
+
+def faults_from(options):
+	return Faults(latency=options.latency / 1000.0, jitter=options.jitter / 1000.0,
+		error_rate=options.errors, timeout_rate=options.timeouts, upstreams=options.faulty, seed=options.seed)
+
+def record_from(options):
+	if not options.record:
+		return None
+
+	with open(options.record) as configuration_file:
+		return json.load(configuration_file)
@@ -0,0 +1,330 @@
+#!/usr/bin/python
+"""
+Drives the renderer with the traffic of a large send: bursts in which
+every version of every email (and the headlines) is scraped, a few times
+each and in random order, while the most shared cron keeps running.
+
+By default the app runs in process against the upstream stand-in (see
+upstreams.py), with --concurrency worker processes each acting as an
+instance: like production, where the app is not threadsafe, each serves
+one request at a time. Each has its own memcache, so page cache hits are
+lower than on a real deployment. With --url the requests go over HTTP to
+a running dev appserver instead, and --stand-in reads the upstream calls
+from serve_upstreams.py.
+
+It reports throughput, a latency histogram, the page cache hit ratio,
+the upstream call rate and the slowest routes.
+
+    python benchmarks/load.py SDK_PATH [--concurrency 8] [--bursts 3] [--repeats 2]
+        [--pause 5] [--cron-interval 10] [--url http://localhost:8080] [--stand-in URL]
+        [--latency MS] [--jitter MS] [--errors RATE] [--timeouts RATE]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import urllib2
+import logging
+import optparse
+import threading
+import multiprocessing
+
+import faults
+import serve_upstreams
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_RECORDINGS = os.path.join(ROOT, 'benchmarks', 'recordings')
+
+CRON_URL = '/most-shared/v1'
+HEADLINE_URLS = ['/headline', '/headline/uk', '/headline/us', '/headline/au', '/headline/film']
+
+# A dev appserver admin, so that renders send their Server-Timing header
+ADMIN_COOKIE = 'dev_appserver_login="load@example.com:True:1"'
+
+HISTOGRAM_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def traffic_urls(app):
+	import render
+	return render.email_urls(app) + HEADLINE_URLS
+
+def with_timing(url):
+	return url + ('&' if '?' in url else '?') + 'timing=1'
+
+def span_names(server_timing):
+	return [metric.split(';')[0].strip() for metric in server_timing.split(',') if metric.strip()]
+
+def page_cache_hit(headers):
+	"""
+	Whether a render was served from the page cache, or None when the
+	response does not say.
+	"""
+	server_timing = headers.get('Server-Timing')
+
+	if not server_timing:
+		return None
+
+	return 'render' not in span_names(server_timing)
+
+
+def in_process_fetcher(app, stub):
+	def fetch(url):
+		stub.reset()
+		response = app.get_response(with_timing(url))
+		return response.status_int, response.headers, sum(stub.calls.values())
+	return fetch
+
+def http_fetcher(base_url):
+	def fetch(url):
+		request = urllib2.Request(base_url.rstrip('/') + with_timing(url), headers={'Cookie': ADMIN_COOKIE})
+		try:
+			response = urllib2.urlopen(request, timeout=60)
+		except urllib2.HTTPError as e:
+			response = e
+		except urllib2.URLError:
+			return 0, {}, None
+
+		response.read()
+		return response.getcode(), response.info(), None
+	return fetch
+
+def work(fetch, tasks, results):
+	"""
+	Fetches urls from the task queue until it is given None, putting a
+	result for each on the result queue, then None.
+	"""
+	while True:
+		task = tasks.get()
+
+		if task is None:
+			tasks.task_done()
+			break
+
+		url, cron = task
+		started = time.time()
+
+		try:
+			status, headers, upstream_calls = fetch(url)
+		except Exception:
+			logging.exception('Could not load %s' % url)
+			status, headers, upstream_calls = 0, {}, None
+
+		results.put({
+			'url': url,
+			'cron': cron,
+			'status': status,
+			'ms': (time.time() - started) * 1000,
+			'hit': page_cache_hit(headers),
+			'upstream_calls': upstream_calls,
+		})
+		tasks.task_done()
+
+	results.put(None)
+
+def start_in_process_workers(sdk_path, options, tasks, results):
+	import render
+
+	logging.getLogger().setLevel(logging.ERROR)
+	app, stub = render.set_up(sdk_path, options)
+	os.environ['USER_IS_ADMIN'] = '1'
+
+	workers = [multiprocessing.Process(target=work, args=(in_process_fetcher(app, stub), tasks, results))
+		for i in range(options.concurrency)]
+	for worker in workers:
+		worker.daemon = True
+		worker.start()
+
+	return app, workers
+
+def start_http_workers(options, tasks, results):
+	workers = [threading.Thread(target=work, args=(http_fetcher(options.url), tasks, results))
+		for i in range(options.concurrency)]
+	for worker in workers:
+		worker.daemon = True
+		worker.start()
+
+	return workers
+
+def http_urls(sdk_path, options):
+	"""
+	The urls to scrape, read from the routes of an app that is loaded but
+	never sent a request.
+	"""
+	import render
+
+	logging.getLogger().setLevel(logging.ERROR)
+	app, stub = render.set_up(sdk_path, options)
+	return traffic_urls(app)
+
+def run_cron(tasks, interval, stop):
+	while True:
+		tasks.put((CRON_URL, True))
+		if stop.wait(interval):
+			break
+
+def drive(tasks, urls, options):
+	"""
+	Queues the bursts of scrapes, waiting for each to finish and pausing
+	between them, with the cron queued every cron interval meanwhile.
+	"""
+	rng = random.Random(options.seed)
+	stop = threading.Event()
+	cron = threading.Thread(target=run_cron, args=(tasks, options.cron_interval, stop))
+	cron.daemon = True
+	cron.start()
+
+	for burst in range(options.bursts):
+		if burst:
+			time.sleep(options.pause)
+
+		batch = urls * options.repeats
+		rng.shuffle(batch)
+		for url in batch:
+			tasks.put((url, False))
+		tasks.join()
+
+	stop.set()
+	cron.join()
+	tasks.join()
+
+def collect(results, workers):
+	collected = []
+	finished = 0
+
+	while finished < workers:
+		result = results.get()
+		if result is None:
+			finished += 1
+		else:
+			collected.append(result)
+
+	return collected
+
+def stand_in_calls(stand_in_url):
+	if not stand_in_url:
+		return None
+
+	stats = json.load(urllib2.urlopen(stand_in_url.rstrip('/') + serve_upstreams.STATS_PATH, timeout=10))
+	return stats['calls']
+
+
+def percentile(values, fraction):
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def histogram(times):
+	bounds = list(HISTOGRAM_BUCKETS_MS) + [None]
+	counts = [0] * len(bounds)
+
+	for ms in times:
+		for index, bound in enumerate(bounds):
+			if bound is None or ms <= bound:
+				counts[index] += 1
+				break
+
+	return zip(bounds, counts)
+
+def route(url):
+	return url if url in HEADLINE_URLS else url.rsplit('/', 1)[0]
+
+def report(results, elapsed, upstream_calls):
+	times = [result['ms'] for result in results]
+	statuses = {}
+	for result in results:
+		statuses[result['status']] = statuses.get(result['status'], 0) + 1
+
+	print '{0} requests in {1:.1f}s: {2:.1f} per second ({3})'.format(len(results), elapsed, len(results) / elapsed,
+		', '.join('{0} x {1}'.format(count, status) for status, count in sorted(statuses.items())))
+	print 'latency ms: p50 {0:.0f}, p95 {1:.0f}, p99 {2:.0f}, max {3:.0f}'.format(percentile(times, 0.5),
+		percentile(times, 0.95), percentile(times, 0.99), max(times))
+	print 'busy instances at this rate: {0:.1f}'.format(sum(times) / 1000 / elapsed)
+
+	widest = max(count for bound, count in histogram(times))
+	for bound, count in histogram(times):
+		label = '<= {0}'.format(bound) if bound else '> {0}'.format(HISTOGRAM_BUCKETS_MS[-1])
+		print '  {0:>9} {1:>6} {2}'.format(label, count, '#' * (50 * count / widest if widest else 0))
+
+	renders = [result['hit'] for result in results if result['hit'] is not None]
+	if renders:
+		print 'page cache hits: {0:.0f}% ({1} of {2} renders)'.format(100.0 * sum(renders) / len(renders),
+			sum(renders), len(renders))
+
+	if upstream_calls is not None:
+		print 'upstream calls: {0}, {1:.1f} per second, {2:.1f} per request'.format(upstream_calls,
+			upstream_calls / elapsed, float(upstream_calls) / len(results))
+
+	cron = [result['ms'] for result in results if result['cron']]
+	if cron:
+		print 'cron ({0}): {1} runs, p50 {2:.0f} ms'.format(CRON_URL, len(cron), percentile(cron, 0.5))
+
+	by_route = {}
+	for result in results:
+		by_route.setdefault(route(result['url']), []).append(result)
+
+	print '\n{0:40} {1:>6} {2:>8} {3:>8} {4:>6}'.format('slowest routes', 'count', 'p50 ms', 'p95 ms', 'hits')
+	rows = []
+	for name, route_results in by_route.items():
+		route_times = [result['ms'] for result in route_results]
+		hits = [result['hit'] for result in route_results if result['hit'] is not None]
+		rows.append((percentile(route_times, 0.95), percentile(route_times, 0.5), name, len(route_results),
+			'{0:.0f}%'.format(100.0 * sum(hits) / len(hits)) if hits else ''))
+
+	for p95, p50, name, count, hits in sorted(rows, reverse=True)[:10]:
+		print '{0:40} {1:>6} {2:>8.0f} {3:>8.0f} {4:>6}'.format(name, count, p50, p95, hits)
+
+def main(sdk_path, options):
+	tasks = multiprocessing.JoinableQueue()
+	results = multiprocessing.Queue()
+
+	if options.url:
+		urls = http_urls(sdk_path, options)
+		workers = start_http_workers(options, tasks, results)
+	else:
+		app, workers = start_in_process_workers(sdk_path, options, tasks, results)
+		urls = traffic_urls(app)
+
+	urls = [url for url in urls if url.startswith(options.only)]
+	calls_before = stand_in_calls(options.stand_in)
+
+	started = time.time()
+	drive(tasks, urls, options)
+	elapsed = time.time() - started
+
+	for worker in workers:
+		tasks.put(None)
+	collected = collect(results, len(workers))
+	for worker in workers:
+		worker.join()
+
+	if options.url:
+		calls_after = stand_in_calls(options.stand_in)
+		upstream_calls = sum(calls_after.values()) - sum(calls_before.values()) if calls_after is not None else None
+	else:
+		upstream_calls = sum(result['upstream_calls'] for result in collected)
+
+	report(collected, elapsed, upstream_calls)
+	return all(result['status'] == 200 for result in collected)
+
+
+if __name__ == '__main__':
+	parser = optparse.OptionParser(usage='%prog SDK_PATH [options]')
+	parser.add_option('-c', '--concurrency', type='int', default=8, help='requests in flight at once')
+	parser.add_option('--bursts', type='int', default=3, help='times every email is scraped')
+	parser.add_option('--repeats', type='int', default=2, help='requests for each url in a burst')
+	parser.add_option('--pause', type='float', default=5, help='seconds between bursts')
+	parser.add_option('--cron-interval', type='float', default=10, help='seconds between runs of the most shared cron')
+	parser.add_option('--only', default='', help='only scrape urls that start with this')
+	parser.add_option('--url', help='base url of a running dev appserver to load instead of running the app in process')
+	parser.add_option('--stand-in', help='base url of serve_upstreams.py, to count upstream calls with --url')
+	parser.add_option('--recordings', default=DEFAULT_RECORDINGS, help='directory of recorded upstream responses')
+	faults.add_options(parser)
+	options, args = parser.parse_args()
+
+	if len(args) != 1:
+		parser.print_help()
+		sys.exit(1)
+
+	if not main(args[0], options):
+		sys.exit(1)
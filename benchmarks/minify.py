@@ -0,0 +1,66 @@
+#!/usr/bin/python
+"""
+Compares the minifier engines on large_test.html from htmlmin's tests and
+every rendered email page in benchmarks/pages (or the pages given on the
+command line). Checks every engine's output is identical to htmlmin's and
+reports throughput in MB/s.
+
+    python benchmarks/minify.py [page.html ...]
+"""
+
+import os
+import sys
+import glob
+import time
+import optparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import minifiers
+
+DEFAULT_PAGES = [os.path.join(ROOT, 'htmlmin', 'tests', 'large_test.html')] + \
+	sorted(glob.glob(os.path.join(ROOT, 'benchmarks', 'pages', '*.html')))
+
+def read_page(path):
+	with open(path) as page_file:
+		return page_file.read().decode('utf-8')
+
+def throughput(engine, page, repeats):
+	started = time.time()
+	for repeat in range(repeats):
+		minifiers.minify(page, engine)
+	elapsed = time.time() - started
+	return len(page.encode('utf-8')) * repeats / elapsed / (1024 * 1024)
+
+def main(paths, repeats):
+	engines = sorted(minifiers.ENGINES.keys())
+	identical = True
+
+	print '{0:40} {1:>10} {2}'.format('page', 'KB', ' '.join('{0:>10}'.format(engine) for engine in engines))
+
+	for path in paths:
+		page = read_page(path)
+		expected = minifiers.minify(page, 'htmlmin')
+
+		rates = []
+		for engine in engines:
+			if minifiers.minify(page, engine) != expected:
+				print '{0}: {1} output differs from htmlmin'.format(os.path.basename(path), engine)
+				identical = False
+			rates.append(throughput(engine, page, repeats))
+
+		print '{0:40} {1:>10} {2}'.format(os.path.basename(path)[:40],
+			len(page.encode('utf-8')) / 1024,
+			' '.join('{0:>8.2f}MB/s'.format(rate) for rate in rates))
+
+	return identical
+
+
+if __name__ == '__main__':
+	parser = optparse.OptionParser(usage='%prog [page.html ...]')
+	parser.add_option('-n', '--repeats', type='int', default=5, help='times to minify each page')
+	options, args = parser.parse_args()
+
+	if not main(args or DEFAULT_PAGES, options.repeats):
+		sys.exit(1)
@@ -0,0 +1,279 @@
+#!/usr/bin/python
+"""
+Renders every version of every email through EmailTemplate.get against
+recorded upstream responses (see upstreams.py), and reports for each the
+p50 and p95 wall time, upstream calls, bytes decoded and peak memory.
+
+Each email is rendered in a process of its own, so that peak memory is
+its own and every email starts from the same empty caches. An untimed
+render loads the templates first. By default every timed render is cold,
+with memcache and the in-process caches emptied first; with --warm only
+the page cache is bypassed. Upstream latency and errors can be added as
+for serve_upstreams.py.
+
+With --pages it instead saves every email, rendered but not minified, to
+a directory, as the pages minify.py and the minifier tests compare the
+minifier engines on.
+
+    python benchmarks/render.py SDK_PATH [--iterations 5] [--warmups 1] [--warm]
+        [--recordings DIR] [--only PREFIX] [--save BASELINE] [--baseline BASELINE]
+        [--latency MS] [--jitter MS] [--errors RATE] [--timeouts RATE] [--record CONFIGURATION]
+    python benchmarks/render.py SDK_PATH --pages benchmarks/pages [--only PREFIX]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import optparse
+import resource
+
+import faults
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_RECORDINGS = os.path.join(ROOT, 'benchmarks', 'recordings')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'render_baseline.json')
+
+METRICS = ('p50_ms', 'p95_ms', 'calls', 'kb_decoded', 'peak_mb')
+
+def set_up(sdk_path, options):
+	"""
+	Starts App Engine's service stubs with the stand-in answering urlfetch,
+	configures the renderer to use it and imports the app.
+	"""
+	sys.path.insert(0, sdk_path)
+	import dev_appserver
+	dev_appserver.fix_sys_path()
+	sys.path.insert(0, ROOT)
+	sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+	from google.appengine.ext import testbed
+	import upstreams
+
+	bed = testbed.Testbed()
+	bed.activate()
+	bed.setup_env(overwrite=True, app_id='gu-email-renderer',
+		SERVER_SOFTWARE='Google App Engine/benchmark', CURRENT_VERSION_ID='benchmark.1')
+	bed.init_memcache_stub()
+	bed.init_datastore_v3_stub()
+	bed.init_taskqueue_stub()
+	bed.init_urlfetch_stub()
+	stub = upstreams.install(upstreams.Recordings(options.recordings),
+		faults=faults.faults_from(options), record_from=faults.record_from(options))
+
+	import configuration
+	for key, value in upstreams.CONFIGURATION.items():
+		configuration.write(key, value)
+
+	import mail_renderer
+	return mail_renderer.app, stub
+
+def email_urls(app):
+	import webapp2
+	import handlers
+
+	urls = []
+	for route in app.router.match_routes:
+		handler = getattr(route, 'handler', None)
+		if isinstance(route, webapp2.SimpleRoute) and isinstance(handler, type) and issubclass(handler, handlers.EmailTemplate):
+			urls.extend(route.template.replace('(.+)', version) for version in handler.recognized_versions)
+	return urls
+
+def clear_caches():
+	from google.appengine.api import memcache
+	import caches
+	import templates
+
+	memcache.flush_all()
+	caches.cache.local.clear()
+	templates.fragments.clear()
+
+def percentile(values, fraction):
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def rss_kb():
+	with open('/proc/self/statm') as statm:
+		return int(statm.read().split()[1]) * resource.getpagesize() / 1024
+
+def page_cache_key(app, url):
+	import webapp2
+
+	route, args, kwargs = app.router.match(webapp2.Request.blank(url))
+	return args[0] + str(route.handler)
+
+def measure(app, stub, url, iterations, warm, warmups):
+	import caches
+	import http_client
+
+	rss_at_start = rss_kb()
+	times = []
+
+	for iteration in range(warmups + iterations):
+		if warm:
+			caches.cache.delete(page_cache_key(app, url))
+		else:
+			clear_caches()
+
+		stub.reset()
+		http_client.client.stats.clear()
+
+		started = time.time()
+		response = app.get_response(url)
+
+		if iteration >= warmups:
+			times.append(time.time() - started)
+
+	peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	return {
+		'status': response.status_int,
+		'p50_ms': round(percentile(times, 0.5) * 1000, 1),
+		'p95_ms': round(percentile(times, 0.95) * 1000, 1),
+		'calls': sum(stub.calls.values()),
+		'calls_by_upstream': dict(stub.calls),
+		'synthetic': stub.synthetic,
+		'faulted': stub.faulted,
+		'kb_decoded': sum(stats['bytes_decoded'] for stats in http_client.host_stats().values()) / 1024,
+		'page_kb': len(response.body) / 1024,
+		'peak_mb': round(peak_kb / 1024.0, 1),
+		'growth_mb': round((peak_kb - rss_at_start) / 1024.0, 1),
+	}
+
+def measure_in_child(app, stub, url, iterations, warm, warmups):
+	"""
+	Measures an email in a forked process, so that its peak memory and
+	caches are its own.
+	"""
+	read_end, write_end = os.pipe()
+	pid = os.fork()
+
+	if pid == 0:
+		os.close(read_end)
+		try:
+			result = measure(app, stub, url, iterations, warm, warmups)
+		except Exception as e:
+			result = {'error': '{0}: {1}'.format(e.__class__.__name__, e)}
+		with os.fdopen(write_end, 'w') as output:
+			json.dump(result, output)
+		os._exit(0)
+
+	os.close(write_end)
+	with os.fdopen(read_end) as result_input:
+		output = result_input.read()
+	os.waitpid(pid, 0)
+
+	return json.loads(output) if output else {'error': 'the render process died'}
+
+def page_name(url):
+	return re.sub(r'[^a-zA-Z0-9_-]+', '-', url.strip('/')) + '.html'
+
+def save_pages(app, urls, directory):
+	"""
+	Saves the page of each url as rendered before any minifying.
+	"""
+	import webapp2
+
+	if not os.path.exists(directory):
+		os.makedirs(directory)
+
+	for url in urls:
+		route, args, kwargs = app.router.match(webapp2.Request.blank(url))
+		minify = route.handler.minify
+		route.handler.minify = False
+
+		try:
+			clear_caches()
+			response = app.get_response(url)
+		finally:
+			route.handler.minify = minify
+
+		if response.status_int != 200:
+			print '{0}: {1}'.format(url, response.status)
+			continue
+
+		with open(os.path.join(directory, page_name(url)), 'w') as page_file:
+			page_file.write(response.body)
+
+	print 'Saved {0} pages to {1}'.format(len(urls), directory)
+
+def change(value, baseline_value):
+	if not baseline_value:
+		return ''
+	return '{0:+.0f}%'.format(100.0 * (value - baseline_value) / baseline_value)
+
+def report(results, baseline):
+	print '{0:40} {1:>6} {2:>9} {3:>9} {4:>6} {5:>9} {6:>8} {7:>8}'.format(
+		'email', 'status', 'p50 ms', 'p95 ms', 'calls', 'KB read', 'peak MB', 'grew MB')
+
+	for url, result in results:
+		if 'error' in result:
+			print '{0:40} {1}'.format(url, result['error'])
+			continue
+
+		print '{0:40} {1:>6} {2:>9} {3:>9} {4:>6} {5:>9} {6:>8} {7:>8}'.format(url, result['status'],
+			result['p50_ms'], result['p95_ms'], result['calls'], result['kb_decoded'],
+			result['peak_mb'], result['growth_mb'])
+
+		previous = baseline.get(url)
+		if previous and 'error' not in previous:
+			print '{0:40} {1:>6} {2:>9} {3:>9} {4:>6} {5:>9} {6:>8}'.format('  against the baseline', '',
+				*[change(result[metric], previous.get(metric)) for metric in METRICS])
+
+	synthetic = sum(result.get('synthetic', 0) for url, result in results)
+	if synthetic:
+		print '\n{0} upstream responses had no recording and were synthetic'.format(synthetic)
+
+	faulted = sum(result.get('faulted', 0) for url, result in results)
+	if faulted:
+		print '{0} upstream requests were given an error or timed out'.format(faulted)
+
+def main(sdk_path, options):
+	logging.getLogger().setLevel(logging.ERROR)
+	app, stub = set_up(sdk_path, options)
+
+	urls = [url for url in email_urls(app) if url.startswith(options.only)]
+
+	if options.pages:
+		save_pages(app, urls, options.pages)
+		return True
+
+	results = [(url, measure_in_child(app, stub, url, options.iterations, options.warm, options.warmups)) for url in urls]
+
+	baseline = {}
+	if os.path.exists(options.baseline):
+		with open(options.baseline) as baseline_file:
+			baseline = json.load(baseline_file)
+
+	report(results, baseline)
+
+	if options.save:
+		with open(options.save, 'w') as baseline_file:
+			json.dump(dict(results), baseline_file, indent=1, sort_keys=True)
+		print 'Saved the baseline to {0}'.format(options.save)
+
+	return all('error' not in result and result['status'] == 200 for url, result in results)
+
+
+if __name__ == '__main__':
+	parser = optparse.OptionParser(usage='%prog SDK_PATH [options]')
+	parser.add_option('-n', '--iterations', type='int', default=5, help='renders of each email')
+	parser.add_option('--warmups', type='int', default=1, help='untimed renders of each email first, to load its templates')
+	parser.add_option('--warm', action='store_true', default=False, help='keep upstream and fragment caches between renders')
+	parser.add_option('--recordings', default=DEFAULT_RECORDINGS, help='directory of recorded upstream responses')
+	parser.add_option('--only', default='', help='only render emails whose url starts with this')
+	parser.add_option('--baseline', default=DEFAULT_BASELINE, help='baseline to compare against')
+	parser.add_option('--save', help='save the results as a baseline here')
+	parser.add_option('--pages', help='save the unminified page of every email to this directory instead')
+	faults.add_options(parser)
+	options, args = parser.parse_args()
+
+	if len(args) != 1:
+		parser.print_help()
+		sys.exit(1)
+
+	if not main(args[0], options):
+		sys.exit(1)
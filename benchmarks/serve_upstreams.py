@@ -0,0 +1,133 @@
+#!/usr/bin/python
+"""
+Serves the stand-in for the renderer's upstreams (see upstreams.py) over
+HTTP, so that a renderer running in the dev appserver can be load tested
+without the network. Configure the renderer with the values it prints.
+
+    python benchmarks/serve_upstreams.py SDK_PATH [--port 8081] [--recordings DIR]
+        [--latency MS] [--jitter MS] [--errors RATE] [--timeouts RATE] [--faulty UPSTREAM]
+        [--record CONFIGURATION]
+
+With --record, requests without a recording are passed on to the real
+upstreams given in the configuration file (a JSON object of the same
+settings the renderer reads) and their responses saved.
+"""
+
+import os
+import sys
+import json
+import optparse
+import SocketServer
+import BaseHTTPServer
+
+import faults
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_RECORDINGS = os.path.join(ROOT, 'benchmarks', 'recordings')
+
+# Counts of the calls answered so far, for load.py
+STATS_PATH = '/_stand-in/stats'
+
+def local_configuration(host, port):
+	"""
+	The configuration that points the renderer at the stand-in.
+	"""
+	address = '{0}:{1}'.format(host, port)
+	return {
+		'CAPI_BASE_URL': 'http://{0}/capi/'.format(address),
+		'CAPI_KEY': 'stand-in',
+		'CONTAINER_API_BASE_URL': 'http://{0}/container/collection'.format(address),
+		'CONTAINER_API_HOST': address,
+		'OPHAN_BASE_URL': 'http://{0}/ophan'.format(address),
+		'OPHAN_API_KEY': 'stand-in',
+		'DISCUSSION_BASE_URL': 'http://{0}/discussion-api'.format(address),
+	}
+
+
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+
+def handler_for(stand_in, root, timeout):
+	class UpstreamHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+		def do_GET(self):
+			if self.path == STATS_PATH:
+				return self.send_stats()
+
+			accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+
+			try:
+				answer = stand_in.answer(root + self.path, accepts_gzip, timeout)
+			except ValueError:
+				answer = 404, {'Content-Type': 'text/plain'}, 'No upstream serves {0}'.format(self.path)
+
+			if answer is None:
+				answer = 504, {'Content-Type': 'text/plain'}, 'Injected timeout'
+
+			status, headers, content = answer
+			self.send_response(status)
+			for name, value in headers.items():
+				self.send_header(name, value)
+			self.send_header('Content-Length', str(len(content)))
+			self.end_headers()
+			self.wfile.write(content)
+
+		def send_stats(self):
+			content = json.dumps({'calls': stand_in.calls, 'synthetic': stand_in.synthetic,
+				'recorded': stand_in.recorded, 'faulted': stand_in.faulted})
+			self.send_response(200)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(content)))
+			self.end_headers()
+			self.wfile.write(content)
+
+		def log_message(self, format, *args):
+			pass
+
+	return UpstreamHandler
+
+def main(sdk_path, options):
+	sys.path.insert(0, sdk_path)
+	import dev_appserver
+	dev_appserver.fix_sys_path()
+	sys.path.insert(0, ROOT)
+	sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+	import upstreams
+
+	configuration = local_configuration(options.host, options.port)
+	stand_in = upstreams.StandIn(upstreams.Recordings(options.recordings), configuration,
+		faults.faults_from(options), faults.record_from(options))
+
+	root = 'http://{0}:{1}'.format(options.host, options.port)
+	server = ThreadedHTTPServer((options.host, options.port), handler_for(stand_in, root, options.timeout))
+
+	print 'Serving the upstreams at {0}. Configure the renderer with:'.format(root)
+	for key, value in sorted(configuration.items()):
+		print '    {0} = {1}'.format(key, value)
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+
+	print '\n{0} calls ({1}), {2} synthetic, {3} recorded, {4} faulted'.format(sum(stand_in.calls.values()),
+		', '.join('{0} {1}'.format(count, upstream) for upstream, count in sorted(stand_in.calls.items())),
+		stand_in.synthetic, stand_in.recorded, stand_in.faulted)
+
+
+if __name__ == '__main__':
+	parser = optparse.OptionParser(usage='%prog SDK_PATH [options]')
+	parser.add_option('--host', default='127.0.0.1', help='address to serve on')
+	parser.add_option('--port', type='int', default=8081, help='port to serve on')
+	parser.add_option('--recordings', default=DEFAULT_RECORDINGS, help='directory of recorded upstream responses')
+	parser.add_option('--timeout', type='float', default=10, help='seconds an injected timeout takes')
+	faults.add_options(parser)
+	options, args = parser.parse_args()
+
+	if len(args) != 1:
+		parser.print_help()
+		sys.exit(1)
+
+	main(args[0], options)
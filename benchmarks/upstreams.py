@@ -0,0 +1,355 @@
+"""
+Stands in for the renderer's upstreams (CAPI, the container service,
+Ophan and Discussion) by answering their requests from recordings.
+
+A recording is one JSON file per response, under a directory for its
+upstream and named after a hash of the request. Requests are identified
+by their path and query relative to the upstream's base url, leaving out
+the api key, so recordings replay whatever hosts and keys are configured.
+A request with no recording gets a synthetic response of the right shape,
+generated from the request so that it is the same every time, unless the
+stand-in is recording, when it is fetched from the real upstream and
+saved.
+
+Faults add latency, jitter, errors and timeouts to the responses. The
+stand-in answers urlfetch calls in process (install) or HTTP requests
+from a renderer running elsewhere (serve_upstreams.py).
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import urllib2
+import hashlib
+import threading
+from StringIO import StringIO
+from urllib import urlencode
+from urlparse import urlparse, parse_qsl
+
+from google.appengine.api import apiproxy_rpc
+from google.appengine.api import apiproxy_stub
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import urlfetch_service_pb
+from google.appengine.runtime import apiproxy_errors
+
+from guardianapi import mockapi
+
+from faults import Faults, TIMEOUT, ERROR
+
+# Configuration the renderer is run with, pointing every upstream at a
+# host that only the stand-in answers for
+CONFIGURATION = {
+	'CAPI_BASE_URL': 'http://capi.upstream.test/',
+	'CAPI_KEY': 'stand-in',
+	'CONTAINER_API_BASE_URL': 'http://container.upstream.test/collection',
+	'CONTAINER_API_HOST': 'container.upstream.test',
+	'OPHAN_BASE_URL': 'http://ophan.upstream.test',
+	'OPHAN_API_KEY': 'stand-in',
+	'DISCUSSION_BASE_URL': 'http://discussion.upstream.test/discussion-api',
+}
+
+DISCUSSION_BASE_URL = 'https://discussion.guardianapis.com/discussion-api'
+
+# The setting holding the api key each upstream is called with
+API_KEYS = {
+	'capi': 'CAPI_KEY',
+	'ophan': 'OPHAN_API_KEY',
+}
+
+RECORDED_HEADERS = ('content-type', 'etag', 'last-modified', 'cache-control')
+
+IGNORED_PARAMETERS = ('api-key',)
+
+def base_urls(configuration):
+	"""
+	The url each upstream's requests start with, longest first.
+	"""
+	urls = [
+		('capi', configuration['CAPI_BASE_URL']),
+		('container', configuration['CONTAINER_API_BASE_URL']),
+		('fronts', 'http://{0}/list'.format(configuration['CONTAINER_API_HOST'])),
+		('ophan', configuration['OPHAN_BASE_URL']),
+		('discussion', configuration.get('DISCUSSION_BASE_URL', DISCUSSION_BASE_URL)),
+	]
+	return sorted(urls, key=lambda pair: -len(pair[1]))
+
+def identify(url, urls):
+	"""
+	The upstream a url belongs to and the request relative to it, or
+	(None, url) for a url no upstream serves.
+	"""
+	for upstream, base_url in urls:
+		if url.startswith(base_url):
+			parts = urlparse(url[len(base_url):])
+			query = urlencode(sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+				if name not in IGNORED_PARAMETERS))
+			return upstream, parts.path.lstrip('/') + ('?' + query if query else '')
+
+	return None, url
+
+def upstream_url(configuration, upstream, request):
+	"""
+	The url of a request to an upstream, with its api key.
+	"""
+	base_url = dict(base_urls(configuration))[upstream].rstrip('/')
+
+	if upstream in API_KEYS:
+		request += ('&' if '?' in request else '?') + urlencode({'api-key': configuration[API_KEYS[upstream]]})
+
+	return base_url + ('/' + request if request and not request.startswith('?') else request)
+
+def fetch_upstream(url, timeout=30):
+	"""
+	The status, headers worth recording and content of a real response.
+	"""
+	try:
+		response = urllib2.urlopen(url, timeout=timeout)
+	except urllib2.HTTPError as e:
+		response = e
+
+	headers = dict((name, value) for name, value in response.info().items() if name.lower() in RECORDED_HEADERS)
+	return response.getcode(), headers, response.read()
+
+
+class Recordings(object):
+	def __init__(self, directory):
+		self.directory = directory
+
+	def path(self, upstream, request):
+		return os.path.join(self.directory, upstream, hashlib.sha1(request).hexdigest() + '.json')
+
+	def get(self, upstream, request):
+		path = self.path(upstream, request)
+
+		if not os.path.exists(path):
+			return None
+
+		with open(path) as recording_file:
+			return json.load(recording_file)
+
+	def save(self, upstream, request, status, headers, content):
+		path = self.path(upstream, request)
+
+		if not os.path.exists(os.path.dirname(path)):
+			os.makedirs(os.path.dirname(path))
+
+		with open(path, 'w') as recording_file:
+			json.dump({'request': request, 'status': status, 'headers': headers,
+				'content': content.decode('utf-8')}, recording_file, indent=1)
+
+
+def synthetic_capi(request, parameters):
+	return mockapi.fake_response(urlparse(request).path, parameters, seed=request)
+
+def synthetic_ophan(request, parameters):
+	rng = random.Random(request)
+	ids = mockapi.fake_ids(request, 20)
+
+	if request.startswith('api/viral'):
+		return [{'path': '/' + item_id, 'hits': rng.randint(100, 10000)} for item_id in ids]
+
+	return [{'url': 'https://www.theguardian.com/' + item_id, 'count': rng.randint(100, 10000)} for item_id in ids]
+
+def synthetic_discussion(request, parameters):
+	rng = random.Random(request)
+
+	if request.startswith('getCommentCounts'):
+		return dict((path, rng.randint(0, 2000)) for path in parameters.get('short-urls', '').split(',') if path)
+
+	return {'discussions': [{'key': '/' + mockapi.fake_short_path(item_id), 'numberOfComments': rng.randint(10, 2000)}
+		for item_id in mockapi.fake_ids(request, int(parameters.get('pageSize', 10)))]}
+
+def synthetic_container(request, parameters):
+	rng = random.Random(request)
+	return {
+		'config': {'displayName': mockapi.words(rng, 2)},
+		'collection': {'live': [{'id': item_id} for item_id in mockapi.fake_ids(request, rng.randint(4, 10))]},
+	}
+
+def synthetic_fronts(request, parameters):
+	return {'data': ['container-{0}'.format(hashlib.sha1(request).hexdigest()[:8])]}
+
+SYNTHETIC = {
+	'capi': synthetic_capi,
+	'ophan': synthetic_ophan,
+	'discussion': synthetic_discussion,
+	'container': synthetic_container,
+	'fronts': synthetic_fronts,
+}
+
+def synthetic_response(upstream, request):
+	parameters = dict(parse_qsl(urlparse(request).query))
+	content = json.dumps(SYNTHETIC[upstream](request, parameters))
+	return {'request': request, 'status': 200, 'headers': {'Content-Type': 'application/json'}, 'content': content}
+
+
+def gzipped(content):
+	buffer = StringIO()
+	with gzip.GzipFile(fileobj=buffer, mode='wb') as gzip_file:
+		gzip_file.write(content)
+	return buffer.getvalue()
+
+class StandIn(object):
+	"""
+	Answers requests to the upstreams from recordings, or with synthetic
+	responses when there is no recording. Given the real configuration as
+	record_from, it fetches and saves the responses it has no recording
+	of instead.
+	"""
+	def __init__(self, recordings, configuration=CONFIGURATION, faults=None, record_from=None):
+		self.recordings = recordings
+		self.urls = base_urls(configuration)
+		self.faults = faults or Faults()
+		self.record_from = record_from
+		self.lock = threading.Lock()
+		self.responses = {}
+		self.reset()
+
+	def reset(self):
+		with self.lock:
+			self.calls = {}
+			self.synthetic = 0
+			self.recorded = 0
+			self.faulted = 0
+
+	def count(self, name):
+		with self.lock:
+			setattr(self, name, getattr(self, name) + 1)
+
+	def record(self, upstream, request):
+		status, headers, content = fetch_upstream(upstream_url(self.record_from, upstream, request))
+
+		if status >= 500:
+			return {'request': request, 'status': status, 'headers': headers, 'content': content.decode('utf-8', 'replace')}
+
+		self.recordings.save(upstream, request, status, headers, content)
+		self.count('recorded')
+		return self.recordings.get(upstream, request)
+
+	def response_for(self, url, accepts_gzip):
+		upstream, request = identify(url, self.urls)
+
+		if upstream is None:
+			raise ValueError('No upstream serves {0}'.format(url))
+
+		with self.lock:
+			self.calls[upstream] = self.calls.get(upstream, 0) + 1
+			cached = self.responses.get((upstream, request, accepts_gzip))
+
+		if cached:
+			return cached
+
+		recording = self.recordings.get(upstream, request)
+
+		if recording is None and self.record_from:
+			recording = self.record(upstream, request)
+		elif recording is None:
+			recording = synthetic_response(upstream, request)
+			self.count('synthetic')
+
+		headers = dict(recording['headers'])
+		content = recording['content'].encode('utf-8')
+
+		if accepts_gzip:
+			headers['Content-Encoding'] = 'gzip'
+			content = gzipped(content)
+
+		response = (recording['status'], headers, content)
+
+		if recording['status'] < 500:
+			with self.lock:
+				self.responses[(upstream, request, accepts_gzip)] = response
+
+		return response
+
+	def answer(self, url, accepts_gzip, deadline):
+		"""
+		The response to a request once the faults have been applied, or None
+		if it timed out, which takes the deadline.
+		"""
+		upstream, request = identify(url, self.urls)
+		fault = self.faults.fault(upstream)
+
+		if fault == TIMEOUT:
+			self.count('faulted')
+			time.sleep(deadline)
+			return None
+
+		time.sleep(self.faults.delay(upstream))
+
+		if fault == ERROR:
+			self.count('faulted')
+			return 503, {'Content-Type': 'text/plain'}, 'Injected error'
+
+		return self.response_for(url, accepts_gzip)
+
+
+class ThreadedRPC(apiproxy_rpc.RPC):
+	"""
+	Makes its call on a thread of its own as soon as it is started, so
+	that the latency of calls made together overlaps as it would against
+	the real upstreams.
+	"""
+	def _MakeCallImpl(self):
+		apiproxy_rpc.RPC._MakeCallImpl(self)
+		self.thread = threading.Thread(target=self._call)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def _call(self):
+		try:
+			self.stub.MakeSyncCall(self.package, self.call, self.request, self.response)
+		except Exception:
+			_, self._exception, self._traceback = sys.exc_info()
+
+	def _WaitImpl(self):
+		self.thread.join()
+		self._state = apiproxy_rpc.RPC.FINISHING
+		self._Callback()
+		return True
+
+
+class UpstreamStub(StandIn, apiproxy_stub.APIProxyStub):
+	"""
+	A urlfetch service stub that answers with the stand-in.
+	"""
+	def __init__(self, recordings, configuration=CONFIGURATION, faults=None, record_from=None):
+		apiproxy_stub.APIProxyStub.__init__(self, 'urlfetch')
+		StandIn.__init__(self, recordings, configuration, faults, record_from)
+
+	def CreateRPC(self):
+		return ThreadedRPC(stub=self)
+
+	def _Dynamic_Fetch(self, request, response):
+		accepts_gzip = any(header.key().lower() == 'accept-encoding' and 'gzip' in header.value()
+			for header in request.header_list())
+		deadline = request.deadline() if request.has_deadline() else 5
+
+		answer = self.answer(request.url(), accepts_gzip, deadline)
+
+		if answer is None:
+			raise apiproxy_errors.ApplicationError(urlfetch_service_pb.URLFetchServiceError.DEADLINE_EXCEEDED)
+
+		status, headers, content = answer
+		response.set_statuscode(status)
+		response.set_content(content)
+		response.set_finalurl(request.url())
+
+		for name, value in headers.items():
+			header = response.add_header()
+			header.set_key(name)
+			header.set_value(value)
+
+
+def install(recordings, configuration=CONFIGURATION, faults=None, record_from=None):
+	"""
+	Puts a stand-in in place of the urlfetch stub a testbed set up,
+	returning it.
+	"""
+	stub = UpstreamStub(recordings, configuration, faults, record_from)
+	apiproxy_stub_map.apiproxy.ReplaceStub('urlfetch', stub)
+	return stub
+
@@ -0,0 +1,35 @@
+#!/usr/bin/python
+import optparse
+import sys
+import os
+import logging
+
+USAGE = """%prog SDK_PATH
+Write pre-minified copies of the templates to template_compiled.
+
+SDK_PATH    Path to the SDK installation"""
+
+
+def main(sdk_path):
+    sys.path.insert(0, sdk_path)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+
+    import jinja2
+    import templates
+    import template_compiler
+
+    return template_compiler.compile_templates(jinja2.Environment(),
+        templates.TEMPLATE_DIRECTORY, templates.COMPILED_TEMPLATE_DIRECTORY)
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(USAGE)
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        print 'Error: Exactly 1 arguments required.'
+        parser.print_help()
+        sys.exit(1)
+    logging.basicConfig(format='%(message)s')
+    manifest = main(args[0])
+    print 'Compiled {0} templates'.format(len(manifest))
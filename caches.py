@@ -0,0 +1,349 @@
+"""
+A small in-process cache layered in front of memcache.
+
+Values read from or written to memcache are also kept in a bounded LRU
+cache on the instance, under the same keys, for up to LOCAL_CACHE_TIME
+(never longer than they have left in memcache, which is stored along with
+them), so repeat lookups of hot keys cost no RPC at all.
+Values handed out from the local cache are shared, so callers must not
+modify them.
+
+Memcache values are pickled and compressed, and any that are still larger
+than a memcache entry allows are split into chunks.
+
+Time spent waiting on memcache is timed as a span of the current render.
+"""
+
+import sys
+import time
+import zlib
+import uuid
+import logging
+import threading
+import cPickle as pickle
+from collections import OrderedDict
+
+from google.appengine.api import memcache
+
+import defaults
+import render_context
+
+def approximate_size(value):
+	if isinstance(value, basestring):
+		return len(value)
+
+	if isinstance(value, (list, tuple)):
+		return sum(approximate_size(item) for item in value) + 8 * len(value)
+
+	if isinstance(value, dict):
+		return sum(approximate_size(key) + approximate_size(item) for key, item in value.items()) + 16 * len(value)
+
+	return sys.getsizeof(value)
+
+
+class LRUCache(object):
+	def __init__(self, max_entries, max_bytes):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.lock = threading.Lock()
+		self.entries = OrderedDict()
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key):
+		with self.lock:
+			entry = self.entries.pop(key, None)
+
+			if entry is None or (entry[1] and entry[1] < time.time()):
+				if entry:
+					self.size -= entry[2]
+				self.misses += 1
+				return None
+
+			self.entries[key] = entry
+			self.hits += 1
+			return entry[0]
+
+	def set(self, key, value, time_to_live=0):
+		size = approximate_size(value)
+
+		if size > self.max_bytes:
+			self.delete(key)
+			return
+
+		expires = time.time() + time_to_live if time_to_live else 0
+
+		with self.lock:
+			previous = self.entries.pop(key, None)
+			if previous:
+				self.size -= previous[2]
+
+			self.entries[key] = (value, expires, size)
+			self.size += size
+
+			while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+				evicted_key, evicted = self.entries.popitem(last=False)
+				self.size -= evicted[2]
+				self.evictions += 1
+
+	def delete(self, key):
+		with self.lock:
+			entry = self.entries.pop(key, None)
+			if entry:
+				self.size -= entry[2]
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.size = 0
+
+	def stats(self):
+		with self.lock:
+			return {
+				'entries': len(self.entries),
+				'bytes': self.size,
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions,
+			}
+
+
+def local_time(remote_time):
+	if remote_time:
+		return min(remote_time, defaults.LOCAL_CACHE_TIME)
+	return defaults.LOCAL_CACHE_TIME
+
+# Memcache takes expiry times longer than this as a unix time
+MAX_RELATIVE_EXPIRY = 30 * 24 * 60 * 60
+
+def expiry(remote_time):
+	"""
+	The unix time at which memcache expires a value written with
+	remote_time, or 0 if it never does.
+	"""
+	if not remote_time or remote_time > MAX_RELATIVE_EXPIRY:
+		return remote_time
+	return time.time() + remote_time
+
+EXPIRING = 'expiring'
+
+
+class TieredCache(object):
+	"""
+	The subset of the memcache client API the app uses, reading through
+	a local LRU cache before going to memcache.
+	"""
+	def __init__(self, local, remote):
+		self.local = local
+		self.remote = remote
+		self.lock = threading.Lock()
+		self.remote_hits = 0
+		self.remote_misses = 0
+
+	def _count_remote(self, hits, misses):
+		with self.lock:
+			self.remote_hits += hits
+			self.remote_misses += misses
+
+	def _wrap(self, value, time):
+		return (EXPIRING, expiry(time), value)
+
+	def _keep(self, key, stored):
+		"""
+		Keeps a value read from the remote cache locally for no longer than
+		it has left there, and returns it.
+		"""
+		if isinstance(stored, tuple) and len(stored) == 3 and stored[0] == EXPIRING:
+			expires, value = stored[1], stored[2]
+			time_to_live = min(expires - time.time(), defaults.LOCAL_CACHE_TIME) if expires else defaults.LOCAL_CACHE_TIME
+		else:
+			value, time_to_live = stored, defaults.LOCAL_CACHE_UNKNOWN_EXPIRY_TIME
+
+		if time_to_live > 0:
+			self.local.set(key, value, time_to_live)
+
+		return value
+
+	def get(self, key):
+		value = self.local.get(key)
+
+		if value is not None:
+			return value
+
+		with render_context.span('memcache'):
+			stored = self.remote.get(key)
+
+		if stored is None:
+			self._count_remote(0, 1)
+			return None
+
+		self._count_remote(1, 0)
+		return self._keep(key, stored)
+
+	def get_multi(self, keys):
+		found = {}
+		remote_keys = []
+
+		for key in keys:
+			value = self.local.get(key)
+			if value is None:
+				remote_keys.append(key)
+			else:
+				found[key] = value
+
+		if remote_keys:
+			with render_context.span('memcache'):
+				remote_values = self.remote.get_multi(remote_keys)
+			self._count_remote(len(remote_values), len(remote_keys) - len(remote_values))
+
+			for key, stored in remote_values.items():
+				found[key] = self._keep(key, stored)
+
+		return found
+
+	def set(self, key, value, time=0):
+		self.local.set(key, value, local_time(time))
+
+		with render_context.span('memcache'):
+			return self.remote.set(key, self._wrap(value, time), time=time)
+
+	def set_multi(self, mapping, time=0):
+		for key, value in mapping.items():
+			self.local.set(key, value, local_time(time))
+
+		with render_context.span('memcache'):
+			return self.remote.set_multi(dict((key, self._wrap(value, time)) for key, value in mapping.items()), time=time)
+
+	def add(self, key, value, time=0):
+		with render_context.span('memcache'):
+			added = self.remote.add(key, self._wrap(value, time), time=time)
+
+		if added:
+			self.local.set(key, value, local_time(time))
+
+		return added
+
+	def delete(self, key):
+		self.local.delete(key)
+
+		with render_context.span('memcache'):
+			return self.remote.delete(key)
+
+	def stats(self):
+		stats = self.local.stats()
+		stats['remote_hits'] = self.remote_hits
+		stats['remote_misses'] = self.remote_misses
+		return stats
+
+
+WHOLE = 'whole'
+CHUNKED = 'chunked'
+
+class CompressedCache(object):
+	"""
+	Stores values in memcache pickled and zlib compressed. A value that
+	is still larger than chunk_size is written as chunks under their own
+	keys, with a manifest naming them stored under the value's key.
+	Every record carries a checksum of the compressed data, so a value
+	with a chunk evicted or overwritten reads as a miss.
+	"""
+	def __init__(self, remote, chunk_size):
+		self.remote = remote
+		self.chunk_size = chunk_size
+
+	def encode(self, key, value):
+		data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+		checksum = zlib.crc32(data)
+
+		if len(data) <= self.chunk_size:
+			return {key: (WHOLE, checksum, data)}
+
+		generation = uuid.uuid4().hex
+		entries = {}
+		chunk_keys = []
+
+		for index, start in enumerate(range(0, len(data), self.chunk_size)):
+			chunk_key = '%s:%s:%d' % (key, generation, index)
+			chunk_keys.append(chunk_key)
+			entries[chunk_key] = data[start:start + self.chunk_size]
+
+		entries[key] = (CHUNKED, checksum, chunk_keys)
+		return entries
+
+	def decode(self, key, record, chunks):
+		if not isinstance(record, tuple) or len(record) != 3:
+			return None
+
+		kind, checksum, payload = record
+
+		if kind == CHUNKED:
+			parts = [chunks.get(chunk_key) for chunk_key in payload]
+			if None in parts:
+				return None
+			payload = ''.join(parts)
+
+		if zlib.crc32(payload) != checksum:
+			logging.warning('Discarding corrupt cache value for %s' % key)
+			return None
+
+		try:
+			return pickle.loads(zlib.decompress(payload))
+		except Exception as e:
+			logging.warning('Could not decode cache value for %s: %s' % (key, e))
+			return None
+
+	def get(self, key):
+		return self.get_multi([key]).get(key)
+
+	def get_multi(self, keys):
+		records = self.remote.get_multi(keys)
+
+		chunk_keys = []
+		for record in records.values():
+			if isinstance(record, tuple) and len(record) == 3 and record[0] == CHUNKED:
+				chunk_keys.extend(record[2])
+
+		chunks = self.remote.get_multi(chunk_keys) if chunk_keys else {}
+
+		values = {}
+		for key, record in records.items():
+			value = self.decode(key, record, chunks)
+			if value is not None:
+				values[key] = value
+
+		return values
+
+	def set(self, key, value, time=0):
+		return not self.set_multi({key: value}, time=time)
+
+	def set_multi(self, mapping, time=0):
+		entries = {}
+		for key, value in mapping.items():
+			entries.update(self.encode(key, value))
+
+		failed = set(self.remote.set_multi(entries, time=time))
+		return [key for key in mapping if key in failed]
+
+	def add(self, key, value, time=0):
+		entries = self.encode(key, value)
+		record = entries.pop(key)
+
+		if entries:
+			self.remote.set_multi(entries, time=time)
+
+		added = self.remote.add(key, record, time=time)
+
+		if entries and not added:
+			self.remote.delete_multi(entries.keys())
+
+		return added
+
+	def delete(self, key):
+		return self.remote.delete(key)
+
+
+cache = TieredCache(
+	LRUCache(defaults.LOCAL_CACHE_MAX_ENTRIES, defaults.LOCAL_CACHE_MAX_BYTES),
+	CompressedCache(memcache, defaults.MEMCACHE_CHUNK_SIZE))
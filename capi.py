@@ -2,13 +2,13 @@ import json
 import urllib
 import logging
 
-from google.appengine.api import urlfetch
-from google.appengine.api import memcache
-
 import pysistence as immutable
 
 import defaults
 import configuration
+import http_client
+from caches import cache
+from guardianapi import projection
 
 
 default_params = immutable.make_dict({
@@ -16,7 +16,7 @@ default_params = immutable.make_dict({
 	'api-key': configuration.read('CAPI_KEY')
 	})
 
-def read_item(internal_id, additional_params=None):
+def item_url(internal_id, additional_params=None):
 	capi_base_url = configuration.read('CAPI_BASE_URL')
 
 	combined_params = default_params
@@ -24,23 +24,36 @@ def read_item(internal_id, additional_params=None):
 	if additional_params:
 		combined_params = default_params.using(**additional_params)
 
-	item_url = "{0}/{1}?{2}".format(capi_base_url, internal_id, urllib.urlencode(combined_params))
-	#logging.info(item_url)
-	
-	cached_response = memcache.get(item_url)
+	return "{0}/{1}?{2}".format(capi_base_url, internal_id, urllib.urlencode(combined_params))
+
+def read_item(internal_id, additional_params=None):
+	return read_items([internal_id], additional_params=additional_params)[0]
+
+def read_items(internal_ids, additional_params=None):
+	"""
+	Reads several items at once. Cached items come back from a single
+	cache lookup and the rest are fetched from CAPI concurrently.
+
+	Returns the items in the same order as the ids, with None for any
+	item that could not be read.
+	"""
+	item_urls = [item_url(internal_id, additional_params) for internal_id in internal_ids]
 
-	if cached_response:
-		return cached_response
+	items = cache.get_multi(item_urls)
 
-	
-	result = urlfetch.fetch(item_url, deadline=8)
+	missing_urls = []
+	for url in item_urls:
+		if url not in items and url not in missing_urls:
+			missing_urls.append(url)
 
-	if result.status_code == 200:
-		data = json.loads(result.content)
-		item_data = data.get('response', {}).get('content', {})
+	fetched_items = {}
+	for url, response in zip(missing_urls, http_client.fetch_all(missing_urls, upstream='capi')):
+		if response and response.status_code == 200:
+			data = json.loads(response.content)
+			fetched_items[url] = projection.project_item(data.get('response', {}).get('content', {}))
 
-		if len(result.content) < defaults.MAX_MEMCACHE_LENGTH:
-			memcache.set(item_url, item_data, defaults.CACHE_TIME)
-		return item_data
+	if fetched_items:
+		items.update(fetched_items)
+		cache.set_multi(fetched_items, time=defaults.CACHE_TIME)
 
-	return None
\ No newline at end of file
+	return [items.get(url) for url in item_urls]
@@ -0,0 +1,130 @@
+"""
+Per-upstream circuit breakers.
+
+A breaker watches the outcomes of recent calls to its upstream. Once
+enough of them fail within the window it opens and calls are refused
+straight away, so callers fall back to cached or empty results instead
+of each waiting out the deadline. After a while a single probe call is
+let through: if it succeeds the breaker closes, otherwise it opens again.
+
+Breakers are per instance. Every change of state is also written to
+memcache so the admin pages can show what each upstream last did.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+from google.appengine.api import memcache
+
+import defaults
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+SNAPSHOT_PREFIX = 'circuit:'
+SNAPSHOT_TIME = 24 * 60 * 60
+
+class CircuitBreaker(object):
+	def __init__(self, name, window=None, minimum_calls=None, failure_rate=None, open_time=None):
+		settings = defaults.CIRCUIT_BREAKER
+		self.name = name
+		self.window = window or settings['window']
+		self.minimum_calls = minimum_calls or settings['minimum_calls']
+		self.failure_rate = failure_rate or settings['failure_rate']
+		self.open_time = open_time or settings['open_time']
+
+		self.lock = threading.Lock()
+		self.state = CLOSED
+		self.changed_at = time.time()
+		self.probe_started = None
+		self.outcomes = deque()
+		self.rejected = 0
+
+	def _trim(self, now):
+		while self.outcomes and self.outcomes[0][0] < now - self.window:
+			self.outcomes.popleft()
+
+	def _rate(self):
+		if not self.outcomes:
+			return 0.0
+		return float(sum(1 for _, failed in self.outcomes if failed)) / len(self.outcomes)
+
+	def _change(self, state, now):
+		logging.warn('Circuit for {0} is now {1}'.format(self.name, state))
+		self.state = state
+		self.changed_at = now
+		self.probe_started = None
+
+		if state != HALF_OPEN:
+			self.outcomes.clear()
+
+		publish(self.name, self._snapshot(now))
+
+	def allow(self):
+		"""
+		Whether a call may be made now. In the half-open state only one
+		probe is allowed at a time.
+		"""
+		now = time.time()
+
+		with self.lock:
+			if self.state == OPEN and now - self.changed_at >= self.open_time:
+				self._change(HALF_OPEN, now)
+
+			if self.state == HALF_OPEN:
+				if self.probe_started is None or now - self.probe_started >= self.open_time:
+					self.probe_started = now
+					return True
+
+			if self.state == CLOSED:
+				return True
+
+			self.rejected += 1
+			return False
+
+	def record(self, failed):
+		now = time.time()
+
+		with self.lock:
+			if self.state == HALF_OPEN:
+				self._change(OPEN if failed else CLOSED, now)
+				return
+
+			if self.state == OPEN:
+				return
+
+			self.outcomes.append((now, failed))
+			self._trim(now)
+
+			if len(self.outcomes) >= self.minimum_calls and self._rate() >= self.failure_rate:
+				self._change(OPEN, now)
+
+	def _snapshot(self, now):
+		self._trim(now)
+		return {
+			'state': self.state,
+			'changed_at': self.changed_at,
+			'calls': len(self.outcomes),
+			'failure_rate': int(100 * self._rate()),
+			'rejected': self.rejected,
+			'instance': os.environ.get('INSTANCE_ID', ''),
+		}
+
+	def snapshot(self):
+		with self.lock:
+			return self._snapshot(time.time())
+
+
+def publish(name, snapshot):
+	try:
+		memcache.set(SNAPSHOT_PREFIX + name, snapshot, time=SNAPSHOT_TIME)
+	except Exception as e:
+		logging.warn('Could not publish circuit state for {0}: {1}'.format(name, e))
+
+def published_snapshots(names):
+	snapshots = memcache.get_multi(names, key_prefix=SNAPSHOT_PREFIX)
+	return dict((name, snapshots.get(name)) for name in names)
@@ -0,0 +1,76 @@
+import sys
+import time
+import logging
+import threading
+from Queue import Queue, Empty
+
+import defaults
+
+TIMED_OUT = object()
+
+def map_concurrently(function, items, max_workers=defaults.MAX_CONCURRENT_FETCHES, timeout=None):
+	"""
+	Applies function to every item using a bounded pool of threads and
+	returns the results in the same order as items.
+
+	If any call raises, the first failure (in item order) is re-raised in
+	the calling thread once all the calls have finished, just as it would
+	have been had the calls been made one after another.
+
+	With a timeout, the results of calls that have not finished after that
+	many seconds are TIMED_OUT, and calls not yet started are not made.
+	"""
+	items = list(items)
+
+	if timeout is None and (len(items) < 2 or max_workers < 2):
+		return [function(item) for item in items]
+
+	deadline = time.time() + timeout if timeout is not None else None
+
+	pending = Queue()
+	for index, item in enumerate(items):
+		pending.put((index, item))
+
+	outcomes = [None] * len(items)
+
+	def worker():
+		while True:
+			if deadline is not None and time.time() >= deadline:
+				return
+
+			try:
+				index, item = pending.get_nowait()
+			except Empty:
+				return
+
+			try:
+				outcomes[index] = (True, function(item))
+			except Exception:
+				outcomes[index] = (False, sys.exc_info())
+
+	workers = [threading.Thread(target=worker) for i in range(max(1, min(max_workers, len(items))))]
+
+	for thread in workers:
+		thread.daemon = deadline is not None
+		thread.start()
+
+	for thread in workers:
+		if deadline is None:
+			thread.join()
+		else:
+			thread.join(max(0, deadline - time.time()))
+
+	results = []
+
+	for outcome in list(outcomes):
+		if outcome is None:
+			results.append(TIMED_OUT)
+			continue
+
+		succeeded, outcome = outcome
+		if not succeeded:
+			logging.warn('Concurrent call failed: {0}'.format(outcome[1]))
+			raise outcome[0], outcome[1], outcome[2]
+		results.append(outcome)
+
+	return results
@@ -1,20 +1,96 @@
+import time
+import uuid
+import threading
+
 from google.appengine.ext import ndb
+from google.appengine.api import memcache
+
+import defaults
+
+VERSION_KEY = 'configuration:version'
 
 class Configuration(ndb.Model):
 	key = ndb.StringProperty(required=True)
 	value = ndb.StringProperty(required=True)
 
-def read(key, default=None):
-	results = Configuration.query(Configuration.key == key)
+class ConfigurationCache(object):
+	"""
+	Holds every configuration value in memory. The values are reloaded
+	when the version stamp in memcache changes, which is checked at most
+	once every check_interval seconds, so reads are dictionary lookups.
+
+	Values are loaded by key, which is strongly consistent, so a reload
+	straight after a write sees it. The query that lists the keys is only
+	eventually consistent, so keys already known are always loaded, and a
+	key that is not known yet is looked up the first time it is read.
+	"""
+	def __init__(self, check_interval=defaults.CONFIGURATION_CHECK_TIME):
+		self.check_interval = check_interval
+		self.lock = threading.Lock()
+		self.values = None
+		self.version = None
+		self.checked_at = 0
+		self.known_keys = set()
+
+	def read(self, key, default=None):
+		with self.lock:
+			values = self._current_values()
+
+			if key not in values:
+				values.update(self._load([key]))
+
+		value = values.get(key)
+		return default if value is None else value
+
+	def current_values(self):
+		with self.lock:
+			return dict((key, value) for key, value in self._current_values().items() if value is not None)
 
-	if not results.iter().has_next():
-		return default
+	def _current_values(self):
+		if self.values is not None and time.time() - self.checked_at < self.check_interval:
+			return self.values
 
-	key_value = results.iter().next().value
+		version = memcache.get(VERSION_KEY)
 
-	return key_value
+		if version is None:
+			version = uuid.uuid4().hex
+			if not memcache.add(VERSION_KEY, version):
+				version = memcache.get(VERSION_KEY)
+
+		if self.values is None or version is None or version != self.version:
+			self.values = self._load(self.known_keys, Configuration.query().fetch(keys_only=True))
+			self.version = version
+
+		self.checked_at = time.time()
+		return self.values
+
+	def _load(self, names, entity_keys=()):
+		"""
+		The values of the named settings and of the given entities, with
+		None for names that have no value.
+		"""
+		keys = set(entity_keys).union(ndb.Key(Configuration, name) for name in names)
+		values = dict((name, None) for name in names)
+
+		for config in ndb.get_multi(list(keys)):
+			if config:
+				values[config.key] = config.value
+
+		self.known_keys.update(values)
+		return values
+
+	def invalidate(self):
+		memcache.set(VERSION_KEY, uuid.uuid4().hex)
+		with self.lock:
+			self.values = None
+
+cache = ConfigurationCache()
+
+def read(key, default=None):
+	return cache.read(key, default)
 
 def write(key, value):
 	config = Configuration(id=key, key=key, value=value)
 	config.put()
+	cache.invalidate()
 	return config
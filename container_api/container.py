@@ -3,12 +3,13 @@ import json
 import urllib
 import traceback
 
-from google.appengine.api import urlfetch
-from google.appengine.api import memcache
-
 import defaults
 import configuration
 import capi
+import concurrency
+import http_client
+import render_context
+from caches import cache
 
 def for_id(container_id, sort_function=None, additional_capi_params=None):
 	return ContainerDataSource(container_id,
@@ -18,39 +19,38 @@ def for_id(container_id, sort_function=None, additional_capi_params=None):
 def for_front(front_id, metadata=None, additional_capi_params=None):
 	return FrontDataSource(front_id, metadata, additional_capi_params)
 
-def read_container_title(container_id, retries=3):
+def read_container_title(container_id):
 	container_base_url = configuration.read('CONTAINER_API_BASE_URL')
 	try:
 		url = "{0}/{1}".format(container_base_url, container_id)
 		logging.info(url)
-		result = urlfetch.fetch(url, deadline=9)
+		result = http_client.fetch(url, upstream='container')
 		if result.status_code == 200:
 			data = json.loads(result.content)
 			return data.get("config", {}).get("displayName")
 
 		return None
 
+	except http_client.HttpError:
+		raise
 	except Exception as e:
 		logging.warn('Container API call failed {0}'.format(e))
 		logging.warn(traceback.format_exc())
 
-		if retries > 0:
-			return read_container_title(container_id, retries=retries-1)
-
 	return None
 
-def read_container(container_id, retries=3, sort_function=None, additional_capi_params=None):
+def read_container(container_id, sort_function=None, additional_capi_params=None):
 	container_base_url = configuration.read('CONTAINER_API_BASE_URL')
 	try:
 		url = "{0}/{1}".format(container_base_url, container_id)
 
-		result = urlfetch.fetch(url, deadline=9)
+		result = http_client.fetch(url, upstream='container')
 		if result.status_code == 200:
 			data = json.loads(result.content)
 			live_stories = data.get('collection', {}).get('live', [])
 			live_story_ids = [item['id'] for item in live_stories]
 			
-			stories = [capi.read_item(item_id, additional_params=additional_capi_params) for item_id in live_story_ids]
+			stories = [story for story in capi.read_items(live_story_ids, additional_params=additional_capi_params) if story]
 
 			if sort_function:
 				return sorted(stories, sort_function)
@@ -59,12 +59,28 @@ def read_container(container_id, retries=3, sort_function=None, additional_capi_
 
 		return []
 
+	except http_client.HttpError:
+		raise
 	except Exception as e:
 		logging.warn('Container API call failed {0}'.format(e))
 		logging.warn(traceback.format_exc())
 
-		if retries > 0:
-			return read_container(container_id, retries=retries-1)
+	return []
+
+def read_container_or_degrade(container_id, additional_capi_params=None):
+	"""
+	The stories of one of the containers on a front, or none if it could
+	not be read, in which case it is recorded as a degraded section so
+	that the front is only cached briefly.
+	"""
+	try:
+		return read_container(container_id, additional_capi_params=additional_capi_params)
+	except http_client.OutOfTime as e:
+		logging.warn('Container API call failed {0}'.format(e))
+		render_context.degrade(container_id, render_context.TIMED_OUT)
+	except http_client.HttpError as e:
+		logging.warn('Container API call failed {0}'.format(e))
+		render_context.degrade(container_id, render_context.FAILED)
 
 	return []
 
@@ -89,7 +105,7 @@ class FrontDataSource:
 		self.metadata = metadata
 		self.additional_capi_params = additional_capi_params
 
-	def _fetch_containers_for_front(self, retries=3):
+	def _fetch_containers_for_front(self):
 		container_api_host = configuration.read('CONTAINER_API_HOST')
 		try:
 			url = "http://{host}/list/collections/by/front/{front_id}".format(
@@ -100,23 +116,29 @@ class FrontDataSource:
 				url = "{url}/and/by/metadata/{metadata}".format(
 					url=url,
 					metadata=self.metadata)
-			
-			result = urlfetch.fetch(url, deadline=9)
+
+			cached_containers = cache.get(url)
+
+			if cached_containers is not None:
+				return cached_containers
+
+			result = http_client.fetch(url, upstream='container')
 			
 			if result.status_code == 200:
 				data = json.loads(result.content)
+				containers = data.get('data', [])
 
-				return data.get('data', [])
+				cache.set(url, containers, time=defaults.FRONT_CACHE_TIME)
+				return containers
 				
 			return []
 		
+		except http_client.HttpError:
+			raise
 		except Exception as e:
 			logging.warn('Container API call failed {0}'.format(e))
 			logging.warn(traceback.format_exc())
 
-			if retries > 0:
-				return self.fetch_title_override(retries=retries-1)
-
 		return []
 		
 	
@@ -136,6 +158,16 @@ class FrontDataSource:
 		
 		containers = self._fetch_containers_for_front()
 
-		resolved_containers = [read_container(container_id, additional_capi_params=self.additional_capi_params) for container_id in containers]
-		stories = [capi_item for container_items in resolved_containers for capi_item in container_items]
+		resolved_containers = concurrency.map_concurrently(
+			render_context.bound(lambda container_id: read_container_or_degrade(container_id, additional_capi_params=self.additional_capi_params)),
+			containers,
+			timeout=render_context.remaining_time())
+
+		stories = []
+		for container_id, container_items in zip(containers, resolved_containers):
+			if container_items is concurrency.TIMED_OUT:
+				render_context.degrade(container_id, render_context.TIMED_OUT)
+				continue
+			stories.extend(container_items)
+
 		return stories
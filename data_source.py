@@ -4,6 +4,8 @@ from urlparse import urlparse
 
 import pysistence as immutable
 
+import defaults
+
 if os.environ.has_key('RUNNING_UNIT_TESTS'):
     from prefetch import perma_cache_stub as perma_cache
 else:
@@ -13,6 +15,10 @@ else:
 DEFAULT_TAGS = ['-news/series/picture-desk-live']
 DEFAULT_SHOW_TAGS = ['type', 'tone', 'keyword']
 
+# The criteria that only shape each result rather than filter or page
+# the results, so are all an ids search is sent
+IDS_QUERY_CRITERIA = ['show-fields', 'show-tags', 'show_elements', 'show_atoms', 'user-tier']
+
 class DataSource(object):
     def __init__(self, client):
         self.client = client
@@ -144,6 +150,7 @@ class OphanDataSource(DataSource):
     def __init__(self, client, multi_content_data_source, fetcher, n_items):
         DataSource.__init__(self, client)
         self.multi_content_data_source = multi_content_data_source
+        self.multi_content_data_source.batched = True
         self.fetcher = fetcher
         self.n_items = n_items
 
@@ -179,6 +186,7 @@ class MostSharedDataSource(DataSource):
 
         self.multi_content_data_source = multi_content_data_source
         self.multi_content_data_source.fields.append('shortUrl')
+        self.multi_content_data_source.batched = True
 
         self.most_shared_fetcher = most_shared_fetcher
         self.shared_count_interpolator  = shared_count_interpolator
@@ -225,23 +233,54 @@ class ItemDataSource(DataSource):
 
 
 class MultiContentDataSource(ItemDataSource):
-    def __init__(self, client, name):
+    def __init__(self, client, name, batched=False):
         ItemDataSource.__init__(self, client)
         self.content_ids = None
         self.name = name
         self.show_tags = ['keyword']
         self.show_elements = 'image'
+        self.batched = batched
 
     def _do_call(self, **criteria):
         if not self.content_ids:
             logging.warning("content_ids must be set before calling fetch_data()")
             return []
 
+        if self.batched:
+            return self._do_batched_call(**criteria)
+
         result = []
         for id in self.content_ids:
             result.extend(self.client.content_query(id, **criteria))
         return result
 
+    def _do_batched_call(self, **criteria):
+        """
+        Resolves the content ids a page of search results at a time
+        rather than one item call per id. Only works for real content ids
+        (such as the paths Ophan returns), not short urls. The tag, date
+        and section filters are left out, as an item call ignores them.
+        """
+        criteria = dict((key, value) for key, value in criteria.items() if key in IDS_QUERY_CRITERIA)
+
+        content_ids = []
+        for content_id in self.content_ids:
+            content_id = content_id.strip('/')
+            if content_id not in content_ids:
+                content_ids.append(content_id)
+
+        found = {}
+        for start in range(0, len(content_ids), defaults.CAPI_MAX_PAGE_SIZE):
+            batch = content_ids[start:start + defaults.CAPI_MAX_PAGE_SIZE]
+            for content in self.client.ids_query(batch, **criteria):
+                found[content['id']] = content
+
+        missing = [content_id for content_id in content_ids if content_id not in found]
+        if missing:
+            logging.info('Content not found for ids: {0}'.format(', '.join(missing)))
+
+        return [found[content_id] for content_id in content_ids if content_id in found]
+
     def __repr__(self):
         return str(self.__class__) + self.name
 
@@ -6,7 +6,55 @@ content_item_fields = ['trailText',
 	'standfirst',
 	'commentable',
 	'thumbnail',
-	'byline']
+	'byline',
+	'lastModified']
 
-MAX_MEMCACHE_LENGTH=1000000
-CACHE_TIME=2*60
\ No newline at end of file
+MEMCACHE_CHUNK_SIZE=950000
+CACHE_TIME=2*60
+STALE_CACHE_TIME=30*60
+REFRESH_LOCK_TIME=30
+LOCAL_CACHE_TIME=60
+# Seconds to keep a memcache value locally when it has no expiry stored with it
+LOCAL_CACHE_UNKNOWN_EXPIRY_TIME=5
+LOCAL_CACHE_MAX_ENTRIES=2000
+LOCAL_CACHE_MAX_BYTES=16*1024*1024
+FRONT_CACHE_TIME=60
+CONFIGURATION_CHECK_TIME=5
+TEMPLATE_CACHE_SIZE=200
+FRAGMENT_CACHE_TIME=10*60
+FRAGMENT_CACHE_MAX_ENTRIES=5000
+FRAGMENT_CACHE_MAX_BYTES=8*1024*1024
+MAX_CONCURRENT_FETCHES=10
+PAGE_CACHE_TIME=5*60
+DEGRADED_PAGE_CACHE_TIME=30
+# Pages are warmed this long before a send, and cached long enough to cover
+# the scrapes that follow it
+WARM_LEAD_TIME=15*60
+WARM_PAGE_CACHE_TIME=45*60
+STREAM_CHUNK_SIZE=8*1024
+# Seconds a render may spend fetching, and the shortest upstream deadline
+# worth making a call with
+RENDER_BUDGET=25
+MIN_UPSTREAM_DEADLINE=1
+# Seconds left for fetching title overrides however much of the budget the
+# data took
+TITLE_OVERRIDE_ALLOWANCE=3
+CAPI_MAX_PAGE_SIZE=50
+
+# Deadlines (seconds) and retries of transport failures for each upstream
+UPSTREAMS = {
+	'default': {'deadline': 5, 'retries': 1},
+	'capi': {'deadline': 8, 'retries': 1},
+	'container': {'deadline': 9, 'retries': 3},
+	'ophan': {'deadline': 5, 'retries': 1},
+	'discussion': {'deadline': 5, 'retries': 1},
+}
+
+# Circuit breakers open when at least failure_rate of the calls made in the
+# last window seconds failed, and probe again after open_time seconds
+CIRCUIT_BREAKER = {
+	'window': 60,
+	'minimum_calls': 10,
+	'failure_rate': 0.5,
+	'open_time': 30,
+}
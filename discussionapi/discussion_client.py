@@ -1,29 +1,29 @@
 from urlparse import urljoin, urlparse
 import json
-import urllib
-import urllib2
 import logging
 
 import pysistence as immutable
-from google.appengine.api import urlfetch
+
+import http_client
 
 class DiscussionClient(object):
     def __init__(self, base_url):
         self.base_url = base_url
 
     def do_get(self, url):
+        logging.info("Discussion URL: " + url)
+
         try:
-            logging.info("Discussion URL: " + url)
-            u = urllib2.urlopen(url)
-        except urllib2.URLError as e:
-            if hasattr(e, 'reason'):
-                logging.error('Could not reach server while accessing %s. Reason: %s' % (url, e.reason))
-            elif hasattr(e, 'code'):
-                logging.error('Server could not fulfill request at %s. Error: %s' % (url, e.code))
+            response = http_client.fetch(url, upstream='discussion')
+        except http_client.HttpError as e:
+            logging.error('Could not reach server while accessing %s. Reason: %s' % (url, e))
             raise e
 
-        headers = u.headers.dict
-        return headers, u.read()
+        if response.status_code != 200:
+            logging.error('Server could not fulfill request at %s. Error: %s' % (url, response.status_code))
+            raise http_client.HttpError('Discussion returned {0} for {1}'.format(response.status_code, url))
+
+        return response.headers, response.content
 
 
 class DiscussionFetcher(object):
@@ -57,7 +57,11 @@ def comment_counts(client, urls):
         base_url=client.base_url,
         params=','.join(paths))
 
-    result = urlfetch.fetch(counts_url)
+    try:
+        result = http_client.fetch(counts_url, upstream='discussion')
+    except http_client.HttpError as e:
+        logging.warning("Comment Count fetch failed: {0}".format(e))
+        return {}
 
     if not result.status_code == 200:
         logging.info(counts_url)
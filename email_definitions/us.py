@@ -18,6 +18,8 @@ discussion_client = DiscussionClient(mr.discussion_base_url)
 
 class DailyEmailUS(handlers.EmailTemplate):
     minify = True
+    minifier = 'fast'
+    stream = True
     cache_bust = False
 
     recognized_versions = immutable.make_list('v1', 'v3', 'v6', 'v7', 'v2015', 'v2015_v2', 'v2015_v3', 'v2015_v4', 'categories_us')
@@ -4,6 +4,7 @@ import json
 
 import urllib, urlparse
 import fetchers
+import defaults
 
 class ApiClient(object):
 
@@ -86,5 +87,18 @@ class ApiClient(object):
 
         return results
 
+    def ids_query(self, content_ids, **kwargs):
+        """
+        Resolves up to defaults.CAPI_MAX_PAGE_SIZE content ids with a
+        single search call. Ids that CAPI cannot find are simply absent
+        from the results, which come back in no particular order.
+        """
+        kwargs['ids'] = ','.join(content_ids)
+        kwargs['page-size'] = min(len(content_ids), defaults.CAPI_MAX_PAGE_SIZE)
+
+        json = self._do_call('search', **kwargs)
+
+        return json.get('response', {}).get('results', [])
+
     def __repr__(self):
         return '<%s: %s-%s>' % (self.__class__.__name__, self.base_url)
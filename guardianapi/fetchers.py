@@ -1,50 +1,142 @@
+import os
+import time
 import logging
-import httplib
-import urllib2
 
 from google.appengine.api import memcache
+from google.appengine.ext import deferred
 
 import defaults
+import http_client
+import projection
+from caches import cache
 
 def best_fetcher():
-    return Fetcher()
+    return Fetcher(transform=projection.project_response)
 
-def read_url(url, retries=1, timeout=5):
+def read_url(url, headers=None):
+    """
+    Raises HttpError when CAPI cannot be reached or fails, its circuit is
+    open or the render is out of time, so that the section reading it is
+    cut off. Any other error status comes back as None.
+    """
     try:
-        return urllib2.urlopen(url, timeout=timeout)
-    except urllib2.URLError as e:
-        if hasattr(e, 'reason'):
-            logging.error('Could not reach server while accessing %s. Reason: %s' % (url, e.reason))
-        elif hasattr(e, 'code'):
-            logging.error('Server could not fulfill request at %s. Error: %s' % (url, e.code))
+        response = http_client.fetch(url, upstream='capi', headers=headers)
+    except http_client.HttpError as e:
+        logging.error('Could not reach server while accessing %s. Reason: %s' % (url, e))
+        raise
+
+    if response.status_code >= 500:
+        logging.error('Server could not fulfill request at %s. Error: %s' % (url, response.status_code))
+        raise http_client.HttpError('CAPI returned {0} for {1}'.format(response.status_code, url))
+
+    if response.status_code not in (200, 304):
+        logging.error('Server could not fulfill request at %s. Error: %s' % (url, response.status_code))
         return None
-    except httplib.HTTPException as he:
-        logging.warning("HTTP Exception thrown, retries {0} remaining".format(retries))
-        if retries:
-            return read_url(url, retries=retries-1)
-        raise he
+
+    return response
+
+def refresh(url):
+    try:
+        best_fetcher().fetch_and_store(url)
+    except http_client.HttpError as e:
+        logging.warn('Could not refresh %s: %s' % (url, e))
+
+
+class TaskQueueRefresher(object):
+    """
+    Refreshes stale responses in a deferred task, off the request path.
+    """
+    def refresh(self, url):
+        deferred.defer(refresh, url)
+
+
+class InlineRefresher(object):
+    """
+    Refreshes stale responses straight away, standing in for the task
+    queue when running tests.
+    """
+    def refresh(self, url):
+        refresh(url)
+
+
+def best_refresher():
+    if os.environ.has_key('RUNNING_UNIT_TESTS'):
+        return InlineRefresher()
+    return TaskQueueRefresher()
+
 
 class Fetcher(object):
+    """
+    Caches responses with a soft and a hard expiry. Fresh responses are
+    served from the cache; stale ones are still served but a refresh is
+    scheduled in the background; only once a response has gone completely
+    does a request have to wait for the upstream.
+
+    A transform, if given, is applied to each response body before it is
+    cached.
+
+    Cached responses are revalidated with their ETag or Last-Modified
+    header, and a 304 just makes the cached response fresh again.
+    """
+    def __init__(self, refresher=None, transform=None):
+        self.refresher = refresher or best_refresher()
+        self.transform = transform
+
     def get(self, url):
-        api_response = memcache.get(url)
+        entry = cache.get(url)
 
-        if api_response:
-            return api_response
+        if isinstance(entry, dict):
+            if entry['fresh_until'] < time.time():
+                self.schedule_refresh(url)
+            return entry['headers'], entry['body']
 
-        u = read_url(url)
+        return self.fetch_and_store(url)
 
-        if not u:
-            return None, None
+    def schedule_refresh(self, url):
+        if memcache.add('refreshing:' + url, True, time=defaults.REFRESH_LOCK_TIME):
+            logging.debug('Scheduling refresh of stale response for %s' % url)
+            self.refresher.refresh(url)
+
+    def conditional_headers(self, entry):
+        if not isinstance(entry, dict):
+            return None
+
+        headers = {}
 
-        headers = u.headers.dict
-        api_response = (headers, u.read())
+        if 'etag' in entry['headers']:
+            headers['If-None-Match'] = entry['headers']['etag']
+
+        if 'last-modified' in entry['headers']:
+            headers['If-Modified-Since'] = entry['headers']['last-modified']
+
+        return headers or None
+
+    def fetch_and_store(self, url):
+        entry = cache.get(url)
+        response = read_url(url, headers=self.conditional_headers(entry))
+
+        if not response:
+            return None, None
 
-        response_length = sum([len(api_response[i]) for i in range(2)])
+        if response.status_code == 304:
+            if not isinstance(entry, dict):
+                return None, None
 
-        if response_length < defaults.MAX_MEMCACHE_LENGTH:
-            memcache.set(url, api_response, time=defaults.CACHE_TIME)
+            logging.debug('Revalidated cached response for %s' % url)
+            entry = dict(entry, fresh_until=time.time() + defaults.CACHE_TIME)
+            cache.set(url, entry, time=defaults.STALE_CACHE_TIME)
+            return entry['headers'], entry['body']
 
-        return api_response
+        body = response.content
 
+        if self.transform:
+            body = self.transform(body)
 
+        entry = {
+            'headers': response.headers,
+            'body': body,
+            'fresh_until': time.time() + defaults.CACHE_TIME,
+        }
+        cache.set(url, entry, time=defaults.STALE_CACHE_TIME)
 
+        return response.headers, body
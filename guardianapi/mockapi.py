@@ -1,140 +1,160 @@
 """
-A fetcher that returns fake replies, for running tests.
+Fake CAPI replies, for running tests and standing in for CAPI locally.
+
+Every reply is generated from the request, so the same request always
+gets the same reply.
 """
 
-from fetchers import Fetcher
-import urlparse, cgi, simplejson, datetime
-from hashlib import md5
+import json
+import random
+import urllib
+import hashlib
+import urlparse
+
+SECTIONS = ('world', 'uk-news', 'us-news', 'australia-news', 'politics', 'business',
+    'commentisfree', 'sport', 'culture', 'film', 'music', 'books', 'fashion', 'travel',
+    'technology', 'media', 'lifeandstyle', 'environment')
+TONES = ('tone/news', 'tone/news', 'tone/news', 'tone/comment', 'tone/features', 'tone/reviews')
+IMAGE_WIDTHS = (140, 300, 460, 500, 620, 1000, 1200, 2000)
+WORDS = ('election', 'minister', 'market', 'climate', 'storm', 'league', 'review', 'album',
+    'film', 'report', 'court', 'city', 'plan', 'record', 'crisis', 'talks', 'season', 'budget',
+    'vote', 'deal', 'warning', 'summer', 'new', 'first', 'final')
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for i in range(count)).capitalize()
+
+def fake_ids(seed, count):
+    rng = random.Random(seed)
+    return ['{0}/2016/jun/{1:02d}/{2}'.format(rng.choice(SECTIONS), rng.randint(1, 28),
+        words(rng, 5).lower().replace(' ', '-')) for i in range(count)]
+
+def fake_short_path(item_id):
+    return item_id if item_id.startswith('p/') else 'p/' + hashlib.sha1(item_id).hexdigest()[:5]
+
+def fake_image_element(rng, relation, item_id):
+    media_path = hashlib.sha1(item_id).hexdigest()[:12]
+
+    return {
+        'id': '{0}-{1}'.format(relation, rng.randint(0, 1 << 30)),
+        'relation': relation,
+        'type': 'image',
+        'assets': [{
+            'type': 'image',
+            'mimeType': 'image/jpeg',
+            'file': 'http://media.guim.co.uk/{0}/{1}.jpg'.format(media_path, width),
+            'typeData': {
+                'width': str(width),
+                'height': str(width * 3 / 5),
+                'secureFile': 'https://media.guim.co.uk/{0}/{1}.jpg'.format(media_path, width),
+                'altText': words(rng, 6),
+                'caption': words(rng, 12),
+                'credit': 'Photograph: Agency',
+            },
+        } for width in IMAGE_WIDTHS],
+    }
+
+def fake_article(item_id):
+    item_id = item_id.lstrip('/')
+    rng = random.Random(item_id)
+    section = item_id.split('/')[0]
+    title = words(rng, rng.randint(6, 12))
+    keyword = '{0}/{1}'.format(section, words(rng, 1).lower())
+
+    return {
+        'id': item_id,
+        'type': 'article',
+        'sectionId': section,
+        'sectionName': section.replace('-', ' ').capitalize(),
+        'webPublicationDate': '2016-06-{0:02d}T{1:02d}:00:00Z'.format(rng.randint(1, 28), rng.randint(0, 23)),
+        'webTitle': title,
+        'webUrl': 'https://www.theguardian.com/' + item_id,
+        'apiUrl': 'https://content.guardianapis.com/' + item_id,
+        'isHosted': False,
+        'fields': {
+            'headline': title,
+            'trailText': words(rng, rng.randint(12, 25)),
+            'standfirst': '<p>{0}</p>'.format(words(rng, rng.randint(20, 40))),
+            'byline': 'A Writer',
+            'thumbnail': 'https://media.guim.co.uk/{0}/500.jpg'.format(hashlib.sha1(item_id).hexdigest()[:12]),
+            'shortUrl': 'https://gu.com/' + fake_short_path(item_id),
+            'commentable': rng.choice(('true', 'false')),
+            'liveBloggingNow': 'false',
+            'lastModified': '2016-06-28T12:00:00Z',
+        },
+        'tags': [
+            {'id': rng.choice(TONES), 'type': 'tone', 'webTitle': 'Tone'},
+            {'id': keyword, 'type': 'keyword', 'webTitle': words(rng, 2), 'sectionId': section},
+            {'id': section + '/' + section, 'type': 'keyword', 'webTitle': section.capitalize(), 'sectionId': section},
+            {'id': 'profile/a-writer', 'type': 'contributor', 'webTitle': 'A Writer'},
+        ],
+        'elements': [fake_image_element(rng, 'main', item_id), fake_image_element(rng, 'thumbnail', item_id)],
+        'atoms': None,
+    }
+
+def fake_tag(tag_id):
+    return {
+        'id': tag_id,
+        'type': 'keyword',
+        'webTitle': tag_id.split('/')[-1].replace('-', ' ').capitalize(),
+        'webUrl': 'https://www.theguardian.com/' + tag_id,
+        'apiUrl': 'https://content.guardianapis.com/' + tag_id,
+        'sectionId': tag_id.split('/')[0],
+    }
+
+def fake_response(path, parameters, seed=None):
+    """
+    The reply CAPI would give to a request for path (relative to its base
+    url) with the given query parameters. Results are chosen by the seed,
+    which defaults to the request itself.
+    """
+    path = path.strip('/')
+    seed = seed or path + '?' + urllib.urlencode(sorted(parameters.items()))
+    page_size = int(parameters.get('page-size', 10))
+
+    if path == 'tags':
+        results = [fake_tag('{0}/{1}'.format(section, section)) for section in SECTIONS[:page_size]]
+        return {'response': {'status': 'ok', 'total': len(results), 'results': results}}
 
-class MockFetcher(Fetcher):
-    def __init__(self):
+    if 'ids' in parameters:
+        results = [fake_article(item_id) for item_id in parameters['ids'].split(',')]
+    else:
+        results = [fake_article(item_id) for item_id in fake_ids(seed, page_size)]
+
+    response = {'status': 'ok', 'total': len(results), 'results': results}
+
+    if path != 'search':
+        response['content'] = fake_article(path)
+        response['editorsPicks'] = [fake_article(item_id) for item_id in fake_ids(path + '#picks', 5)]
+        response['mostViewed'] = [fake_article(item_id) for item_id in fake_ids(path + '#viewed', 10)]
+
+    return {'response': response}
+
+
+class MockFetcher(object):
+    """
+    Answers an ApiClient with fake replies instead of calling CAPI, and
+    keeps the urls it was asked for.
+    """
+    def __init__(self, base_url=''):
+        self.base_url = base_url
         self.reset()
-    
+
     def reset(self):
-        self.fetched = [] # (url, kwargs-dict) pairs
-        self.fake_total_results = 101
-    
+        self.fetched = [] # (url, parameters) pairs
+
     def get(self, url):
-        bits = urlparse.urlparse(url)
-        endpoint = bits.path.split('/')[-1]
-        args = tuple()
-        if endpoint not in ('search', 'tags'):
-            if bits.path.startswith('/content/item'):
-                args = (endpoint,)
-                endpoint = 'item'
-            else:
-                assert False, 'Unrecognised URL: %s' % url
-        
-        kwargs = cgi.parse_qs(bits.query)
-        # foo=bar becomes {'foo': ['bar']} - collapse single values
-        for key in kwargs:
-            if isinstance(kwargs[key], list) and len(kwargs[key]) == 1:
-                kwargs[key] = kwargs[key][0]
-        
-        method = getattr(self, 'do_%s' % endpoint)
-        json_data = method(*args, **kwargs)
-        
-        self.record(url, kwargs, json_data)
-        
-        return {}, json.dumps(json, indent=4)
-    
-    def record(self, url, args, json):
-        "Record attempted URL fetches so we can run assertions against them"
-        self.fetched.append((url, args))
-        # print '     ', url
-        # print '     ', args
-        # try:
-        #     print '      Got %s results' % len(json['search']['results'])
-        # except KeyError:
-        #     pass
-    
-    def do_search(self, **kwargs):
-        start_index = int(kwargs.get('start-index', 0))
-        count = int(kwargs.get('count', 10))
-        # How many results should we return?
-        num_results = min(
-            self.fake_total_results - start_index, count
-        )
-        
-        return {
-            "search": {
-                "count": self.fake_total_results,
-                "startIndex": start_index,
-                "results": [
-                    self.fake_article(article_id) 
-                    for article_id in range(
-                        start_index, start_index + num_results
-                    )
-                ],
-                "filters": [{
-                    "name": "Article",
-                    "type": "content-type",
-                    "filter": "/global/article",
-                    "apiUrl": "http://mockgdnapi/content/search?filter=/global/article",
-                    "webUrl": "http://www.theguardian.com/global/article",
-                    "count": 989610,
-                    "filterUrl": "http://mockgdnapi/content/search?format=json&filter=/global/article"
-                } for i in range(4)]
-            }
-        }
-    
-    def do_tags(self, **kwargs):
-        start_index = int(kwargs.get('start-index', 0))
-        count = int(kwargs.get('count', 10))
-        # How many results should we return?
-        num_results = min(
-            self.fake_total_results - start_index, count
-        )
-        
-        return {
-            "subjects": {
-                "count": self.fake_total_results,
-                "startIndex": start_index,
-                "tags": [{
-                    "name": "Tag %s" % i,
-                    "section": "Tags",
-                    "filter": "/tag/%s" % i,
-                    "apiUrl": "http://mockgdnapi/content/search?filter=/tag/%s" % i,
-                    "webUrl": "http://www.theguardian.com/faketag/%s" % i
-                } for i in range(start_index, start_index + num_results)],
-            }
-        }
-    
-    def do_item(self, rest_of_url, **kwargs):
-        return {'content': self.fake_article(rest_of_url.replace('/', ''))}
-    
-    def fake_article(self, article_id):
-        # All generated publication dates are within 365 days of now
-        delta = datetime.timedelta(days = (
-            hash(md5(str(article_id)).hexdigest()) % 365
-        ))
-        publicationDate = datetime.datetime.now() - delta
-        return {
-            "id": str(article_id),
-            "type": "article",
-            "publication": "The Guardian",
-            "headline": "Mock headline %s" % article_id,
-            "standfirst": "Mock standfirst %s" % article_id,
-            "byline": "Mock Byline",
-            "sectionName": "Mock section",
-            "trailText": "Mock trailText %s" % article_id,
-            "linkText": "Mock linkText %s" % article_id,
-            "webUrl": "http://www.theguardian.com/fake-url/%s" % article_id,
-            "apiUrl": "http://mockgdnapi/content/item/%s" % article_id,
-            "publicationDate": publicationDate.strftime('%Y-%m-%dT%H:%M:%S'),
-            "typeSpecific": {
-                "@class": "article",
-                "body": "Mock content for article %s" % article_id,
-            },
-            "tags": self.fake_tags(article_id)
-        }
-    
-    def fake_tags(self, article_id):
-        return [{
-            "name": "Article",
-            "type": "content-type",
-            "filter": "/global/article",
-            "apiUrl": "http://mockgdnapi/content/search?filter=/global/article",
-            "webUrl": "http://www.theguardian.com/global/article"
-        } for i in range(4)]
+        if self.base_url and url.startswith(self.base_url):
+            url_path = url[len(self.base_url):]
+        else:
+            url_path = url
+
+        bits = urlparse.urlparse(url_path)
+        parameters = dict(urlparse.parse_qsl(bits.query))
 
+        self.record(url, parameters)
+
+        return {}, json.dumps(fake_response(bits.path, parameters), indent=4)
+
+    def record(self, url, parameters):
+        "Record attempted URL fetches so we can run assertions against them"
+        self.fetched.append((url, parameters))
@@ -0,0 +1,110 @@
+"""
+Reduces CAPI responses to the parts of each content item the templates
+read, so that less is cached, deserialised and held during a render.
+
+Every scalar on an item and its requested fields are kept. Tags keep the
+keys read by get_tone, get_keyword and has_tag. Elements keep the image
+relations read by get_image (and the first element, which
+get_video_assets reads) with every asset width, since the width picked
+depends on the template. Media atoms keep their poster image.
+
+Each projected item also carries its view model, so what the templates
+derive from it is worked out once per fetch.
+"""
+
+import json
+import logging
+
+import view_model
+
+ITEM_LISTS = ('results', 'editorsPicks', 'mostViewed')
+
+TAG_KEYS = ('id', 'type', 'webTitle', 'sectionId', 'webUrl')
+
+ELEMENT_RELATIONS = ('thumbnail', 'main')
+ELEMENT_KEYS = ('id', 'relation', 'type')
+
+ASSET_KEYS = ('type', 'mimeType', 'file')
+ASSET_TYPE_DATA_KEYS = ('width', 'height', 'secureFile', 'altText', 'caption', 'source', 'credit')
+
+def pick(data, keys):
+    return dict((key, data[key]) for key in keys if key in data)
+
+def project_asset(asset):
+    projected = pick(asset, ASSET_KEYS)
+
+    if 'typeData' in asset:
+        projected['typeData'] = pick(asset['typeData'], ASSET_TYPE_DATA_KEYS)
+
+    return projected
+
+def project_element(element):
+    projected = pick(element, ELEMENT_KEYS)
+
+    if 'assets' in element:
+        projected['assets'] = [project_asset(asset) for asset in element['assets']]
+
+    return projected
+
+def project_media_atom(atom):
+    media = atom.get('data', {}).get('media', {})
+
+    projected_media = pick(media, ('title',))
+
+    if 'posterImage' in media:
+        projected_media['posterImage'] = {
+            'assets': [project_asset(asset) for asset in media['posterImage'].get('assets', [])]
+        }
+
+    return dict(pick(atom, ('id',)), data={'media': projected_media})
+
+def project_item(item):
+    if not isinstance(item, dict):
+        return item
+
+    projected = dict((key, value) for key, value in item.items()
+        if not isinstance(value, (dict, list)))
+
+    if 'fields' in item:
+        projected['fields'] = item['fields']
+
+    if 'tags' in item:
+        projected['tags'] = [pick(tag, TAG_KEYS) for tag in item['tags']]
+
+    if 'elements' in item:
+        elements = item['elements']
+        projected['elements'] = [project_element(element) for index, element in enumerate(elements)
+            if index == 0 or element.get('relation') in ELEMENT_RELATIONS]
+
+    if 'atoms' in item:
+        atoms = item['atoms'] or {}
+        projected['atoms'] = {}
+        if atoms.get('media'):
+            projected['atoms']['media'] = [project_media_atom(atom) for atom in atoms['media']]
+
+    return view_model.normalise(projected)
+
+def project_response(body):
+    """
+    Projects every content item in a raw CAPI response body, returning
+    the new body. Bodies that are not CAPI JSON come back unchanged.
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        logging.warning('Could not project a response that is not JSON')
+        return body
+
+    response = data.get('response') if isinstance(data, dict) else None
+
+    if not isinstance(response, dict):
+        return body
+
+    if 'content' in response:
+        response['content'] = project_item(response['content'])
+
+    for item_list in ITEM_LISTS:
+        if isinstance(response.get(item_list), list):
+            response[item_list] = [project_item(item) for item in response[item_list]]
+
+    return json.dumps(data, separators=(',', ':'))
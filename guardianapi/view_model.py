@@ -0,0 +1,202 @@
+"""
+What the templates derive from a content item, worked out once when the
+item comes back from CAPI instead of on every filter call.
+
+The view is kept on the item under VIEW_KEY. It refers to assets by their
+position in the item's elements rather than copying them, so it stays
+small and survives the item being cached as JSON or pickled. Items that
+did not come through the projection, or whose view is out of date, have
+it worked out whenever it is asked for: items are shared by the caches,
+so nothing is written to them once they have been handed out.
+"""
+
+import copy
+import logging
+
+VIEW_KEY = '_view'
+VIEW_VERSION = 2
+
+POSTER_WIDTH = '480'
+POSTER_HEIGHT = '460'
+
+def tag_index(item):
+    return dict((tag['id'], tag.get('type')) for tag in item.get('tags', []) if 'id' in tag)
+
+def tone(item):
+    tones = [tag['id'] for tag in item.get('tags', []) if tag.get('type') == 'tone']
+    return tones[-1] if tones else None
+
+def keyword(item):
+    for tag in item.get('tags', []):
+        if tag.get('type') != 'keyword' or 'sectionId' not in tag:
+            continue
+
+        id_parts = tag['id'].split('/')
+        if len(id_parts) > 1 and id_parts[1] != tag['sectionId']:
+            return tag['webTitle']
+
+    return None
+
+def image_table(item):
+    """
+    Maps each relation to the position of its first element, the position
+    of the first asset of each width in that element and the picks of
+    get_image.
+    """
+    table = {}
+
+    for element_index, element in enumerate(item.get('elements', [])):
+        relation = element.get('relation')
+        if relation in table:
+            continue
+
+        widths = {}
+        for asset_index, asset in enumerate(element.get('assets', [])):
+            width = asset.get('typeData', {}).get('width')
+            if width and width not in widths:
+                widths[width] = asset_index
+
+        table[relation] = {'element': element_index, 'widths': widths, 'picks': image_picks(element.get('assets', []))}
+
+    return table
+
+def video_poster(item):
+    elements = item.get('elements', [])
+
+    if elements:
+        assets = elements[0].get('assets', [])
+        if not assets:
+            return None
+
+        poster = assets[0]
+        for asset in assets:
+            type_data = asset.get('typeData', {})
+            if type_data.get('width') == POSTER_WIDTH or type_data.get('height') == POSTER_HEIGHT:
+                poster = asset
+
+        return {
+            'file': poster.get('file'),
+            'alt_text': poster.get('typeData', {}).get('altText', 'video image'),
+        }
+
+    media_atoms = (item.get('atoms') or {}).get('media')
+
+    if media_atoms:
+        media = media_atoms[0].get('data', {}).get('media', {})
+        poster_assets = media.get('posterImage', {}).get('assets', [])
+        return {
+            'file': poster_assets[0].get('file') if poster_assets else None,
+            'alt_text': media.get('title', 'video image'),
+        }
+
+    return None
+
+def build_view(item):
+    return {
+        'version': VIEW_VERSION,
+        'tags': tag_index(item),
+        'tone': tone(item),
+        'keyword': keyword(item),
+        'images': image_table(item),
+        'video_poster': video_poster(item),
+    }
+
+def is_current(view):
+    return isinstance(view, dict) and view.get('version') == VIEW_VERSION
+
+def normalise(item):
+    if isinstance(item, dict) and not is_current(item.get(VIEW_KEY)):
+        item[VIEW_KEY] = build_view(item)
+
+    return item
+
+def view(item):
+    stored = item.get(VIEW_KEY)
+    return stored if is_current(stored) else build_view(item)
+
+def pick_image(assets, max_width):
+    """
+    The position of the asset get_image shows: the widest one no wider
+    than max_width, or the narrowest one if they are all wider.
+    """
+    def too_big(index):
+        return max_width and int(assets[index]['typeData']['width']) > max_width
+
+    def best_image(current_best, index):
+        if assets[current_best]['typeData']['width'] > assets[index]['typeData']['width']:
+            return current_best
+        return index
+
+    def smallest_image(current_smallest, index):
+        if assets[current_smallest]['typeData']['width'] < assets[index]['typeData']['width']:
+            return current_smallest
+        return index
+
+    fitting = [index for index in range(len(assets)) if not too_big(index)]
+
+    if fitting:
+        return reduce(best_image, fitting)
+
+    if assets:
+        return reduce(smallest_image, range(len(assets)))
+
+    return None
+
+def image_picks(assets):
+    """
+    What pick_image gives for any max_width: the pick with no limit, the
+    pick for a limit below every width, and the pick at each width an
+    asset has, which holds until the next one. None if the assets have no
+    usable widths, in which case they are picked from when asked for.
+    """
+    try:
+        widths = sorted(set(int(asset['typeData']['width']) for asset in assets))
+
+        return {
+            'unlimited': pick_image(assets, None),
+            'below': pick_image(assets, -1),
+            'widths': [[width, pick_image(assets, width)] for width in widths],
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def chosen_pick(picks, max_width):
+    if not max_width:
+        return picks['unlimited']
+
+    chosen = picks['below']
+    for width, index in picks['widths']:
+        if width > max_width:
+            break
+        chosen = index
+
+    return chosen
+
+def image(item, relation, max_width=None):
+    images = view(item)['images'].get(relation)
+
+    if images is None:
+        return None
+
+    assets = item['elements'][images['element']].get('assets', [])
+
+    if not assets:
+        logging.warning("No image assets found for content item: {}".format(item.get("id", "Unknown")))
+
+    if images['picks'] is None:
+        index = pick_image(assets, max_width)
+    else:
+        index = chosen_pick(images['picks'], max_width)
+
+    return assets[index] if index is not None else None
+
+def image_of_width(item, relation, width):
+    """
+    A copy of the asset of the given width, which the caller may change.
+    """
+    images = view(item)['images'].get(relation)
+
+    if images is None or width not in images['widths']:
+        return None
+
+    return copy.deepcopy(item['elements'][images['element']]['assets'][images['widths'][width]])
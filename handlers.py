@@ -1,17 +1,23 @@
 import os
+import json
 import logging
 import datetime
 
-import jinja2
 import webapp2
-import htmlmin
 
-from google.appengine.api import memcache
+from google.appengine.api import users
 
 import pysistence as immutable
 
 import deduplication
+import minifiers
 import template_filters
+import templates
+import concurrency
+import render_context
+import http_client
+import caches
+import defaults
 
 from ads import AdFetcher
 
@@ -20,15 +26,13 @@ if os.environ.has_key('SERVER_SOFTWARE') and os.environ['SERVER_SOFTWARE'].start
 else:
     URL_ROOT = 'https://gu-email-renderer.appspot.com'
 
-jinja_environment = jinja2.Environment(
-    loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), "template")),
-)
+FETCH_FAILED = object()
 
-jinja_environment.globals.update({
+jinja_environment = templates.build_environment(
+    globals={
         'URL_ROOT': URL_ROOT,
-    })
-
-jinja_environment.filters.update({
+    },
+    filters={
         'first_paragraph': template_filters.first_paragraph,
         'urlencode': template_filters.urlencode,
         'get_image': template_filters.get_image,
@@ -39,14 +43,55 @@ jinja_environment.filters.update({
         'get_video_assets': template_filters.get_video_assets
     })
 
-jinja_environment.cache=None
+def batched(chunks, size=defaults.STREAM_CHUNK_SIZE):
+    """
+    Joins the many small chunks a template generates into ones of at
+    least size characters.
+    """
+    batch = []
+    batch_size = 0
+
+    for chunk in chunks:
+        batch.append(chunk)
+        batch_size += len(chunk)
+
+        if batch_size >= size:
+            yield u''.join(batch)
+            batch = []
+            batch_size = 0
+
+    if batch:
+        yield u''.join(batch)
+
+def minified(chunks, engine='htmlmin'):
+    minifier = minifiers.minifier(engine)
+
+    for chunk in chunks:
+        with render_context.span('minify'):
+            minifier.input(chunk)
+            output = minifier.flush()
+        if output:
+            yield output
+
+    with render_context.span('minify'):
+        output = minifier.finalize()
+    yield output
 
 
 class EmailTemplate(webapp2.RequestHandler):
-    cache = memcache
+    cache = caches.cache
     cache_bust = False
     default_ad_tag = 'email-guardian-today'
     minify = False
+    minifier = 'htmlmin'
+    stream = False
+    concurrent_fetch = True
+    # Local time ('HH:MM') the email is sent every day, and where; emails
+    # with a send time have their pages rendered ahead of it by the warmer.
+    # Only set it from the email's schedule on the mail platform, noting
+    # where it came from (see the README).
+    send_time = None
+    send_timezone = 'Europe/London'
 
     def check_version_id(self, version_id):
         if not version_id in self.recognized_versions:
@@ -64,63 +109,185 @@ class EmailTemplate(webapp2.RequestHandler):
         return immutable.make_list()
 
     @staticmethod
-    def fetch_all(data_sources):
+    def fetch_all(data_sources, concurrent=False):
         """
         data is a map of type string->data_source.
         return a map with same keys as data, and retrieved data as values
+
+        When concurrent is set all the data sources are fetched at the
+        same time, so the wait is for the slowest source rather than the
+        sum of all of them. A data source registered under more than one
+        key is only fetched once.
+
+        A source whose upstream fails, or that has not finished when the
+        render runs out of time, comes back empty and its keys are
+        recorded as degraded sections of the render, failed or timed out.
         """
 
-        #import pdb;pdb.set_trace()
-        retrieved_data_map = {}
+        return EmailTemplate._fetch_each(data_sources,
+            lambda data_source: data_source.fetch_data(), concurrent, list, 'fetch')
 
-        for key, datasource in data_sources.items():
-            retrieved_data_map[key] = datasource.fetch_data()
+    @staticmethod
+    def fetch_all_title_overrides(data_sources, concurrent=False):
+        """
+        Title overrides are fetched after the data, which may have used up
+        the render budget, so they are given an allowance of their own.
+        """
+        render_context.allow(defaults.TITLE_OVERRIDE_ALLOWANCE)
+
+        titles = EmailTemplate._fetch_each(data_sources,
+            lambda data_source: data_source.fetch_title_override(), concurrent, lambda: None, 'title')
+
+        return dict((key, title) for key, title in titles.items() if title is not None)
 
-        return retrieved_data_map
-    
     @staticmethod
-    def fetch_all_title_overrides(data_sources):
-        retrieved_data_map = {}
+    def _fetch_each(data_sources, fetch, concurrent, empty, stage):
+        """
+        empty makes the value of a key whose source could not be fetched,
+        a fresh one for each key so a template changing one cannot change
+        another.
+        """
+        unique_data_sources = []
+        for data_source in data_sources.values():
+            if not any(data_source is seen for seen in unique_data_sources):
+                unique_data_sources.append(data_source)
+
+        span_names = {}
+        for key, data_source in sorted(data_sources.items()):
+            span_names.setdefault(id(data_source), '{0}.{1}'.format(stage, key))
+
+        def fetch_or_degrade(data_source):
+            try:
+                with render_context.span(span_names[id(data_source)]):
+                    return fetch(data_source)
+            except http_client.OutOfTime as e:
+                logging.warn('Could not fetch %s: %s' % (data_source, e))
+                return concurrency.TIMED_OUT
+            except http_client.HttpError as e:
+                logging.warn('Could not fetch %s: %s' % (data_source, e))
+                return FETCH_FAILED
+
+        if concurrent:
+            results = concurrency.map_concurrently(render_context.bound(fetch_or_degrade), unique_data_sources,
+                timeout=render_context.remaining_time())
+        else:
+            results = [fetch_or_degrade(data_source) for data_source in unique_data_sources]
 
-        for key, datasource in data_sources.items():
-            title = datasource.fetch_title_override()
-            if title is not None: 
-                retrieved_data_map[key] = title
+        results_by_data_source = dict(zip([id(data_source) for data_source in unique_data_sources], results))
 
-        return retrieved_data_map
+        fetched = {}
+        for key, data_source in data_sources.items():
+            result = results_by_data_source[id(data_source)]
 
+            if result is concurrency.TIMED_OUT:
+                render_context.degrade(key, render_context.TIMED_OUT)
+                result = empty()
+            elif result is FETCH_FAILED:
+                render_context.degrade(key, render_context.FAILED)
+                result = empty()
+
+            fetched[key] = result
+
+        return fetched
+
+    def render_page(self, template, **template_values):
+        """
+        Renders the page and writes it to the response, returning the
+        page so that it can be cached.
+
+        When streaming, the page is generated in chunks that go through
+        the minifier and out to the response as they are produced, and
+        the page is only put together once, for the cache. The render
+        span then includes the time spent minifying.
+        """
+        if not self.stream:
+            with render_context.span('render'):
+                page = template.render(**template_values)
+
+            if self.minify:
+                with render_context.span('minify'):
+                    page = minifiers.minify(page, self.minifier)
+
+            self.response.out.write(page)
+            return page
+
+        chunks = batched(template.generate(**template_values))
+
+        if self.minify:
+            chunks = minified(chunks, self.minifier)
+
+        parts = []
+        with render_context.span('render'):
+            for chunk in chunks:
+                parts.append(chunk)
+                self.response.out.write(chunk)
+
+        return u''.join(parts)
+
+    def is_warming(self):
+        """
+        Whether this is the warmer's task rendering the page ahead of a send.
+        Only the task queue can set the queue name header.
+        """
+        return bool(self.request.get('warm')) and 'X-AppEngine-QueueName' in self.request.headers
+
+    def report_timings(self, context):
+        """
+        Logs the timings of the render as a JSON line, and sends them in
+        a Server-Timing header when an admin asks with ?timing=1.
+        """
+        logging.info(json.dumps(context.summary()))
+
+        if self.request.get('timing') and users.is_current_user_admin():
+            self.response.headers['Server-Timing'] = context.server_timing()
 
     def get(self, version_id):
         self.check_version_id(version_id)
 
         cache_key = version_id + str(self.__class__)
-        page = self.cache.get(cache_key)
 
-        if self.cache_bust or not page:
-            logging.debug('Cache miss with key: %s' % cache_key)
-            retrieved_data = EmailTemplate.fetch_all(self.data_sources[version_id])
-            title_overrides = EmailTemplate.fetch_all_title_overrides(self.data_sources[version_id])
-            trail_blocks = deduplication.build_unique_trailblocks(retrieved_data,
-                self.priority_list[version_id],
-                excluded=self.exclude_from_deduplication())
-            today = datetime.datetime.now()
-            date = today.strftime('%A %d %b %Y')
+        warming = self.is_warming()
 
-            template_name = self.template_names[version_id] + '.html'
-            template = self.resolve_template(template_name)
+        with render_context.rendering(cache_key, budget=defaults.RENDER_BUDGET) as context:
+            page = None if warming else self.cache.get(cache_key)
 
-            ads = {}
+            if self.cache_bust or not page:
+                logging.debug('Cache miss with key: %s' % cache_key)
+                data_sources = self.data_sources[version_id]
 
-            page = template.render(ads=ads, date=date, data=self.additional_template_data(), title_overrides=title_overrides, **trail_blocks)
+                retrieved_data = EmailTemplate.fetch_all(data_sources, concurrent=self.concurrent_fetch)
+                title_overrides = EmailTemplate.fetch_all_title_overrides(data_sources, concurrent=self.concurrent_fetch)
 
-            if self.minify:
-                page = htmlmin.minify(page)
+                with render_context.span('deduplication'):
+                    trail_blocks = deduplication.build_unique_trailblocks(retrieved_data,
+                        self.priority_list[version_id],
+                        excluded=self.exclude_from_deduplication())
+                today = datetime.datetime.now()
+                date = today.strftime('%A %d %b %Y')
 
-            self.cache.add(cache_key, page, 300)
-        else:
-            logging.debug('Cache hit with key: %s' % cache_key)
-        
-        self.response.out.write(page)
+                template_name = self.template_names[version_id] + '.html'
+                with render_context.span('template'):
+                    template = self.resolve_template(template_name)
+
+                ads = {}
+
+                if context.degraded:
+                    logging.warn('Rendering %s without %s' % (cache_key, ', '.join(context.degraded_sections())))
+                    self.response.headers['X-Degraded-Sections'] = ','.join(context.degraded_sections())
+
+                page = self.render_page(template, ads=ads, date=date, data=self.additional_template_data(), title_overrides=title_overrides, **trail_blocks)
+
+                if context.degraded:
+                    self.cache.add(cache_key, page, defaults.DEGRADED_PAGE_CACHE_TIME)
+                elif warming:
+                    self.cache.set(cache_key, page, defaults.WARM_PAGE_CACHE_TIME)
+                else:
+                    self.cache.add(cache_key, page, defaults.PAGE_CACHE_TIME)
+            else:
+                logging.debug('Cache hit with key: %s' % cache_key)
+                self.response.out.write(page)
+
+            self.report_timings(context)
 
 class Index(webapp2.RequestHandler):
     def get(self):
@@ -169,6 +169,15 @@ class Minifier(object):
     """
     return self._parser.result
 
+  def flush(self):
+    """Returns the minified output that is final so far, and forgets it.
+
+    Use this to stream a document through the minifier: the concatenation
+    of every ``flush()`` followed by ``finalize()`` is the minified
+    document.
+    """
+    return self._parser.drain()
+
   def finalize(self):
     """Finishes current input HTML and returns mininified result.
 
@@ -109,6 +109,7 @@ class HTMLMinParser(HTMLParser):
     self.remove_optional_attribute_quotes = remove_optional_attribute_quotes
     self.pre_attr = pre_attr
     self._data_buffer = []
+    self._drained = False
     self._in_pre_tag = 0
     self._in_head = False
     self._in_title = False
@@ -162,7 +163,7 @@ class HTMLMinParser(HTMLParser):
     return result.getvalue()
 
   def handle_decl(self, decl):
-    if (len(self._data_buffer) == 1 and
+    if (not self._drained and len(self._data_buffer) == 1 and
         whitespace_re.match(self._data_buffer[0])):
       self._data_buffer = []
     self._data_buffer.append('<!' + decl + '>\n')
@@ -348,8 +349,22 @@ class HTMLMinParser(HTMLParser):
 
   def reset(self):
     self._data_buffer = []
+    self._drained = False
     HTMLParser.reset(self)
 
+  def drain(self):
+    """Removes and returns the output that later input can no longer change.
+
+    Only the last piece of output is ever looked at again, so everything
+    before it is final.
+    """
+    if len(self._data_buffer) < 2:
+      return ''
+    drained = ''.join(self._data_buffer[:-1])
+    self._data_buffer = self._data_buffer[-1:]
+    self._drained = True
+    return drained
+
   @property
   def result(self):
     return ''.join(self._data_buffer)
@@ -0,0 +1,336 @@
+"""
+The one place the renderer talks HTTP to its upstreams (CAPI, the
+container service, Ophan and Discussion).
+
+Requests go through urlfetch, which on App Engine keeps its own pool of
+outbound connections, so every integration shares the same connections
+instead of each opening its own. Responses are requested gzipped and
+decompressed here. Deadlines, retries and error logging are configured
+per upstream in defaults.UPSTREAMS, and per-host counters are kept for
+the admin pages. Each upstream also has a circuit breaker, and calls to
+an upstream whose circuit is open fail straight away. During a render
+deadlines are cut to what is left of the render's budget.
+"""
+
+import sys
+import time
+import zlib
+import logging
+import threading
+from urlparse import urlparse
+
+from google.appengine.api import urlfetch
+
+import defaults
+import singleflight
+import circuit_breaker
+import render_context
+
+class HttpError(Exception):
+	pass
+
+
+class CircuitOpen(HttpError):
+	pass
+
+
+class OutOfTime(HttpError):
+	pass
+
+
+class Response(object):
+	def __init__(self, url, status_code, headers, content):
+		self.url = url
+		self.status_code = status_code
+		self.headers = headers
+		self.content = content
+
+
+class HostStats(object):
+	def __init__(self):
+		self.requests = 0
+		self.errors = 0
+		self.retries = 0
+		self.bytes_received = 0
+		self.bytes_decoded = 0
+		self.total_time = 0.0
+		self.max_time = 0.0
+
+	def as_dict(self):
+		return {
+			'requests': self.requests,
+			'errors': self.errors,
+			'retries': self.retries,
+			'bytes_received': self.bytes_received,
+			'bytes_decoded': self.bytes_decoded,
+			'mean_ms': int(1000 * self.total_time / self.requests) if self.requests else 0,
+			'max_ms': int(1000 * self.max_time),
+		}
+
+
+def upstream_settings(upstream):
+	return defaults.UPSTREAMS.get(upstream, defaults.UPSTREAMS['default'])
+
+def decode_content(headers, content):
+	if headers.get('content-encoding', '').lower() == 'gzip':
+		try:
+			return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+		except zlib.error as e:
+			raise HttpError('Could not decompress the response: {0}'.format(e))
+	return content
+
+def request_key(url, headers=None):
+	return (render_context.canonical_url(url), tuple(sorted((headers or {}).items())))
+
+def lower_case_headers(headers):
+	return dict((name.lower(), value) for name, value in headers.items())
+
+def error_info(error):
+	"""
+	An exception as sys.exc_info() would give it, for failing a call.
+	"""
+	return error.__class__, error, None
+
+def call_deadline(settings):
+	"""
+	The upstream's deadline, cut to the time left in the render, or None
+	if there is not enough time left to make the call at all.
+	"""
+	deadline = render_context.clamp_deadline(settings['deadline'])
+
+	if deadline < defaults.MIN_UPSTREAM_DEADLINE:
+		return None
+
+	return deadline
+
+
+class HttpClient(object):
+	def __init__(self):
+		self.lock = threading.RLock()
+		self.stats = {}
+		self.breakers = {}
+
+	def _breaker(self, upstream):
+		with self.lock:
+			if upstream not in self.breakers:
+				self.breakers[upstream] = circuit_breaker.CircuitBreaker(upstream)
+			return self.breakers[upstream]
+
+	def _host_stats(self, url):
+		host = urlparse(url).netloc
+
+		with self.lock:
+			if host not in self.stats:
+				self.stats[host] = HostStats()
+			return self.stats[host]
+
+	def _record(self, url, elapsed, result=None, error=None, retry=False):
+		stats = self._host_stats(url)
+
+		with self.lock:
+			stats.requests += 1
+			stats.total_time += elapsed
+			stats.max_time = max(stats.max_time, elapsed)
+
+			if retry:
+				stats.retries += 1
+
+			if error:
+				stats.errors += 1
+
+			if result:
+				stats.bytes_received += len(result.content)
+
+	def _request_headers(self, headers):
+		request_headers = {'Accept-Encoding': 'gzip'}
+
+		if headers:
+			request_headers.update(headers)
+
+		return request_headers
+
+	def _response(self, url, result):
+		headers = lower_case_headers(result.headers)
+		content = decode_content(headers, result.content)
+
+		with self.lock:
+			self._host_stats(url).bytes_decoded += len(content)
+
+		return Response(url, result.status_code, headers, content)
+
+	def fetch(self, url, upstream='default', headers=None):
+		"""
+		Fetches a url, retrying transport failures as many times as the
+		upstream allows. Raises HttpError once the retries run out, or
+		CircuitOpen if the upstream's circuit is open; any response that
+		does come back is returned whatever its status.
+
+		During a render the same request is only made once, and everyone
+		who asks for it shares the response.
+		"""
+		try:
+			return render_context.coalesce(request_key(url, headers),
+				lambda: self._fetch(url, upstream, headers))
+		except singleflight.WaitTimeout as e:
+			raise HttpError('Could not fetch {0}: {1}'.format(url, e))
+
+	def _fetch(self, url, upstream, headers, retries=None):
+		settings = upstream_settings(upstream)
+		breaker = self._breaker(upstream)
+
+		if retries is None:
+			retries = settings['retries']
+
+		attempts = 1 + retries
+
+		for attempt in range(attempts):
+			deadline = call_deadline(settings)
+
+			if deadline is None:
+				raise OutOfTime('Not fetching {0}, the render is out of time'.format(url))
+
+			if not breaker.allow():
+				raise CircuitOpen('Not fetching {0}, the {1} circuit is open'.format(url, upstream))
+
+			started = time.time()
+			try:
+				result = urlfetch.fetch(url,
+					headers=self._request_headers(headers),
+					deadline=deadline)
+			except Exception as e:
+				breaker.record(failed=True)
+				self._record(url, time.time() - started, error=True, retry=attempt > 0)
+				logging.warn('{0} call failed ({1} of {2}) for {3}: {4}'.format(
+					upstream, attempt + 1, attempts, url, e))
+				error = e
+				continue
+
+			breaker.record(failed=result.status_code >= 500)
+			self._record(url, time.time() - started, result=result, retry=attempt > 0)
+
+			if result.status_code >= 400:
+				logging.warn('{0} returned {1} for {2}'.format(upstream, result.status_code, url))
+
+			return self._response(url, result)
+
+		raise HttpError('Could not fetch {0}: {1}'.format(url, error))
+
+	def fetch_all(self, urls, upstream='default', headers=None):
+		"""
+		Fetches several urls at once using concurrent urlfetch RPCs and
+		returns a response for each url, in the same order, or None where
+		the request failed, the upstream's circuit is open or the render
+		is out of time. Requests already made during the render are not
+		made again.
+		"""
+		settings = upstream_settings(upstream)
+		breaker = self._breaker(upstream)
+		context = render_context.current()
+
+		calls = []
+		leaders = []
+		rpcs = []
+		try:
+			for url in urls:
+				if context:
+					call, leader = context.requests.claim(request_key(url, headers))
+				else:
+					call, leader = singleflight.Call(), True
+
+				calls.append(call)
+
+				if not leader:
+					continue
+
+				leaders.append(call)
+				deadline = call_deadline(settings)
+
+				if deadline is None:
+					logging.warn('Not fetching {0}, the render is out of time'.format(url))
+					call.resolve(None)
+				elif not breaker.allow():
+					logging.warn('Not fetching {0}, the {1} circuit is open'.format(url, upstream))
+					call.resolve(None)
+				else:
+					started = time.time()
+					try:
+						rpc = urlfetch.create_rpc(deadline=deadline)
+						urlfetch.make_fetch_call(rpc, url, headers=self._request_headers(headers))
+					except Exception as e:
+						breaker.record(failed=True)
+						self._record(url, time.time() - started, error=True)
+						logging.warn('{0} call failed for {1}: {2}'.format(upstream, url, e))
+						call.fail(error_info(HttpError('Could not fetch {0}: {1}'.format(url, e))))
+					else:
+						rpcs.append((url, rpc, started, call))
+
+			for url, rpc, started, call in rpcs:
+				try:
+					call.resolve(self._rpc_response(url, rpc, started, upstream, headers, settings))
+				except Exception:
+					call.fail(sys.exc_info())
+		finally:
+			for call in leaders:
+				if call.pending():
+					call.fail(error_info(HttpError('The fetch was abandoned')))
+
+		return [self._shared_result(url, call, context) for url, call in zip(urls, calls)]
+
+	def _shared_result(self, url, call, context):
+		try:
+			return call.wait(context.wait_time() if context else None)
+		except Exception as e:
+			logging.warn('Could not fetch {0}: {1}'.format(url, e))
+			return None
+
+	def _rpc_response(self, url, rpc, started, upstream, headers, settings):
+		breaker = self._breaker(upstream)
+
+		try:
+			result = rpc.get_result()
+		except Exception as e:
+			breaker.record(failed=True)
+			self._record(url, time.time() - started, error=True)
+			logging.warn('{0} call failed for {1}: {2}'.format(upstream, url, e))
+			return self._retry(url, upstream, headers, settings)
+
+		breaker.record(failed=result.status_code >= 500)
+		self._record(url, time.time() - started, result=result)
+
+		if result.status_code >= 400:
+			logging.warn('{0} returned {1} for {2}'.format(upstream, result.status_code, url))
+
+		return self._response(url, result)
+
+	def _retry(self, url, upstream, headers, settings):
+		if not settings['retries']:
+			return None
+
+		try:
+			return self._fetch(url, upstream, headers, retries=settings['retries'] - 1)
+		except HttpError:
+			return None
+
+	def host_stats(self):
+		with self.lock:
+			return dict((host, stats.as_dict()) for host, stats in self.stats.items())
+
+	def circuit_states(self):
+		with self.lock:
+			breakers = self.breakers.items()
+		return dict((upstream, breaker.snapshot()) for upstream, breaker in breakers)
+
+
+client = HttpClient()
+
+def fetch(url, upstream='default', headers=None):
+	return client.fetch(url, upstream=upstream, headers=headers)
+
+def fetch_all(urls, upstream='default', headers=None):
+	return client.fetch_all(urls, upstream=upstream, headers=headers)
+
+def host_stats():
+	return client.host_stats()
+
+def circuit_states():
+	return client.circuit_states()
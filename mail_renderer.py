@@ -7,13 +7,14 @@ from guardianapi.apiClient import ApiClient
 
 import configuration
 import handlers
+import warmer
 
 # TODO: Hide me away somewhere warm and secret.
 api_key = configuration.read('CAPI_KEY')
 ophan_key = configuration.read('OPHAN_API_KEY')
 base_url=configuration.read('CAPI_BASE_URL', 'https://content.guardianapis.com/')
 ophan_base_url = configuration.read('OPHAN_BASE_URL')
-discussion_base_url = 'https://discussion.guardianapis.com/discussion-api'
+discussion_base_url = configuration.read('DISCUSSION_BASE_URL', 'https://discussion.guardianapis.com/discussion-api')
 
 client = ApiClient(base_url, api_key, edition="uk")
 clientUS = ApiClient(base_url, api_key, edition='us')
@@ -53,5 +54,6 @@ app = webapp2.WSGIApplication([('/daily-email/(.+)', emails.uk.DailyEmail),
                                webapp2.Route(r'/headline', handler=emails.headlines.Headline),
                                webapp2.Route(r'/headline/<edition:uk|us|au>', handler=emails.headlines.Headline),
                                webapp2.Route(r'/headline/<path:.*?>', handler=emails.headlines.GenericHeadline),
+                               ('/tasks/warm-pages', warmer.WarmPages),
                                webapp2.Route(r'/', handler=handlers.Index)],
                               debug=True)
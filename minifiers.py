@@ -0,0 +1,182 @@
+"""
+Minifier engines a handler can choose between.
+
+'htmlmin' is the stock htmlmin Minifier. 'fast' produces exactly the
+same output but is tuned for the table-heavy markup of our emails: plain
+start tags are tokenised with a single regex (anything unusual still goes
+through HTMLParser), tags only check the implied-close rules that can
+apply to them, tags are built with cached escapes and joins instead of a
+StringIO each, and line numbers are not tracked.
+"""
+
+import re
+
+import htmlmin
+from htmlmin import escape, parser
+
+simple_start_tag = re.compile(r"""
+	<([a-zA-Z][a-zA-Z0-9]*)                    # tag name
+	((?:\s+[a-zA-Z_:][-a-zA-Z0-9_:.]*          # attribute name
+		(?:\s*=\s*(?:"[^"<>]*"|'[^'<>]*'|[^\s"'=<>`]+))?
+	)*)
+	\s*(/?)>""", re.VERBOSE)
+
+simple_attribute = re.compile(r"""
+	\s+([a-zA-Z_:][-a-zA-Z0-9_:.]*)
+	(?:\s*=\s*("[^"<>]*"|'[^'<>]*'|[^\s"'=<>`]+))?""", re.VERBOSE)
+
+simple_value = re.compile(r'[^\s&"\']+\Z', re.UNICODE)
+
+# (tags that may be implicitly closed, tags that close them), in the order
+# HTMLMinParser checks them
+IMPLIED_CLOSES = (
+	(('li',), ('li',)),
+	(('dd', 'dt',), ('dd', 'dt',)),
+	(('rp', 'rt',), ('rp', 'rt',)),
+	(('p',), ('address', 'article', 'aside', 'blockquote', 'dir', 'div',
+		'dl', 'fieldset', 'footer', 'form', 'h1', 'h2', 'h3', 'h4',
+		'h5', 'h6', 'header', 'hgroup', 'hr', 'menu', 'nav', 'ol', 'p',
+		'pre', 'section', 'table', 'ul')),
+	(('optgroup',), ('optgroup',)),
+	(('option',), ('option', 'optgroup')),
+	(('colgroup',), ('*',)),
+	(('tbody', 'thead',), ('tbody', 'tfoot')),
+	(('tfoot',), ('tbody',)),
+	(('tr',), ('tr',)),
+	(('td', 'th'), ('td', 'th')),
+)
+
+
+implied_closes_by_tag = {}
+escaped_names = {}
+
+def implied_closes(tag):
+	if tag not in implied_closes_by_tag:
+		implied_closes_by_tag[tag] = [open_tags for open_tags, closed_by in IMPLIED_CLOSES
+			if tag in closed_by or '*' in closed_by]
+	return implied_closes_by_tag[tag]
+
+def escaped(name):
+	if name not in escaped_names:
+		escaped_names[name] = escape.escape_tag(name)
+	return escaped_names[name]
+
+
+class FastHTMLMinParser(parser.HTMLMinParser):
+	def updatepos(self, i, j):
+		# Line numbers are only used in parse error messages, so skip
+		# counting the newlines in every token.
+		return j
+
+	def parse_starttag(self, i):
+		match = simple_start_tag.match(self.rawdata, i)
+
+		if not match:
+			return parser.HTMLMinParser.parse_starttag(self, i)
+
+		tag_name, attribute_text, self_closing = match.group(1, 2, 3)
+		self._HTMLParser__starttag_text = match.group(0)
+		self.lasttag = tag = tag_name.lower()
+
+		attrs = []
+		for name, value in simple_attribute.findall(attribute_text):
+			if not value:
+				value = None
+			elif value[0] in '"\'':
+				value = value[1:-1]
+
+			if value and '&' in value:
+				value = self.unescape(value)
+
+			attrs.append((name.lower(), value))
+
+		if self_closing:
+			self.handle_startendtag(tag, attrs)
+		else:
+			self.handle_starttag(tag, attrs)
+			if tag in self.CDATA_CONTENT_ELEMENTS:
+				self.set_cdata_mode(tag)
+
+		return match.end()
+
+	def handle_starttag(self, tag, attrs):
+		self._after_doctype = False
+		if tag == 'head':
+			self._in_head = True
+		elif self._in_head and tag == 'title':
+			self._in_title = True
+			self._title_newly_opened = True
+
+		for open_tags in implied_closes(tag):
+			in_tag = self.in_tag(*open_tags)
+			if in_tag:
+				self._in_pre_tag -= self._close_tags_up_to(in_tag[0])
+
+		start_pre = False
+		if (tag in self.pre_tags or
+				tag in ('script', 'style') or
+				self._has_pre(attrs) or
+				self._in_pre_tag > 0):
+			self._in_pre_tag += 1
+			start_pre = True
+
+		self._tag_stack.insert(0, (tag, start_pre))
+
+		if not self.keep_pre:
+			attrs = [(k, v) for k, v in attrs if k != self.pre_attr]
+
+		self._data_buffer.append(self.build_tag(tag, attrs, False))
+
+	def build_tag(self, tag, attrs, close_tag):
+		result = ['<', escaped(tag)]
+		needs_closing_space = False
+
+		for k, v in attrs:
+			result.append(' ')
+			result.append(escaped(k))
+			if v:
+				if self.reduce_boolean_attributes and (
+						k in parser.BOOLEAN_ATTRIBUTES.get(tag, []) or
+						k in parser.BOOLEAN_ATTRIBUTES['*']):
+					pass
+				else:
+					result.append('=')
+					if self.remove_optional_attribute_quotes and simple_value.match(v):
+						q = escape.NO_QUOTES
+					else:
+						(v, q) = escape.escape_attr_value(
+							v, double_quote=not self.remove_optional_attribute_quotes)
+
+					if q == escape.NO_QUOTES:
+						result.append(v)
+					elif q == escape.DOUBLE_QUOTE:
+						result.extend(('"', v, '"'))
+					else:
+						result.extend(("'", v, "'"))
+					needs_closing_space = q == escape.NO_QUOTES and v.endswith('/')
+			elif not self.reduce_empty_attributes:
+				result.append('=""')
+
+		if needs_closing_space:
+			result.append(' ')
+
+		result.append('/>' if close_tag else '>')
+		return ''.join(result)
+
+
+class FastMinifier(htmlmin.Minifier):
+	def __init__(self, **options):
+		htmlmin.Minifier.__init__(self, **options)
+		self._parser = FastHTMLMinParser(**options)
+
+
+ENGINES = {
+	'htmlmin': htmlmin.Minifier,
+	'fast': FastMinifier,
+}
+
+def minifier(engine='htmlmin'):
+	return ENGINES[engine]()
+
+def minify(page, engine='htmlmin'):
+	return minifier(engine).minify(page)
@@ -1,11 +1,10 @@
 import logging
 import urllib
-import urllib2
 from django.utils import simplejson as json
 from urllib import urlencode
 from urlparse import urlparse
 
-# TODO: pull this up into a generic http client
+import http_client
 
 class OphanClient(object):
     def __init__(self, base_url, api_key):
@@ -13,26 +12,26 @@ class OphanClient(object):
         self.api_key = api_key
 
     def do_get(self, url, params=None, add_base=False):
-        try:
-            final_url = url
-            if add_base:
-                final_url = self.base_url + url
+        final_url = url
+        if add_base:
+            final_url = self.base_url + url
 
-            if params:
-                final_url = final_url + "?" + urlencode(params)
+        if params:
+            final_url = final_url + "?" + urlencode(params)
 
-            #logging.info("Ophan url: {url}".format(url=final_url))
+        #logging.info("Ophan url: {url}".format(url=final_url))
 
-            u = urllib2.urlopen(final_url)
-        except urllib2.URLError as e:
-            if hasattr(e, 'reason'):
-                logging.error('Could not reach server while accessing %s. Reason: %s' % (url, e.reason))
-            elif hasattr(e, 'code'):
-                logging.error('Server could not fulfill request at %s. Error: %s' % (url, e.code))
+        try:
+            response = http_client.fetch(final_url, upstream='ophan')
+        except http_client.HttpError as e:
+            logging.error('Could not reach server while accessing %s. Reason: %s' % (url, e))
             raise e
 
-        headers = u.headers.dict
-        return headers, u.read()
+        if response.status_code != 200:
+            logging.error('Server could not fulfill request at %s. Error: %s' % (url, response.status_code))
+            raise http_client.HttpError('Ophan returned {0} for {1}'.format(response.status_code, url))
+
+        return response.headers, response.content
 
 
 class MostSharedFetcher(object):
@@ -0,0 +1,229 @@
+"""
+State that lives for the length of a single page render.
+
+The app is not threadsafe (see app.yaml) so an instance only renders one
+page at a time, and the context is kept at module level where the threads
+fetching data sources for that render can all see it.
+
+A render may be given a time budget, which caps the deadline of every
+upstream call made during it, and sections that could not be fetched in
+time are recorded as degraded, along with why.
+
+Threads fetching for a render run in its context (see bound), and once the
+render is over anything they still try to record in it is ignored.
+
+The stages of a render are timed as named spans. Spans with the same
+name, such as every memcache call, add up into one timing.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib import urlencode
+from urlparse import urlparse, urlunparse, parse_qsl
+
+import defaults
+import singleflight
+
+_current = None
+_thread = threading.local()
+
+TIMED_OUT = 'timeout'
+FAILED = 'failed'
+
+not_a_token = re.compile(r"[^-!#$%&'*+.^_`|~0-9A-Za-z]")
+
+class RenderContext(object):
+	def __init__(self, name, budget=None):
+		self.name = name
+		self.requests = singleflight.Group()
+		self.deadline = time.time() + budget if budget else None
+		self.lock = threading.Lock()
+		self.degraded = []
+		self.reasons = {}
+		self.closed = False
+		self.started = time.time()
+		self.timings = OrderedDict()
+
+	def remaining(self):
+		if self.deadline is None:
+			return None
+		if self.closed:
+			return 0.0
+		return max(0.0, self.deadline - time.time())
+
+	def allow(self, seconds):
+		"""
+		Extends the budget, if need be, so that at least seconds are left.
+		"""
+		with self.lock:
+			if self.deadline is not None:
+				self.deadline = max(self.deadline, time.time() + seconds)
+
+	def close(self):
+		with self.lock:
+			self.closed = True
+
+	def wait_time(self):
+		"""
+		How long to wait for a request someone else is making: what is left
+		of the budget, which caps their deadline, and a little more.
+		"""
+		remaining = self.remaining()
+		if remaining is None:
+			return None
+		return remaining + defaults.MIN_UPSTREAM_DEADLINE
+
+	def degrade(self, section, reason=TIMED_OUT):
+		with self.lock:
+			if not self.closed and section not in self.degraded:
+				self.degraded.append(section)
+				self.reasons[section] = reason
+
+	def degraded_sections(self):
+		"""
+		The degraded sections and why, as 'section;reason' for each.
+		"""
+		with self.lock:
+			return ['{0};{1}'.format(section, self.reasons[section]) for section in self.degraded]
+
+	def record(self, name, seconds):
+		with self.lock:
+			if self.closed:
+				return
+			total, count = self.timings.get(name, (0.0, 0))
+			self.timings[name] = (total + seconds, count + 1)
+
+	def summary(self):
+		"""
+		The timings of the render so far, in milliseconds, for logging.
+		"""
+		with self.lock:
+			spans = OrderedDict((name, {'ms': round(total * 1000, 1), 'count': count})
+				for name, (total, count) in self.timings.items())
+
+		return OrderedDict([
+			('render', self.name),
+			('total_ms', round((time.time() - self.started) * 1000, 1)),
+			('spans', spans),
+			('degraded', self.degraded_sections()),
+		])
+
+	def server_timing(self):
+		"""
+		The timings of the render so far as a Server-Timing header value.
+		"""
+		with self.lock:
+			metrics = ['{0};dur={1:.1f};desc="{2} calls"'.format(not_a_token.sub('_', name), total * 1000, count)
+				for name, (total, count) in self.timings.items()]
+
+		metrics.append('total;dur={0:.1f}'.format((time.time() - self.started) * 1000))
+		return ', '.join(metrics)
+
+
+@contextmanager
+def rendering(name, budget=None):
+	global _current
+	previous = _current
+	_current = RenderContext(name, budget)
+
+	try:
+		yield _current
+	finally:
+		_current.close()
+		_current = previous
+
+def current():
+	"""
+	The render this thread is fetching for: the one it was bound to, if
+	any, or else the render in progress.
+	"""
+	context = getattr(_thread, 'context', None)
+	return context if context is not None else _current
+
+def bound(function):
+	"""
+	function, made to run in the context of the current render whichever
+	thread calls it, so that a call still running after the render is over
+	cannot record anything in the next one.
+	"""
+	context = current()
+
+	def run(*args, **kwargs):
+		previous = getattr(_thread, 'context', None)
+		_thread.context = context
+
+		try:
+			return function(*args, **kwargs)
+		finally:
+			_thread.context = previous
+
+	return run
+
+def remaining_time():
+	"""
+	Seconds left in the current render's budget, or None if there is no
+	budget to keep to.
+	"""
+	context = current()
+
+	if not context:
+		return None
+
+	return context.remaining()
+
+def clamp_deadline(deadline):
+	remaining = remaining_time()
+
+	if remaining is None:
+		return deadline
+
+	return min(deadline, remaining)
+
+def allow(seconds):
+	context = current()
+
+	if context:
+		context.allow(seconds)
+
+def degrade(section, reason=TIMED_OUT):
+	context = current()
+
+	if context:
+		context.degrade(section, reason)
+
+@contextmanager
+def span(name):
+	"""
+	Times the enclosed block as a stage of the current render.
+	"""
+	context = current()
+	started = time.time()
+
+	try:
+		yield
+	finally:
+		if context:
+			context.record(name, time.time() - started)
+
+def canonical_url(url):
+	"""
+	The same request however its query parameters happen to be ordered.
+	"""
+	parts = urlparse(url)
+	query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+	return urlunparse(parts._replace(query=query))
+
+def coalesce(key, function):
+	"""
+	Calls function unless the same key has already been asked for during
+	the current render, in which case the first caller's result is shared.
+	"""
+	context = current()
+
+	if not context:
+		return function()
+
+	return context.requests.do(key, function, timeout=context.wait_time())
@@ -0,0 +1,67 @@
+import sys
+import threading
+
+class WaitTimeout(Exception):
+	pass
+
+
+class Call(object):
+	def __init__(self):
+		self.done = threading.Event()
+		self.result = None
+		self.error = None
+
+	def resolve(self, result):
+		self.result = result
+		self.done.set()
+
+	def fail(self, error):
+		self.error = error
+		self.done.set()
+
+	def pending(self):
+		return not self.done.is_set()
+
+	def wait(self, timeout=None):
+		if not self.done.wait(timeout):
+			raise WaitTimeout('Gave up waiting after {0}s for a call in flight'.format(timeout))
+
+		if self.error:
+			raise self.error[0], self.error[1], self.error[2]
+
+		return self.result
+
+
+class Group(object):
+	"""
+	Makes sure each key is only worked out once. The first caller for a
+	key does the work; anyone asking for the same key while that is in
+	flight, or afterwards, gets the same result (or exception).
+	"""
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.calls = {}
+
+	def claim(self, key):
+		"""
+		Returns the call for key and whether the caller is the one who must
+		resolve it.
+		"""
+		with self.lock:
+			if key in self.calls:
+				return self.calls[key], False
+
+			call = Call()
+			self.calls[key] = call
+			return call, True
+
+	def do(self, key, function, timeout=None):
+		call, leader = self.claim(key)
+
+		if leader:
+			try:
+				call.resolve(function())
+			except Exception:
+				call.fail(sys.exc_info())
+
+		return call.wait(timeout)
@@ -1,6 +1,7 @@
+from guardianapi import view_model
 
 def has_tag(tag_id, content_item):
 	if not 'tags' in content_item:
 		return False
 
-	return tag_id in [tag['id'] for tag in content_item['tags']]
\ No newline at end of file
+	return tag_id in view_model.view(content_item)['tags']
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""
+Minifies the static parts of templates ahead of time.
+
+Runs of whitespace in the text between tags are collapsed, which is what
+the minifier would otherwise do to them on every render. Jinja tags,
+markup inside tags (so inline styles and attribute values), comments and
+the contents of script, style, pre and textarea are left exactly as they
+are. Newlines are kept so that template errors still report the right
+line.
+
+The HTML is followed across Jinja tags, so the branches of an if and the
+body of a loop must leave it in the same state they found it, otherwise
+the template is refused and used as it is.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+
+TEXT = 'text'
+TAG = 'tag'
+COMMENT = 'comment'
+RAW = 'raw'
+
+RAW_ELEMENTS = ('script', 'style', 'pre', 'textarea')
+
+OPENING_STATEMENTS = ('if', 'for', 'macro', 'call', 'filter', 'block')
+
+MANIFEST = 'manifest.json'
+
+whitespace = re.compile(r'[ \t\n\r\f\v]+')
+tag_start = re.compile(r'<(?=[a-zA-Z!/?]|\Z)')
+pre_attribute = re.compile(r'<[a-zA-Z][^<>]*\spre(?:[\s=/>]|\Z)', re.IGNORECASE)
+
+class UnsafeTemplate(Exception):
+	pass
+
+def collapse(space):
+	return '\n' * space.group(0).count('\n') or ' '
+
+def scan_tag(data, i, state):
+	_, name, quote, named = state
+
+	for j in range(i, len(data)):
+		c = data[j]
+
+		if quote:
+			if c == quote:
+				quote = None
+		elif not named and (c.isalnum() or c in '-:' or (not name and c in '/!?')):
+			name += c
+		elif c in '"\'':
+			named = True
+			quote = c
+		elif c == '>':
+			if name.lower() in RAW_ELEMENTS:
+				return j + 1, (RAW, name.lower())
+			return j + 1, (TEXT,)
+		else:
+			named = True
+
+	return len(data), (TAG, name, quote, named)
+
+def minify_data(data, state):
+	"""
+	Minifies the text between two Jinja tags, returning it and the state
+	of the HTML at its end.
+	"""
+	output = []
+	i = 0
+
+	while i < len(data):
+		if state[0] == TEXT:
+			match = tag_start.search(data, i)
+			end = match.start() if match else len(data)
+			output.append(whitespace.sub(collapse, data[i:end]))
+			i = end
+
+			if match and data.startswith('<!--', i):
+				output.append('<!--')
+				i += 4
+				state = (COMMENT,)
+			elif match:
+				output.append('<')
+				i += 1
+				state = (TAG, '', None, False)
+
+		elif state[0] == COMMENT:
+			end = data.find('-->', i)
+
+			if end < 0:
+				output.append(data[i:])
+				break
+
+			output.append(data[i:end + 3])
+			i = end + 3
+			state = (TEXT,)
+
+		elif state[0] == RAW:
+			match = re.compile('</' + state[1], re.IGNORECASE).search(data, i)
+
+			if not match:
+				output.append(data[i:])
+				break
+
+			output.append(data[i:match.end()])
+			i = match.end()
+			state = (TAG, '/' + state[1], None, False)
+
+		else:
+			end, state = scan_tag(data, i, state)
+			output.append(data[i:end])
+			i = end
+
+	return u''.join(output), state
+
+def minify_template(source, environment):
+	"""
+	Returns the source of a template with its static text minified, or
+	raises UnsafeTemplate if the HTML cannot be followed through it.
+	"""
+	if pre_attribute.search(source):
+		raise UnsafeTemplate('an element uses the pre attribute')
+
+	output = []
+	state = (TEXT,)
+	statements = []
+	in_statement = False
+
+	for lineno, token, value in environment.lexer.tokeniter(source, None):
+		if token == 'data':
+			value, state = minify_data(value, state)
+		elif token == 'block_begin':
+			in_statement = True
+		elif token == 'name' and in_statement:
+			in_statement = False
+
+			if value in OPENING_STATEMENTS:
+				statements.append((value, state, []))
+				if value == 'macro':
+					state = (TEXT,)
+			elif value in ('elif', 'else'):
+				if not statements:
+					raise UnsafeTemplate('{0} outside a statement on line {1}'.format(value, lineno))
+				name, start, ends = statements[-1]
+				ends.append(state)
+				state = start
+			elif value.startswith('end'):
+				if not statements or statements[-1][0] != value[3:]:
+					raise UnsafeTemplate('unexpected {0} on line {1}'.format(value, lineno))
+				name, start, ends = statements.pop()
+				ends.append(state)
+
+				if name == 'macro':
+					expected = (TEXT,)
+				elif name == 'if':
+					expected = ends[0]
+				else:
+					expected = start
+
+				if name == 'if' and len(ends) == 1:
+					ends.append(start)
+
+				if any(end != expected for end in ends):
+					raise UnsafeTemplate('the HTML is left in different states by the {0} ending on line {1}'.format(name, lineno))
+
+				state = start if name == 'macro' else expected
+
+		output.append(value)
+
+	return u''.join(output)
+
+def source_hash(source):
+	return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+def compile_templates(environment, source_directory, target_directory):
+	"""
+	Writes a minified copy of every template under source_directory to
+	target_directory, with a manifest of the hash of each source so that
+	stale copies are never used.
+	"""
+	if os.path.exists(target_directory):
+		shutil.rmtree(target_directory)
+
+	manifest = {}
+
+	for directory, _, filenames in os.walk(source_directory):
+		for filename in filenames:
+			if not filename.endswith('.html'):
+				continue
+
+			path = os.path.join(directory, filename)
+			name = os.path.relpath(path, source_directory).replace(os.sep, '/')
+
+			with open(path) as template_file:
+				source = template_file.read().decode('utf-8')
+
+			try:
+				compiled = minify_template(source, environment)
+			except UnsafeTemplate as e:
+				logging.warning('Not minifying {0}: {1}'.format(name, e))
+				compiled = source
+
+			target = os.path.join(target_directory, name)
+			if not os.path.exists(os.path.dirname(target)):
+				os.makedirs(os.path.dirname(target))
+
+			with open(target, 'w') as compiled_file:
+				compiled_file.write(compiled.encode('utf-8'))
+
+			manifest[name] = source_hash(source)
+
+	with open(os.path.join(target_directory, MANIFEST), 'w') as manifest_file:
+		json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+
+	return manifest
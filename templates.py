@@ -0,0 +1,142 @@
+"""
+Builds the Jinja environments the handlers render with.
+
+In production compiled templates are kept in memory and their bytecode is
+kept in memcache under the deployed version, so each template is compiled
+once per deploy rather than on every render. The bytecode cache also
+checks a hash of each template's source, so an edited template is never
+served from stale bytecode. Locally templates are reloaded whenever they
+change on disk.
+
+In production each template is read from the pre-minified copy written
+by build_templates.py, as long as it was built from the template's
+current source.
+
+The story macros render through cached_story, which in production keeps
+the HTML of each story it renders in an in-process fragment cache.
+"""
+
+import os
+import json
+import hashlib
+
+import jinja2
+
+from google.appengine.api import memcache
+
+import defaults
+import caches
+import template_compiler
+
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(__file__), 'template')
+COMPILED_TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(__file__), 'template_compiled')
+
+def production():
+	if os.environ.has_key('RUNNING_UNIT_TESTS'):
+		return False
+
+	return not os.environ.get('SERVER_SOFTWARE', 'Development').startswith('Development')
+
+def bytecode_cache():
+	version = os.environ.get('CURRENT_VERSION_ID', 'unversioned')
+	return jinja2.MemcachedBytecodeCache(memcache, prefix='jinja2/bytecode/{0}/'.format(version))
+
+def read_manifest(directory):
+	try:
+		with open(os.path.join(directory, template_compiler.MANIFEST)) as manifest_file:
+			return json.load(manifest_file)
+	except (IOError, ValueError):
+		return {}
+
+class CompiledLoader(jinja2.FileSystemLoader):
+	"""
+	Loads templates from their pre-minified copies, falling back to the
+	source of any template whose copy is missing or out of date.
+	"""
+	def __init__(self, searchpath, compiled_directory):
+		jinja2.FileSystemLoader.__init__(self, searchpath)
+		self.compiled_directory = compiled_directory
+		self.manifest = read_manifest(compiled_directory)
+
+	def get_source(self, environment, template):
+		source, filename, uptodate = jinja2.FileSystemLoader.get_source(self, environment, template)
+
+		if self.manifest.get(template) != template_compiler.source_hash(source):
+			return source, filename, uptodate
+
+		with open(os.path.join(self.compiled_directory, *template.split('/'))) as compiled_file:
+			return compiled_file.read().decode('utf-8'), filename, uptodate
+
+fragments = caches.LRUCache(defaults.FRAGMENT_CACHE_MAX_ENTRIES, defaults.FRAGMENT_CACHE_MAX_BYTES)
+
+def media_digest(story):
+	"""
+	A digest of the tags, images and atoms of a story, which can change
+	without its publication date changing.
+	"""
+	media = [story.get('tags'), story.get('elements'), story.get('atoms')]
+	return hashlib.sha1(json.dumps(media, sort_keys=True, default=repr)).hexdigest()
+
+def fragment_key(name, story, arguments):
+	"""
+	Identifies a revision of a story as rendered by a macro with some
+	arguments, or None if the story cannot be identified. CAPI moves
+	lastModified on any change to a story, so only a story without it
+	has its fields and media hashed.
+	"""
+	if not story.get('id'):
+		return None
+
+	fields = story.get('fields') or {}
+	revision = fields.get('lastModified')
+
+	if not revision:
+		revision = (story.get('webPublicationDate'), story.get('webTitle'),
+			sorted(fields.items()), media_digest(story))
+
+	arguments = sorted((argument, '<undefined>' if isinstance(value, jinja2.Undefined) else value)
+		for argument, value in arguments.items())
+
+	return hashlib.sha1(repr((name, story['id'], revision, story.get('comment_count'),
+		story.get('share_count'), sorted(story.keys()), arguments))).hexdigest()
+
+def cached_story(name, macro, story, **arguments):
+	"""
+	Renders a story with a macro, reusing the HTML from the last time the
+	same revision of the story went through it with the same arguments.
+	"""
+	key = fragment_key(name, story, arguments)
+
+	if key is None:
+		return macro(story, **arguments)
+
+	html = fragments.get(key)
+
+	if html is None:
+		html = macro(story, **arguments)
+		fragments.set(key, html, defaults.FRAGMENT_CACHE_TIME)
+
+	return html
+
+def uncached_story(name, macro, story, **arguments):
+	return macro(story, **arguments)
+
+def build_environment(globals=None, filters=None):
+	if production():
+		environment = jinja2.Environment(
+			loader=CompiledLoader(TEMPLATE_DIRECTORY, COMPILED_TEMPLATE_DIRECTORY),
+			cache_size=defaults.TEMPLATE_CACHE_SIZE,
+			auto_reload=False,
+			bytecode_cache=bytecode_cache())
+		environment.globals['cached_story'] = cached_story
+	else:
+		environment = jinja2.Environment(
+			loader=jinja2.FileSystemLoader(TEMPLATE_DIRECTORY),
+			cache_size=defaults.TEMPLATE_CACHE_SIZE,
+			auto_reload=True)
+		environment.globals['cached_story'] = uncached_story
+
+	environment.globals.update(globals or {})
+	environment.filters.update(filters or {})
+
+	return environment
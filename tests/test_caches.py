@@ -0,0 +1,172 @@
+import time
+import unittest
+
+import caches
+
+class DictCache(object):
+    def __init__(self):
+        self.values = {}
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        return self.values.get(key)
+
+    def get_multi(self, keys):
+        self.calls += 1
+        return dict((key, self.values[key]) for key in keys if key in self.values)
+
+    def set(self, key, value, time=0):
+        self.values[key] = value
+        return True
+
+    def set_multi(self, mapping, time=0):
+        self.values.update(mapping)
+        return []
+
+    def add(self, key, value, time=0):
+        if key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        return 2
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.values.pop(key, None)
+        return True
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_should_evict_the_least_recently_used_entry(self):
+        cache = caches.LRUCache(max_entries=2, max_bytes=1000)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+
+        self.assertEquals(cache.get('b'), None)
+        self.assertEquals(cache.get('a'), '1')
+        self.assertEquals(cache.stats()['evictions'], 1)
+
+    def test_should_evict_to_stay_within_the_byte_budget(self):
+        cache = caches.LRUCache(max_entries=10, max_bytes=10)
+        cache.set('a', 'x' * 6)
+        cache.set('b', 'y' * 6)
+
+        self.assertEquals(cache.get('a'), None)
+        self.assertEquals(cache.get('b'), 'y' * 6)
+        self.assertEquals(cache.stats()['bytes'], 6)
+
+    def test_should_not_keep_values_larger_than_the_budget(self):
+        cache = caches.LRUCache(max_entries=10, max_bytes=10)
+        cache.set('a', 'x' * 11)
+
+        self.assertEquals(cache.get('a'), None)
+
+    def test_should_expire_entries(self):
+        cache = caches.LRUCache(max_entries=10, max_bytes=1000)
+        cache.set('a', '1', 60)
+        cache.entries['a'] = ('1', time.time() - 1, 1)
+
+        self.assertEquals(cache.get('a'), None)
+        self.assertEquals(cache.stats()['bytes'], 0)
+
+
+class TestTieredCache(unittest.TestCase):
+
+    def setUp(self):
+        self.remote = DictCache()
+        self.cache = caches.TieredCache(caches.LRUCache(10, 1000), self.remote)
+
+    def test_should_only_go_to_the_remote_cache_once(self):
+        self.remote.values['a'] = '1'
+
+        self.assertEquals(self.cache.get('a'), '1')
+        self.assertEquals(self.cache.get('a'), '1')
+        self.assertEquals(self.remote.calls, 1)
+
+        stats = self.cache.stats()
+        self.assertEquals(stats['hits'], 1)
+        self.assertEquals(stats['remote_hits'], 1)
+
+    def test_should_only_ask_the_remote_cache_for_missing_keys(self):
+        self.cache.set('a', '1')
+        self.remote.values['b'] = '2'
+
+        self.assertEquals(self.cache.get_multi(['a', 'b', 'c']), {'a': '1', 'b': '2'})
+        self.assertEquals(self.cache.stats()['remote_misses'], 1)
+        self.assertEquals(self.cache.get_multi(['a', 'b']), {'a': '1', 'b': '2'})
+        self.assertEquals(self.remote.calls, 1)
+
+    def test_should_not_keep_a_remote_value_locally_for_longer_than_it_has_left(self):
+        other_instance = caches.TieredCache(caches.LRUCache(10, 1000), self.remote)
+        other_instance.set('degraded page', '1', time=0.05)
+
+        self.assertEquals(self.cache.get('degraded page'), '1')
+        time.sleep(0.06)
+        del self.remote.values['degraded page']
+
+        self.assertEquals(self.cache.get('degraded page'), None)
+        self.assertEquals(self.cache.get_multi(['degraded page']), {})
+
+    def test_should_write_through_to_the_remote_cache(self):
+        self.cache.set_multi({'a': '1'}, time=30)
+        self.cache.delete('a')
+
+        self.assertEquals(self.cache.get('a'), None)
+        self.assertEquals(self.remote.values, {})
+
+
+class TestCompressedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.remote = DictCache()
+        self.cache = caches.CompressedCache(self.remote, chunk_size=100)
+
+    def large_value(self):
+        return {'body': ''.join(chr(index % 251) for index in range(5000))}
+
+    def test_should_round_trip_small_values_in_one_entry(self):
+        self.cache.set('a', {'body': 'x' * 1000})
+
+        self.assertEquals(self.cache.get('a'), {'body': 'x' * 1000})
+        self.assertEquals(self.remote.values.keys(), ['a'])
+
+    def test_should_split_large_values_into_chunks(self):
+        value = self.large_value()
+        self.cache.set('a', value)
+
+        self.assertTrue(len(self.remote.values) > 2)
+        self.assertEquals(self.cache.get('a'), value)
+        self.assertEquals(self.cache.get_multi(['a', 'b']), {'a': value})
+
+    def test_should_miss_when_a_chunk_has_been_evicted(self):
+        self.cache.set('a', self.large_value())
+        chunk_key = [key for key in self.remote.values if key != 'a'][0]
+        del self.remote.values[chunk_key]
+
+        self.assertEquals(self.cache.get('a'), None)
+
+    def test_should_miss_when_a_chunk_is_corrupt(self):
+        self.cache.set('a', self.large_value())
+        chunk_key = [key for key in self.remote.values if key != 'a'][0]
+        self.remote.values[chunk_key] = 'x' * len(self.remote.values[chunk_key])
+
+        self.assertEquals(self.cache.get('a'), None)
+
+    def test_should_not_leave_chunks_behind_when_adding_loses_to_another_writer(self):
+        self.cache.set('a', {'body': 'first'})
+
+        self.assertFalse(self.cache.add('a', self.large_value()))
+        self.assertEquals(self.remote.values.keys(), ['a'])
+        self.assertEquals(self.cache.get('a'), {'body': 'first'})
+
+    def test_should_miss_on_values_written_by_something_else(self):
+        self.remote.values['a'] = {'body': 'raw'}
+
+        self.assertEquals(self.cache.get('a'), None)
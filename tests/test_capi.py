@@ -0,0 +1,92 @@
+import json
+import unittest
+
+from google.appengine.ext import testbed
+
+import http_client
+import configuration
+from guardianapi import mockapi
+from test_caches import DictCache
+
+CAPI_BASE_URL = 'http://capi.test'
+
+class StubFetchAll(object):
+    """
+    Stands in for http_client.fetch_all, answering each url with a CAPI
+    item, or None for ids that are set to fail.
+    """
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.batches = []
+
+    def item_id(self, url):
+        return url.split('?')[0][len(CAPI_BASE_URL) + 1:]
+
+    def __call__(self, urls, upstream='default', headers=None):
+        if urls:
+            self.batches.append([self.item_id(url) for url in urls])
+        return [None if self.item_id(url) in self.failing else
+            http_client.Response(url, 200, {}, json.dumps({'response': {'content': mockapi.fake_article(self.item_id(url))}}))
+            for url in urls]
+
+
+class TestReadItems(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        configuration.write('CAPI_BASE_URL', CAPI_BASE_URL)
+
+        import capi
+        self.capi = capi
+        self.real_cache = capi.cache
+        self.real_fetch_all = http_client.fetch_all
+        self.remote = DictCache()
+        capi.cache = self.remote
+
+    def tearDown(self):
+        self.capi.cache = self.real_cache
+        http_client.fetch_all = self.real_fetch_all
+        self.testbed.deactivate()
+
+    def stub(self, failing=()):
+        http_client.fetch_all = StubFetchAll(failing)
+        return http_client.fetch_all
+
+    def ids(self, items):
+        return [item['id'] if item else None for item in items]
+
+    def test_should_only_fetch_the_items_that_are_not_cached_and_keep_the_order(self):
+        cached_url = self.capi.item_url('world/cached')
+        self.remote.values[cached_url] = {'id': 'world/cached'}
+        fetch_all = self.stub()
+
+        items = self.capi.read_items(['world/first', 'world/cached', 'world/second', 'world/first'])
+
+        self.assertEquals(self.ids(items), ['world/first', 'world/cached', 'world/second', 'world/first'])
+        self.assertEquals(fetch_all.batches, [['world/first', 'world/second']])
+        self.assertEquals(self.remote.calls, 1)
+        self.assertEquals(sorted(self.remote.values.keys()),
+            sorted(self.capi.item_url(item_id) for item_id in ['world/first', 'world/cached', 'world/second']))
+
+    def test_should_read_every_item_from_the_cache_once_it_has_been_fetched(self):
+        fetch_all = self.stub()
+
+        self.capi.read_items(['world/first', 'world/second'])
+        items = self.capi.read_items(['world/second', 'world/first'])
+
+        self.assertEquals(self.ids(items), ['world/second', 'world/first'])
+        self.assertEquals(fetch_all.batches, [['world/first', 'world/second']])
+
+    def test_a_failed_fetch_should_read_as_none_and_not_be_cached(self):
+        fetch_all = self.stub(failing=['world/missing'])
+
+        items = self.capi.read_items(['world/first', 'world/missing'])
+
+        self.assertEquals(self.ids(items), ['world/first', None])
+        self.assertFalse(self.capi.item_url('world/missing') in self.remote.values)
+
+        self.assertEquals(self.capi.read_item('world/missing'), None)
+        self.assertEquals(fetch_all.batches, [['world/first', 'world/missing'], ['world/missing']])
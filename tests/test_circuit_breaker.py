@@ -0,0 +1,81 @@
+import unittest
+
+import circuit_breaker
+import http_client
+
+class FailingUrlfetch(object):
+    def __init__(self):
+        self.requests = 0
+
+    def fetch(self, url, headers=None, deadline=None):
+        self.requests += 1
+        raise IOError('timeout')
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def breaker(self):
+        return circuit_breaker.CircuitBreaker('ophan', window=60, minimum_calls=4, failure_rate=0.5, open_time=30)
+
+    def test_should_stay_closed_below_the_failure_rate(self):
+        breaker = self.breaker()
+        for failed in [True, False, False, False, False]:
+            breaker.record(failed)
+
+        self.assertEquals(breaker.state, circuit_breaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_should_open_and_reject_calls_once_enough_fail(self):
+        breaker = self.breaker()
+        for failed in [True, False, True, True]:
+            breaker.record(failed)
+
+        self.assertEquals(breaker.state, circuit_breaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEquals(breaker.snapshot()['rejected'], 1)
+
+    def test_should_let_one_probe_through_and_close_if_it_succeeds(self):
+        breaker = self.breaker()
+        for failed in [True] * 4:
+            breaker.record(failed)
+        breaker.changed_at -= 30
+
+        self.assertTrue(breaker.allow())
+        self.assertEquals(breaker.state, circuit_breaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+        breaker.record(failed=False)
+        self.assertEquals(breaker.state, circuit_breaker.CLOSED)
+
+    def test_should_open_again_if_the_probe_fails(self):
+        breaker = self.breaker()
+        for failed in [True] * 4:
+            breaker.record(failed)
+        breaker.changed_at -= 30
+
+        breaker.allow()
+        breaker.record(failed=True)
+
+        self.assertEquals(breaker.state, circuit_breaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+
+class TestHttpClientCircuits(unittest.TestCase):
+
+    def setUp(self):
+        self.real_urlfetch = http_client.urlfetch
+        http_client.urlfetch = FailingUrlfetch()
+
+    def tearDown(self):
+        http_client.urlfetch = self.real_urlfetch
+
+    def test_should_fail_fast_once_the_circuit_opens(self):
+        client = http_client.HttpClient()
+
+        for attempt in range(5):
+            self.assertRaises(http_client.HttpError, client.fetch, 'http://ophan.com/api/viral', upstream='ophan')
+
+        self.assertEquals(http_client.urlfetch.requests, 10)
+        self.assertRaises(http_client.CircuitOpen, client.fetch, 'http://ophan.com/api/viral', upstream='ophan')
+        self.assertEquals(http_client.urlfetch.requests, 10)
+        self.assertEquals(client.circuit_states()['ophan']['state'], circuit_breaker.OPEN)
@@ -0,0 +1,84 @@
+import unittest
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+from google.appengine.datastore import datastore_stub_util
+
+import configuration
+
+class TestConfigurationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.cache = configuration.ConfigurationCache(check_interval=0)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def put(self, key, value):
+        configuration.Configuration(id=key, key=key, value=value).put()
+
+    def test_should_read_values_and_defaults(self):
+        self.put('CAPI_KEY', 'abc')
+
+        self.assertEquals(self.cache.read('CAPI_KEY'), 'abc')
+        self.assertEquals(self.cache.read('MISSING', 'default'), 'default')
+
+    def test_should_keep_serving_values_until_the_version_changes(self):
+        self.put('CAPI_KEY', 'abc')
+        self.cache.read('CAPI_KEY')
+        self.put('CAPI_KEY', 'def')
+
+        self.assertEquals(self.cache.read('CAPI_KEY'), 'abc')
+
+        memcache.set(configuration.VERSION_KEY, 'new version')
+        self.assertEquals(self.cache.read('CAPI_KEY'), 'def')
+
+    def test_writes_should_invalidate_other_instances(self):
+        self.put('CAPI_KEY', 'abc')
+        self.cache.read('CAPI_KEY')
+
+        configuration.write('CAPI_KEY', 'def')
+
+        self.assertEquals(self.cache.read('CAPI_KEY'), 'def')
+
+    def test_should_not_check_the_version_within_the_check_interval(self):
+        cache = configuration.ConfigurationCache(check_interval=60)
+        self.put('CAPI_KEY', 'abc')
+        cache.read('CAPI_KEY')
+        memcache.set(configuration.VERSION_KEY, 'new version')
+        self.put('CAPI_KEY', 'def')
+
+        self.assertEquals(cache.read('CAPI_KEY'), 'abc')
+
+
+class TestEventuallyConsistentConfiguration(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=0)
+        self.testbed.init_datastore_v3_stub(consistency_policy=policy)
+        self.testbed.init_memcache_stub()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_should_reload_what_was_just_written_before_queries_see_it(self):
+        cache = configuration.ConfigurationCache(check_interval=0)
+        other_instance = configuration.ConfigurationCache(check_interval=0)
+        self.assertEquals(cache.read('CAPI_KEY'), None)
+        self.assertEquals(other_instance.read('CAPI_KEY'), None)
+
+        configuration.write('CAPI_KEY', 'abc')
+        configuration.write('CAPI_KEY', 'def')
+        self.assertEquals([config.value for config in configuration.Configuration.query()], ['abc'])
+        ndb.get_context().clear_cache()
+
+        self.assertEquals(cache.read('CAPI_KEY'), 'def')
+        self.assertEquals(other_instance.read('CAPI_KEY'), 'def')
+        self.assertEquals(configuration.ConfigurationCache().read('CAPI_KEY'), 'def')
@@ -0,0 +1,147 @@
+import json
+import time
+import unittest
+import threading
+
+from google.appengine.ext import testbed
+
+import defaults
+import http_client
+import configuration
+import render_context
+from handlers import EmailTemplate
+from test_caches import DictCache
+
+CONTAINER_API_HOST = 'containers.test'
+CONTAINER_API_BASE_URL = 'http://containers.test/container/collection'
+FRONT_URL = 'http://containers.test/list/collections/by/front/uk'
+
+class StubFetch(object):
+    """
+    Stands in for http_client.fetch, answering the front's list of
+    containers and each container with its stories. Containers that are
+    set to fail raise HttpError, and slow ones take a while to answer.
+    """
+    slow_time = 0.05
+
+    def __init__(self, containers, failing=(), slow=()):
+        self.containers = containers
+        self.failing = failing
+        self.slow = slow
+        self.urls = []
+
+    def __call__(self, url, upstream='default', headers=None):
+        self.urls.append(url)
+
+        if url == FRONT_URL:
+            return http_client.Response(url, 200, {}, json.dumps({'data': sorted(self.containers.keys())}))
+
+        container_id = url[len(CONTAINER_API_BASE_URL) + 1:]
+
+        if container_id in self.failing:
+            raise http_client.HttpError('Could not fetch {0}'.format(url))
+
+        if container_id in self.slow:
+            time.sleep(self.slow_time)
+
+        live = [{'id': story_id} for story_id in self.containers[container_id]]
+        return http_client.Response(url, 200, {}, json.dumps({'collection': {'live': live}}))
+
+
+class RecordingCache(DictCache):
+    def __init__(self):
+        DictCache.__init__(self)
+        self.times = {}
+
+    def set(self, key, value, time=0):
+        self.times[key] = time
+        return DictCache.set(self, key, value, time)
+
+
+class TestFrontDataSource(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        configuration.write('CONTAINER_API_HOST', CONTAINER_API_HOST)
+        configuration.write('CONTAINER_API_BASE_URL', CONTAINER_API_BASE_URL)
+
+        from container_api import container
+        self.container = container
+        self.real_cache = container.cache
+        self.real_fetch = http_client.fetch
+        self.real_read_items = container.capi.read_items
+        self.cache = RecordingCache()
+        container.cache = self.cache
+        container.capi.read_items = lambda ids, additional_params=None: [{'id': story_id} for story_id in ids]
+        self.threads = threading.enumerate()
+
+    def tearDown(self):
+        # A container cut off by the render budget is still being read, and
+        # must not outlive the stubs and testbed it reads with
+        for thread in threading.enumerate():
+            if thread not in self.threads:
+                thread.join(5)
+
+        self.container.cache = self.real_cache
+        self.container.capi.read_items = self.real_read_items
+        http_client.fetch = self.real_fetch
+        self.testbed.deactivate()
+
+    def stub(self, containers, failing=(), slow=()):
+        http_client.fetch = StubFetch(containers, failing, slow)
+        return http_client.fetch
+
+    def story_ids(self, stories):
+        return [story['id'] for story in stories]
+
+    def test_should_cache_the_list_of_containers_on_the_front(self):
+        fetch = self.stub({'a': ['uk/a1']})
+        front = self.container.for_front('uk')
+
+        front.fetch_data()
+        front.fetch_data()
+
+        self.assertEquals(fetch.urls.count(FRONT_URL), 1)
+        self.assertEquals(self.cache.times[FRONT_URL], defaults.FRONT_CACHE_TIME)
+
+    def test_should_keep_the_stories_in_the_order_of_the_containers(self):
+        self.stub({'a': ['uk/a1', 'uk/a2'], 'b': ['uk/b1'], 'c': ['uk/c1', 'uk/c2']}, slow=['a'])
+
+        stories = self.container.for_front('uk').fetch_data()
+
+        self.assertEquals(self.story_ids(stories), ['uk/a1', 'uk/a2', 'uk/b1', 'uk/c1', 'uk/c2'])
+
+    def test_should_cut_off_containers_that_outrun_the_render_budget(self):
+        fetch = self.stub({'a': ['uk/a1'], 'b': ['uk/b1'], 'c': ['uk/c1']}, slow=['b'])
+        fetch.slow_time = 0.5
+
+        with render_context.rendering('test', budget=0.2) as context:
+            stories = self.container.for_front('uk').fetch_data()
+
+        self.assertEquals(self.story_ids(stories), ['uk/a1', 'uk/c1'])
+        self.assertEquals(context.degraded_sections(), ['b;timeout'])
+
+    def test_should_drop_a_container_that_fails_rather_than_the_front(self):
+        fetch = self.stub({'a': ['uk/a1'], 'b': ['uk/b1'], 'c': ['uk/c1']}, failing=['b'])
+
+        with render_context.rendering('test') as context:
+            stories = self.container.for_front('uk').fetch_data()
+
+        self.assertEquals(self.story_ids(stories), ['uk/a1', 'uk/c1'])
+        self.assertEquals(fetch.urls.count(CONTAINER_API_BASE_URL + '/b'), 1)
+        self.assertEquals(context.degraded_sections(), ['b;failed'])
+
+    def test_a_container_that_fails_should_be_a_degraded_section(self):
+        self.stub({'a': ['uk/a1'], 'b': ['uk/b1']}, failing=['b'])
+        data_sources = {'a': self.container.for_id('a'), 'b': self.container.for_id('b')}
+
+        with render_context.rendering('test') as context:
+            retrieved_data = EmailTemplate.fetch_all(data_sources)
+            titles = EmailTemplate.fetch_all_title_overrides({'b': self.container.for_id('b')})
+
+        self.assertEquals(self.story_ids(retrieved_data['a']), ['uk/a1'])
+        self.assertEquals((retrieved_data['b'], titles), ([], {}))
+        self.assertEquals(context.degraded_sections(), ['b;failed'])
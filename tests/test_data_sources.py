@@ -2,7 +2,9 @@
 
 import prefetch
 import unittest
+import time
 import urllib
+import threading
 
 from data_source import \
     CultureDataSource, SportDataSource, MostViewedDataSource, \
@@ -18,6 +20,10 @@ from datetime import datetime
 from test_fetchers import ApiStubFetcher, ContentIdRememberingStubClient, MultiCalledApiStubFetcher
 
 from handlers import EmailTemplate
+import render_context
+import http_client
+import caches
+from google.appengine.ext.testbed import Testbed
 
 API_KEY = 'gu-email-renderer-unit-tests'
 Fields = 'trailText,headline,liveBloggingNow,standfirst,commentable,thumbnail,byline'
@@ -347,6 +353,29 @@ class TestDataSources(unittest.TestCase):
         assert retrieved_data['cheese'] == 'stub data 1'
         assert retrieved_data['pickle'] == 'stub data 2'
 
+    def test_fetch_all_should_fetch_every_data_source_at_once_when_concurrent(self):
+        all_started = threading.Event()
+        started = []
+
+        class WaitingDataSource(object):
+            def __init__(self, name):
+                self.name = name
+
+            def fetch_data(self):
+                started.append(self.name)
+                if len(started) == 3:
+                    all_started.set()
+                all_started.wait(5)
+                return '%s data, all started: %s' % (self.name, all_started.is_set())
+
+        data_source_map = dict((name, WaitingDataSource(name)) for name in ['cheese', 'pickle', 'toast'])
+        retrieved_data = EmailTemplate.fetch_all(data_source_map, concurrent=True)
+
+        self.assertEquals(retrieved_data, {
+            'cheese': 'cheese data, all started: True',
+            'pickle': 'pickle data, all started: True',
+            'toast': 'toast data, all started: True'})
+
 
     def test_multi_content_data_source_should_retrieve_content_for_each_of_the_supplied_ids(self):
         client = ContentIdRememberingStubClient()
@@ -356,6 +385,141 @@ class TestDataSources(unittest.TestCase):
         data_source.fetch_data()
         self.assertEquals(set(client.content_ids), set(id_list))
 
+    def test_fetch_all_should_only_fetch_a_data_source_registered_under_two_keys_once(self):
+        class CountingDataSource(object):
+            def __init__(self):
+                self.fetches = 0
+
+            def fetch_data(self):
+                self.fetches += 1
+                return ['stub data']
+
+        shared_data_source = CountingDataSource()
+        data_source_map = {'music_picks': shared_data_source, 'music_further': shared_data_source}
+        retrieved_data = EmailTemplate.fetch_all(data_source_map, concurrent=True)
+
+        self.assertEquals(shared_data_source.fetches, 1)
+        self.assertEquals(retrieved_data, {'music_picks': ['stub data'], 'music_further': ['stub data']})
+
+    def test_fetch_all_should_cut_off_sources_that_outrun_the_render_budget(self):
+        release = threading.Event()
+
+        class SlowDataSource(object):
+            def fetch_data(self):
+                release.wait(5)
+                return ['slow data']
+
+        class QuickDataSource(object):
+            def fetch_data(self):
+                return ['quick data']
+
+        data_source_map = {'slow': SlowDataSource(), 'quick': QuickDataSource()}
+
+        with render_context.rendering('test', budget=0.2) as context:
+            retrieved_data = EmailTemplate.fetch_all(data_source_map, concurrent=True)
+        release.set()
+
+        self.assertEquals(retrieved_data, {'slow': [], 'quick': ['quick data']})
+        self.assertEquals(context.degraded, ['slow'])
+        self.assertEquals(context.degraded_sections(), ['slow;timeout'])
+
+    def test_fetch_all_should_render_sources_whose_upstream_fails_empty(self):
+        class FailingDataSource(object):
+            def fetch_data(self):
+                raise http_client.CircuitOpen('ophan circuit is open')
+
+        with render_context.rendering('test') as context:
+            retrieved_data = EmailTemplate.fetch_all({'most_shared': FailingDataSource()})
+
+        self.assertEquals(retrieved_data, {'most_shared': []})
+        self.assertEquals(context.degraded, ['most_shared'])
+        self.assertEquals(context.degraded_sections(), ['most_shared;failed'])
+
+    def test_each_source_that_fails_should_get_an_empty_list_of_its_own(self):
+        class FailingDataSource(object):
+            def fetch_data(self):
+                raise http_client.HttpError('capi is down')
+
+        with render_context.rendering('test'):
+            retrieved_data = EmailTemplate.fetch_all({'top_stories': FailingDataSource(), 'picks': FailingDataSource()})
+
+        retrieved_data['top_stories'].append('a story')
+
+        self.assertEquals(retrieved_data['picks'], [])
+
+    def test_fetch_all_should_cut_off_capi_sources_once_the_budget_is_spent(self):
+        testbed = Testbed()
+        testbed.activate()
+        testbed.init_memcache_stub()
+        caches.cache.local.clear()
+
+        client = ApiClient('http://content.guardianapis.com/', API_KEY)
+        data_source_map = {'top_stories': SearchDataSource(client), 'picks': ItemDataSource(client, 'uk', show_editors_picks=True)}
+
+        try:
+            with render_context.rendering('test', budget=0.01) as context:
+                time.sleep(0.02)
+                retrieved_data = EmailTemplate.fetch_all(data_source_map)
+        finally:
+            testbed.deactivate()
+
+        self.assertEquals(retrieved_data, {'top_stories': [], 'picks': []})
+        self.assertEquals(sorted(context.degraded_sections()), ['picks;timeout', 'top_stories;timeout'])
+
+    def test_title_overrides_should_be_fetched_when_the_data_used_up_the_budget(self):
+        class TitledDataSource(object):
+            def fetch_title_override(self):
+                if not render_context.remaining_time():
+                    raise http_client.HttpError('No time left to fetch the title')
+                return 'Title'
+
+        data_source_map = {'top_stories': TitledDataSource(), 'untitled': TitledDataSource()}
+
+        with render_context.rendering('test', budget=0.01) as context:
+            time.sleep(0.02)
+            self.assertEquals(render_context.remaining_time(), 0.0)
+            titles = EmailTemplate.fetch_all_title_overrides(data_source_map, concurrent=True)
+
+        self.assertEquals(titles, {'top_stories': 'Title', 'untitled': 'Title'})
+        self.assertEquals(context.degraded, [])
+
+    def test_batched_multi_content_data_source_should_resolve_ids_in_pages_and_keep_their_order(self):
+        class IdsQueryRememberingStubClient(object):
+            def __init__(self):
+                self.batches = []
+                self.criteria = []
+
+            def ids_query(self, content_ids, **criteria):
+                self.batches.append(content_ids)
+                self.criteria.append(criteria)
+                return [{'id': content_id} for content_id in reversed(content_ids)
+                    if content_id != 'item/7']
+
+        client = IdsQueryRememberingStubClient()
+        data_source = MultiContentDataSource(client=client, name='test_thing', batched=True)
+        data_source.content_ids = ['/item/%d' % i for i in range(120)]
+        data = data_source.fetch_data()
+
+        self.assertEquals([len(batch) for batch in client.batches], [50, 50, 20])
+        self.assertEquals([item['id'] for item in data],
+            ['item/%d' % i for i in range(120) if i != 7])
+
+    def test_batched_multi_content_data_source_should_only_shape_the_results_not_filter_them(self):
+        class IdsQueryRememberingStubClient(object):
+            def ids_query(self, content_ids, **criteria):
+                self.criteria = criteria
+                return [{'id': content_id} for content_id in content_ids]
+
+        client = IdsQueryRememberingStubClient()
+        data_source = MultiContentDataSource(client=client, name='test_thing', batched=True)
+        data_source.section = 'world'
+        data_source.from_date = '2015-01-01'
+        data_source.content_ids = ['/item/1', '/item/2']
+        data_source.fetch_data()
+
+        self.assertEquals(sorted(client.criteria.keys()), ['show-fields', 'show-tags', 'show_elements', 'user-tier'])
+        self.assertEquals(client.criteria['show_elements'], 'image')
+
     #Move this when we are finished
     def test_blog_and_data_source_should_call_api_for_blog_and_data(self):
         class MockDataSource(object):
@@ -0,0 +1,101 @@
+import time
+import unittest
+
+from google.appengine.ext import testbed
+
+from guardianapi import fetchers
+import http_client
+import caches
+
+class RecordingRefresher(object):
+    def __init__(self):
+        self.refreshed = []
+
+    def refresh(self, url):
+        self.refreshed.append(url)
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    url = 'http://content.guardianapis.com/uk?api-key=test'
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        caches.cache.local.clear()
+
+        self.real_read_url = fetchers.read_url
+        self.upstream_calls = []
+        self.request_headers = []
+        fetchers.read_url = self.read_url
+
+    def tearDown(self):
+        fetchers.read_url = self.real_read_url
+        self.testbed.deactivate()
+
+    def read_url(self, url, headers=None):
+        self.upstream_calls.append(url)
+        self.request_headers.append(headers)
+
+        if headers and headers.get('If-None-Match') == '"cached"':
+            return http_client.Response(url, 304, {'etag': '"cached"'}, '')
+
+        return http_client.Response(url, 200, {'etag': 'fresh'}, 'fresh body')
+
+    def cache_entry(self, fresh_for, headers=None):
+        caches.cache.remote.set(self.url, {
+            'headers': headers or {},
+            'body': 'cached body',
+            'fresh_until': time.time() + fresh_for})
+
+    def test_should_serve_a_fresh_entry_without_refreshing(self):
+        refresher = RecordingRefresher()
+        self.cache_entry(fresh_for=60)
+
+        self.assertEquals(fetchers.Fetcher(refresher).get(self.url), ({}, 'cached body'))
+        self.assertEquals(refresher.refreshed, [])
+        self.assertEquals(self.upstream_calls, [])
+
+    def test_should_serve_a_stale_entry_and_schedule_a_single_refresh(self):
+        refresher = RecordingRefresher()
+        self.cache_entry(fresh_for=-60)
+
+        fetcher = fetchers.Fetcher(refresher)
+        self.assertEquals(fetcher.get(self.url), ({}, 'cached body'))
+        self.assertEquals(fetcher.get(self.url), ({}, 'cached body'))
+
+        self.assertEquals(refresher.refreshed, [self.url])
+        self.assertEquals(self.upstream_calls, [])
+
+    def test_refreshing_should_replace_the_stale_entry(self):
+        self.cache_entry(fresh_for=-60)
+
+        fetcher = fetchers.Fetcher(fetchers.InlineRefresher())
+        fetcher.get(self.url)
+
+        self.assertEquals(fetcher.get(self.url), ({'etag': 'fresh'}, 'fresh body'))
+        self.assertEquals(self.upstream_calls, [self.url])
+
+    def test_should_block_on_the_upstream_when_nothing_is_cached(self):
+        refresher = RecordingRefresher()
+
+        self.assertEquals(fetchers.Fetcher(refresher).get(self.url), ({'etag': 'fresh'}, 'fresh body'))
+        self.assertEquals(self.upstream_calls, [self.url])
+        self.assertEquals(refresher.refreshed, [])
+
+    def test_should_revalidate_a_stale_entry_with_its_etag(self):
+        self.cache_entry(fresh_for=-60, headers={'etag': '"cached"'})
+
+        fetcher = fetchers.Fetcher(fetchers.InlineRefresher())
+        fetcher.get(self.url)
+
+        self.assertEquals(self.request_headers, [{'If-None-Match': '"cached"'}])
+        self.assertEquals(fetcher.get(self.url), ({'etag': '"cached"'}, 'cached body'))
+        self.assertEquals(len(self.upstream_calls), 1)
+
+    def test_should_send_no_conditional_headers_without_a_validator(self):
+        self.cache_entry(fresh_for=-60)
+
+        fetchers.Fetcher(fetchers.InlineRefresher()).get(self.url)
+
+        self.assertEquals(self.request_headers, [None])
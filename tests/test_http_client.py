@@ -0,0 +1,135 @@
+import time
+import unittest
+import gzip
+from StringIO import StringIO
+
+import http_client
+import render_context
+
+def gzipped(text):
+    buffer = StringIO()
+    compressed = gzip.GzipFile(fileobj=buffer, mode='wb')
+    compressed.write(text)
+    compressed.close()
+    return buffer.getvalue()
+
+
+class StubResult(object):
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class StubUrlfetch(object):
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def fetch(self, url, headers=None, deadline=None):
+        self.requests.append((url, headers, deadline))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class StubRpc(object):
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.result = None
+
+    def get_result(self):
+        return self.result
+
+
+class StubAsyncUrlfetch(object):
+    """
+    Answers RPCs with the given results by url; a url with an exception
+    raises it as the call is made.
+    """
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+        self.calls = []
+
+    def create_rpc(self, deadline=None):
+        return StubRpc(deadline)
+
+    def make_fetch_call(self, rpc, url, headers=None):
+        self.calls.append(url)
+        outcome = self.outcomes[url]
+        if isinstance(outcome, Exception):
+            raise outcome
+        rpc.result = outcome
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.real_urlfetch = http_client.urlfetch
+
+    def tearDown(self):
+        http_client.urlfetch = self.real_urlfetch
+
+    def stub(self, *outcomes):
+        http_client.urlfetch = StubUrlfetch(outcomes)
+        return http_client.urlfetch
+
+    def test_should_ask_for_gzip_and_decompress_the_response(self):
+        urlfetch = self.stub(StubResult(200, gzipped('{"response": {}}'), {'Content-Encoding': 'gzip'}))
+        response = http_client.HttpClient().fetch('http://capi.com/search', upstream='capi')
+
+        self.assertEquals(response.content, '{"response": {}}')
+        self.assertEquals(response.headers['content-encoding'], 'gzip')
+        self.assertEquals(urlfetch.requests[0][1]['Accept-Encoding'], 'gzip')
+        self.assertEquals(urlfetch.requests[0][2], 8)
+
+    def test_should_fail_a_response_that_is_not_really_gzipped(self):
+        self.stub(StubResult(200, gzipped('{"response": {}}')[:-12], {'Content-Encoding': 'gzip'}))
+        self.assertRaises(http_client.HttpError, http_client.HttpClient().fetch, 'http://capi.com/search', upstream='capi')
+
+        self.stub(StubResult(200, 'not gzip', {'Content-Encoding': 'gzip'}))
+        self.assertEquals(http_client.HttpClient().fetch_all(['http://capi.com/search'], upstream='capi'), [None])
+
+    def test_should_retry_failed_requests_as_many_times_as_the_upstream_allows(self):
+        self.stub(IOError('timeout'), StubResult(200, 'ok'))
+        client = http_client.HttpClient()
+        response = client.fetch('http://ophan.com/api/viral', upstream='ophan')
+
+        self.assertEquals(response.content, 'ok')
+        stats = client.host_stats()['ophan.com']
+        self.assertEquals(stats['requests'], 2)
+        self.assertEquals(stats['errors'], 1)
+        self.assertEquals(stats['retries'], 1)
+
+    def test_should_raise_once_the_retries_are_used_up(self):
+        self.stub(IOError('timeout'), IOError('timeout'))
+
+        self.assertRaises(http_client.HttpError,
+            http_client.HttpClient().fetch, 'http://ophan.com/api/viral', upstream='ophan')
+
+    def test_should_return_error_responses_without_retrying(self):
+        urlfetch = self.stub(StubResult(404, 'not found'))
+        response = http_client.HttpClient().fetch('http://capi.com/nothing', upstream='capi')
+
+        self.assertEquals(response.status_code, 404)
+        self.assertEquals(len(urlfetch.requests), 1)
+
+    def test_a_call_that_cannot_be_made_fails_without_stranding_later_fetches(self):
+        http_client.urlfetch = StubAsyncUrlfetch({
+            'http://capi.com/a': StubResult(200, 'a'),
+            'http://capi.com/bad': ValueError('invalid url'),
+        })
+        client = http_client.HttpClient()
+
+        with render_context.rendering('test', budget=5):
+            started = time.time()
+            responses = client.fetch_all(['http://capi.com/a', 'http://capi.com/bad'], upstream='capi')
+            self.assertEquals(responses[0].content, 'a')
+            self.assertEquals(responses[1], None)
+
+            self.assertEquals(client.fetch_all(['http://capi.com/bad'], upstream='capi'), [None])
+            self.assertRaises(http_client.HttpError, client.fetch, 'http://capi.com/bad', upstream='capi')
+            self.assertTrue(time.time() - started < 1)
+
+        self.assertEquals(http_client.urlfetch.calls, ['http://capi.com/a', 'http://capi.com/bad'])
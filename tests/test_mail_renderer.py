@@ -1,6 +1,16 @@
+import os
 import unittest
 import webapp2
+import htmlmin
+import handlers
+import defaults
+import caches
+import http_client
+import circuit_breaker
 from handlers import EmailTemplate
+from data_source import SearchDataSource
+from guardianapi.apiClient import ApiClient
+from google.appengine.ext import testbed
 from webob.exc import HTTPNotFound
 
 
@@ -10,12 +20,33 @@ class Mock(object):
 class MockResponse(object):
     out = Mock()
 
+    def __init__(self):
+        self.headers = {}
+
+class RecordingOutput(object):
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+class RecordingResponse(object):
+    def __init__(self):
+        self.out = RecordingOutput()
+        self.headers = {}
+
 class MockCache(object):
     def __init__(self):
         self.data = {}
+        self.times = {}
 
     def add(self, key, page, time):
+        if key not in self.data:
+            self.set(key, page, time)
+
+    def set(self, key, page, time):
         self.data[key] = page
+        self.times[key] = time
 
     def get(self, key):
         if self.data.has_key(key):
@@ -33,6 +64,10 @@ class MockTemplate(object):
     def render(self, ads, date, **trail_blocks):
         return self.template_name
 
+    def generate(self, ads, date, **trail_blocks):
+        for character in self.template_name:
+            yield character
+
 
 class MockDataSource(object):
     def __init__(self):
@@ -48,7 +83,8 @@ class MockDataSource(object):
 
 class TestRenderer(EmailTemplate):
 
-    def __init__(self):
+    def __init__(self, url='/', headers=None):
+        self.request = webapp2.Request.blank(url, headers=headers)
         self.response = MockResponse()
         self.cache = MockCache()
         self.ad_fetcher = MockAdFetcher()
@@ -98,3 +134,101 @@ class TestMailRenderer(unittest.TestCase):
             self.fail('Unexpected exception: %s' % e)
         else:
             self.fail('Should have thrown HTTPNotFound')
+
+    def test_should_stream_the_page_and_cache_all_of_it(self):
+        renderer = TestRenderer()
+        renderer.response = RecordingResponse()
+        renderer.stream = True
+        renderer.get('v2')
+
+        self.assertEquals(''.join(renderer.response.out.chunks), 'template_2.html')
+        self.assertEquals(renderer.cache.data.values()[0], 'template_2.html')
+
+    def test_should_send_timings_to_admins_who_ask_for_them(self):
+        os.environ['USER_IS_ADMIN'] = '1'
+        try:
+            renderer = TestRenderer('/?timing=1')
+            renderer.get('v2')
+        finally:
+            del os.environ['USER_IS_ADMIN']
+
+        timings = renderer.response.headers['Server-Timing']
+        for span in ['fetch.data_source_3', 'title.data_source_3', 'deduplication', 'template', 'render', 'total']:
+            self.assertTrue(span + ';dur=' in timings, timings)
+
+    def test_warming_should_render_afresh_and_cache_for_the_send(self):
+        renderer = TestRenderer('/?warm=1', headers={'X-AppEngine-QueueName': 'default'})
+        cache_key = 'v2' + str(renderer.__class__)
+        renderer.cache.set(cache_key, 'stale page', defaults.PAGE_CACHE_TIME)
+        renderer.get('v2')
+
+        self.assertEquals(renderer.cache.data[cache_key], 'template_2.html')
+        self.assertEquals(renderer.cache.times[cache_key], defaults.WARM_PAGE_CACHE_TIME)
+
+    def test_only_the_task_queue_can_warm_pages(self):
+        renderer = TestRenderer('/?warm=1')
+        cache_key = 'v2' + str(renderer.__class__)
+        renderer.cache.set(cache_key, 'cached page', defaults.PAGE_CACHE_TIME)
+        renderer.get('v2')
+
+        self.assertEquals(renderer.cache.data[cache_key], 'cached page')
+
+    def test_should_not_send_timings_to_everyone(self):
+        renderer = TestRenderer('/?timing=1')
+        renderer.get('v2')
+
+        self.assertFalse('Server-Timing' in renderer.response.headers)
+
+
+class CapiRenderer(TestRenderer):
+    client = ApiClient('http://content.guardianapis.com/', 'gu-email-renderer-unit-tests')
+
+    data_sources = {'v1': {'top_stories': SearchDataSource(client), 'other': MockDataSource()}}
+    priority_list = {'v1': [('top_stories', 4), ('other', 4)]}
+
+
+class TestOpenCircuit(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        caches.cache.local.clear()
+
+        breaker = circuit_breaker.CircuitBreaker('capi')
+        for call in range(breaker.minimum_calls):
+            breaker.record(failed=True)
+        self.real_breaker = http_client.client.breakers.get('capi')
+        http_client.client.breakers['capi'] = breaker
+
+    def tearDown(self):
+        if self.real_breaker:
+            http_client.client.breakers['capi'] = self.real_breaker
+        else:
+            del http_client.client.breakers['capi']
+        self.testbed.deactivate()
+
+    def test_should_render_capi_sections_empty_and_briefly_cache_the_page(self):
+        self.assertEquals(http_client.client.breakers['capi'].state, circuit_breaker.OPEN)
+
+        renderer = CapiRenderer()
+        renderer.get('v1')
+
+        self.assertEquals(renderer.response.headers['X-Degraded-Sections'], 'top_stories;failed')
+        self.assertEquals(renderer.cache.times.values(), [defaults.DEGRADED_PAGE_CACHE_TIME])
+
+
+class TestStreamingMinifier(unittest.TestCase):
+
+    def test_should_minify_a_stream_exactly_as_a_whole_page(self):
+        with open(os.path.join(os.path.dirname(htmlmin.__file__), 'tests', 'large_test.html')) as page_file:
+            page = page_file.read().decode('utf-8')
+
+        chunks = [page[start:start + 1000] for start in range(0, len(page), 1000)]
+        streamed = list(handlers.minified(chunks))
+
+        self.assertTrue(len(streamed) > 2)
+        self.assertEquals(u''.join(streamed), htmlmin.minify(page))
+
+    def test_should_batch_small_chunks(self):
+        self.assertEquals(list(handlers.batched(['ab', 'cd', 'e'], size=4)), ['abcd', 'e'])
@@ -0,0 +1,60 @@
+import os
+import glob
+import unittest
+
+import htmlmin
+
+import minifiers
+
+SNIPPETS = [
+    u'<TABLE WIDTH="100%" CellPadding=0><TR><TD Align="left">Hi</TD></TR></TABLE>',
+    u'<a href="http://example.com/?a=1&amp;b=2" title=\'Tom &quot;the&quot; cat\'>link</a>',
+    u'<a href=http://example.com/path/>trailing slash</a>',
+    u'<input type="checkbox" checked disabled="" value="">',
+    u'<br/><br /><img src="a.png" alt=""/>',
+    u'<script type="text/javascript">var a = "<b>" + 1 < 2;</script><style>p > a { color: red; }</style>',
+    u'<!-- a comment --><p>  spaced    out  </p><!--! kept -->',
+    u'<pre>  keep\n   this  </pre><div pre>  and   this </div>',
+    u'<ul><li>one<li>two</ul><p>para<div>closes it</div>',
+    u'<table><tr><td>a<td>b<tr><td>c</table>',
+    u'<div data-x="a b" class=\'quoted "double"\' id=plain>x</div>',
+    u'<div\n  class="multi\nline"\n  id="y">z</div>',
+    u'<html><head><title>  Title  </title></head><body>&nbsp;&amp;</body></html>',
+    u'<p>caf\xe9 <span title="\xe9t\xe9">\u2603</span></p>',
+]
+
+EMAIL_PAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'pages')
+
+class TestFastMinifier(unittest.TestCase):
+
+    def test_should_match_htmlmin_on_large_test_page(self):
+        with open(os.path.join(os.path.dirname(htmlmin.__file__), 'tests', 'large_test.html')) as page_file:
+            page = page_file.read().decode('utf-8')
+
+        self.assertEquals(minifiers.minify(page, 'fast'), htmlmin.minify(page))
+
+    def test_should_match_htmlmin_on_every_rendered_email(self):
+        pages = sorted(glob.glob(os.path.join(EMAIL_PAGES, '*.html')))
+        self.assertTrue(pages)
+
+        for path in pages:
+            with open(path) as page_file:
+                page = page_file.read().decode('utf-8')
+
+            self.assertEquals(minifiers.minify(page, 'fast'), htmlmin.minify(page), path)
+
+    def test_should_match_htmlmin_on_unusual_markup(self):
+        for snippet in SNIPPETS:
+            self.assertEquals(minifiers.minify(snippet, 'fast'), htmlmin.minify(snippet), snippet)
+
+    def test_should_match_htmlmin_when_streamed(self):
+        page = u''.join(SNIPPETS)
+        minifier = minifiers.minifier('fast')
+
+        for start in range(0, len(page), 7):
+            minifier.input(page[start:start + 7])
+
+        self.assertEquals(minifier.finalize(), htmlmin.minify(page))
+
+    def test_should_default_to_htmlmin(self):
+        self.assertTrue(type(minifiers.minifier()) is htmlmin.Minifier)
@@ -0,0 +1,49 @@
+import unittest
+
+from guardianapi.apiClient import ApiClient
+from guardianapi.mockapi import MockFetcher, fake_article
+
+BASE_URL = 'http://content.guardianapis.com/'
+
+class TestMockFetcher(unittest.TestCase):
+    def setUp(self):
+        self.fetcher = MockFetcher(BASE_URL)
+        self.client = ApiClient(BASE_URL, 'key', fetcher=self.fetcher)
+
+    def test_search_returns_the_requested_number_of_results(self):
+        results = self.client.search_query(section='world', page_size=3)
+
+        self.assertEquals(len(results), 3)
+        self.assertTrue(all('webTitle' in result for result in results))
+
+    def test_search_by_ids_returns_those_items(self):
+        results = self.client.search_query(ids='world/a,sport/b')
+
+        self.assertEquals([result['id'] for result in results], ['world/a', 'sport/b'])
+
+    def test_item_query_returns_editors_picks_and_most_viewed(self):
+        self.assertEquals(len(self.client.item_query('uk', show_editors_picks=True, only_editors_picks=True)), 5)
+        self.assertEquals(len(self.client.item_query('uk', show_most_viewed=True)), 10)
+
+    def test_replies_are_the_same_for_the_same_request(self):
+        first = self.client.search_query(section='world')
+        second = self.client.search_query(section='world')
+
+        self.assertEquals(first, second)
+        self.assertNotEquals(first, self.client.search_query(section='sport'))
+
+    def test_fetches_are_recorded(self):
+        self.client.search_query(section='world')
+
+        url, parameters = self.fetcher.fetched[0]
+        self.assertTrue(url.startswith(BASE_URL + 'search?'))
+        self.assertEquals(parameters['section'], 'world')
+        self.assertEquals(parameters['api-key'], 'key')
+
+    def test_fake_articles_carry_what_the_templates_use(self):
+        article = fake_article('/world/2016/jun/01/story')
+
+        self.assertEquals(article['id'], 'world/2016/jun/01/story')
+        self.assertEquals(article['sectionId'], 'world')
+        self.assertTrue(article['fields']['shortUrl'].startswith('https://gu.com/p/'))
+        self.assertEquals(set(element['relation'] for element in article['elements']), set(['main', 'thumbnail']))
@@ -0,0 +1,73 @@
+import json
+import unittest
+
+from guardianapi import projection
+
+def asset(width):
+    return {
+        'type': 'image',
+        'file': 'http://media.guim.co.uk/%s.jpg' % width,
+        'typeData': {'width': str(width), 'altText': 'alt', 'photographer': 'Someone', 'suppliersReference': 'ref'}
+    }
+
+def content_item():
+    return {
+        'id': 'world/2016/jan/01/story',
+        'type': 'article',
+        'webUrl': 'http://www.theguardian.com/world/2016/jan/01/story',
+        'fields': {'headline': 'Headline', 'body': '<p>Body</p>', 'shortUrl': 'http://gu.com/p/1'},
+        'tags': [
+            {'id': 'tone/news', 'type': 'tone', 'webTitle': 'News', 'bio': '<p>Long bio</p>'},
+            {'id': 'world/france', 'type': 'keyword', 'webTitle': 'France', 'sectionId': 'world', 'references': [{'id': 'x'}]},
+        ],
+        'elements': [
+            {'id': 'm1', 'relation': 'main', 'type': 'image', 'assets': [asset(140), asset(1000)]},
+            {'id': 't1', 'relation': 'thumbnail', 'type': 'image', 'assets': [asset(140)]},
+            {'id': 'b1', 'relation': 'body', 'type': 'image', 'assets': [asset(2000)]},
+        ],
+        'blocks': {'body': [{'bodyHtml': '<p>Body</p>'}]},
+    }
+
+
+class TestProjection(unittest.TestCase):
+
+    def test_should_keep_scalars_and_requested_fields(self):
+        projected = projection.project_item(content_item())
+
+        self.assertEquals(projected['id'], 'world/2016/jan/01/story')
+        self.assertEquals(projected['webUrl'], 'http://www.theguardian.com/world/2016/jan/01/story')
+        self.assertEquals(projected['fields'], content_item()['fields'])
+        self.assertFalse('blocks' in projected)
+
+    def test_should_keep_only_the_tag_keys_templates_read(self):
+        tags = projection.project_item(content_item())['tags']
+
+        self.assertEquals(tags, [
+            {'id': 'tone/news', 'type': 'tone', 'webTitle': 'News'},
+            {'id': 'world/france', 'type': 'keyword', 'webTitle': 'France', 'sectionId': 'world'},
+        ])
+
+    def test_should_keep_every_width_of_the_images_templates_read(self):
+        elements = projection.project_item(content_item())['elements']
+
+        self.assertEquals([element['relation'] for element in elements], ['main', 'thumbnail'])
+        self.assertEquals([asset['typeData'] for asset in elements[0]['assets']],
+            [{'width': '140', 'altText': 'alt'}, {'width': '1000', 'altText': 'alt'}])
+
+    def test_should_attach_the_view_model(self):
+        view = projection.project_item(content_item())['_view']
+
+        self.assertEquals(view['tone'], 'tone/news')
+        self.assertEquals(view['keyword'], 'France')
+        self.assertEquals(sorted(view['images'].keys()), ['main', 'thumbnail'])
+
+    def test_should_project_every_item_in_a_response(self):
+        body = json.dumps({'response': {'status': 'ok', 'results': [content_item()], 'editorsPicks': [content_item()]}})
+        response = json.loads(projection.project_response(body))['response']
+
+        self.assertEquals(response['status'], 'ok')
+        self.assertFalse('blocks' in response['results'][0])
+        self.assertFalse('blocks' in response['editorsPicks'][0])
+
+    def test_should_leave_other_bodies_alone(self):
+        self.assertEquals(projection.project_response('not json'), 'not json')
@@ -0,0 +1,133 @@
+import unittest
+import threading
+
+import render_context
+from singleflight import Group, WaitTimeout
+
+class TestSingleflight(unittest.TestCase):
+
+    def test_should_only_do_the_work_once_for_callers_waiting_on_the_same_key(self):
+        group = Group()
+        release = threading.Event()
+        calls = []
+
+        def slow_work():
+            calls.append('called')
+            release.wait(5)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(group.do('key', slow_work))) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(calls, ['called'])
+        self.assertEquals(results, ['result'] * 5)
+
+    def test_should_share_failures_with_every_caller(self):
+        group = Group()
+
+        def failing_work():
+            raise ValueError('upstream down')
+
+        self.assertRaises(ValueError, group.do, 'key', failing_work)
+        self.assertRaises(ValueError, group.do, 'key', lambda: 'never called')
+
+    def test_should_give_up_on_a_call_that_is_never_resolved(self):
+        group = Group()
+        group.claim('key')
+
+        self.assertRaises(WaitTimeout, group.do, 'key', lambda: 'never called', timeout=0.01)
+
+
+class TestRenderContext(unittest.TestCase):
+
+    def test_should_reuse_results_for_the_same_request_within_a_render(self):
+        calls = []
+
+        def fetch():
+            calls.append('fetch')
+            return len(calls)
+
+        with render_context.rendering('v1'):
+            first = render_context.coalesce(render_context.canonical_url('http://capi/search?b=2&a=1'), fetch)
+            second = render_context.coalesce(render_context.canonical_url('http://capi/search?a=1&b=2'), fetch)
+
+        self.assertEquals((first, second), (1, 1))
+        self.assertEquals(render_context.current(), None)
+
+    def test_should_not_coalesce_outside_of_a_render(self):
+        calls = []
+
+        render_context.coalesce('key', lambda: calls.append('fetch'))
+        render_context.coalesce('key', lambda: calls.append('fetch'))
+
+        self.assertEquals(len(calls), 2)
+
+
+class TestRenderBudget(unittest.TestCase):
+
+    def test_should_leave_deadlines_alone_outside_a_budgeted_render(self):
+        self.assertEquals(render_context.clamp_deadline(8), 8)
+
+        with render_context.rendering('test'):
+            self.assertEquals(render_context.clamp_deadline(8), 8)
+
+    def test_should_cut_deadlines_to_the_time_left_in_the_render(self):
+        with render_context.rendering('test', budget=3):
+            self.assertTrue(2 < render_context.clamp_deadline(8) <= 3)
+            self.assertEquals(render_context.clamp_deadline(1), 1)
+
+    def test_should_add_up_spans_with_the_same_name(self):
+        with render_context.rendering('v1') as context:
+            with render_context.span('memcache'):
+                pass
+            with render_context.span('memcache'):
+                pass
+            with render_context.span('render'):
+                pass
+
+        summary = context.summary()
+        self.assertEquals(summary['render'], 'v1')
+        self.assertEquals(summary['spans'].keys(), ['memcache', 'render'])
+        self.assertEquals(summary['spans']['memcache']['count'], 2)
+
+        header = context.server_timing()
+        self.assertTrue(header.startswith('memcache;dur='))
+        self.assertTrue('desc="2 calls"' in header)
+        self.assertTrue(', total;dur=' in header)
+
+    def test_calls_still_running_after_a_render_should_not_record_in_it_or_the_next(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def late_fetch():
+            started.set()
+            release.wait(5)
+            with render_context.span('late'):
+                render_context.degrade('late')
+            return render_context.remaining_time()
+
+        with render_context.rendering('first', budget=5) as first:
+            fetch = render_context.bound(late_fetch)
+            results = []
+            thread = threading.Thread(target=lambda: results.append(fetch()))
+            thread.start()
+            started.wait(5)
+
+        with render_context.rendering('second', budget=5) as second:
+            release.set()
+            thread.join()
+
+        self.assertEquals(results, [0.0])
+        self.assertEquals((first.degraded, first.timings.keys()), ([], []))
+        self.assertEquals((second.degraded, second.timings.keys()), ([], []))
+
+    def test_spans_outside_a_render_should_do_nothing(self):
+        with render_context.span('render'):
+            result = 'rendered'
+
+        self.assertEquals(result, 'rendered')
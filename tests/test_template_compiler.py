@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import jinja2
+import htmlmin
+
+from google.appengine.ext import testbed
+
+import handlers
+import templates
+import template_compiler
+
+environment = jinja2.Environment()
+
+def minify_template(source):
+    return template_compiler.minify_template(source, environment)
+
+class TestTemplateCompiler(unittest.TestCase):
+
+    def test_should_collapse_whitespace_between_tags_but_keep_newlines(self):
+        self.assertEquals(minify_template(u'<table>\n    <tr>  <td>  {{ a }}   b</td></tr>\n\n</table>'),
+            u'<table>\n<tr> <td> {{ a }} b</td></tr>\n\n</table>')
+
+    def test_should_leave_tags_comments_and_raw_elements_alone(self):
+        source = (u'<td  style="{% if a %} border:  1px; {% endif %}"  class=\'x  y\'>'
+            u'<!--[if mso]>  <table>  <![endif]--><style>  p  { }  </style><pre>  a  </pre>')
+
+        self.assertEquals(minify_template(source), source)
+
+    def test_should_follow_the_html_through_statements(self):
+        self.assertEquals(minify_template(u'{% if a %}<td class="a">{% else %}<td>{% endif %}  x  </td>'),
+            u'{% if a %}<td class="a">{% else %}<td>{% endif %} x </td>')
+        self.assertEquals(minify_template(u'<td {% for c in cs %}data-{{ c }}="  "{% endfor %}>  x</td>'),
+            u'<td {% for c in cs %}data-{{ c }}="  "{% endfor %}> x</td>')
+
+    def test_should_refuse_templates_it_cannot_follow(self):
+        for source in [u'{% if a %}<td style="{% endif %}  x  ">',
+                u'{% for a in b %}<a href="{% endfor %}',
+                u'{% else %}',
+                u'<div pre>  a  </div>']:
+            self.assertRaises(template_compiler.UnsafeTemplate, minify_template, source)
+
+    def test_should_minify_every_template(self):
+        loader = jinja2.FileSystemLoader(templates.TEMPLATE_DIRECTORY)
+        for name in loader.list_templates():
+            if name.endswith('.html'):
+                minify_template(loader.get_source(environment, name)[0])
+
+
+class TestCompiledLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        self.directory = tempfile.mkdtemp()
+        template_compiler.compile_templates(environment, templates.TEMPLATE_DIRECTORY, self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        self.testbed.deactivate()
+
+    def build_environment(self, loader):
+        environment = jinja2.Environment(loader=loader)
+        environment.globals.update({'URL_ROOT': '', 'cached_story': templates.uncached_story})
+        environment.filters.update(handlers.jinja_environment.filters)
+        return environment
+
+    def test_should_render_the_same_page_after_minification(self):
+        source = self.build_environment(jinja2.FileSystemLoader(templates.TEMPLATE_DIRECTORY))
+        compiled = self.build_environment(templates.CompiledLoader(templates.TEMPLATE_DIRECTORY, self.directory))
+
+        page = "{% import 'macro/2015/stories.html' as story_blocks %}{{ story_blocks.story(story, thumbnail=True) }}"
+        story = {'id': 'world/story', 'webUrl': 'http://gu.com/world/story', 'webTitle': 'Title', 'tags': [],
+            'fields': {'trailText': 'Trail  text', 'headline': 'Headline', 'standfirst': 'Stand first'}}
+
+        expected = source.from_string(page).render(story=story)
+        rendered = compiled.from_string(page).render(story=story)
+
+        self.assertTrue(len(rendered) < len(expected))
+        self.assertEquals(htmlmin.minify(rendered), htmlmin.minify(expected))
+
+    def test_should_use_the_source_of_changed_templates(self):
+        with open(os.path.join(self.directory, 'index.html'), 'w') as compiled_file:
+            compiled_file.write('stale')
+
+        loader = templates.CompiledLoader(templates.TEMPLATE_DIRECTORY, self.directory)
+        self.assertEquals(loader.get_source(environment, 'index.html')[0], 'stale')
+
+        loader.manifest['index.html'] = 'changed'
+        self.assertNotEquals(loader.get_source(environment, 'index.html')[0], 'stale')
+
+    def test_should_use_the_sources_without_a_build(self):
+        loader = templates.CompiledLoader(templates.TEMPLATE_DIRECTORY, os.path.join(self.directory, 'missing'))
+
+        with open(os.path.join(templates.TEMPLATE_DIRECTORY, 'index.html')) as source_file:
+            source = source_file.read().decode('utf-8')
+
+        self.assertEquals(loader.manifest, {})
+        self.assertEquals(loader.get_source(environment, 'index.html')[0], source)
@@ -0,0 +1,127 @@
+import os
+import unittest
+
+import htmlmin
+
+from google.appengine.ext import testbed
+
+import templates
+import handlers
+
+class TestTemplateEnvironment(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        self.real_production = templates.production
+        os.environ['CURRENT_VERSION_ID'] = 'test-version.1'
+
+    def tearDown(self):
+        templates.production = self.real_production
+        del os.environ['CURRENT_VERSION_ID']
+        self.testbed.deactivate()
+
+    def test_should_reload_changed_templates_outside_production(self):
+        environment = templates.build_environment()
+
+        self.assertTrue(environment.auto_reload)
+        self.assertEquals(environment.bytecode_cache, None)
+
+    def test_should_share_compiled_templates_between_instances_in_production(self):
+        templates.production = lambda: True
+
+        first_instance = templates.build_environment(globals={'URL_ROOT': ''})
+        first_instance.get_template('index.html').render()
+
+        bytecode = first_instance.bytecode_cache
+        self.assertFalse(first_instance.auto_reload)
+        self.assertTrue(bytecode.prefix.endswith('/test-version.1/'))
+
+        compiled = []
+        second_instance = templates.build_environment(globals={'URL_ROOT': ''})
+        real_compile = second_instance.compile
+        second_instance.compile = lambda *args, **kwargs: compiled.append(args) or real_compile(*args, **kwargs)
+        second_instance.get_template('index.html').render()
+
+        self.assertEquals(compiled, [])
+
+
+class TestStoryFragments(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        templates.fragments.clear()
+        self.rendered = []
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def macro(self, story, **arguments):
+        self.rendered.append(story['id'])
+        return '<table>%s %s</table>' % (story['fields']['headline'], arguments)
+
+    def story(self, headline='Headline', last_modified='2016-01-01T10:00:00Z'):
+        return {'id': 'world/story', 'webTitle': headline,
+            'fields': {'headline': headline, 'lastModified': last_modified}}
+
+    def test_should_reuse_the_html_of_an_unchanged_story(self):
+        first = templates.cached_story('stories.html', self.macro, self.story(), first=True)
+        second = templates.cached_story('stories.html', self.macro, self.story(), first=True)
+
+        self.assertEquals(first, second)
+        self.assertEquals(self.rendered, ['world/story'])
+
+    def test_should_render_again_when_the_story_or_arguments_change(self):
+        templates.cached_story('stories.html', self.macro, self.story(), first=True)
+        templates.cached_story('stories.html', self.macro, self.story(), first=False)
+        templates.cached_story('stories.html', self.macro, self.story(headline='New', last_modified='2016-01-01T11:00:00Z'), first=True)
+        templates.cached_story('2015/stories.html', self.macro, self.story(), first=True)
+
+        self.assertEquals(len(self.rendered), 4)
+
+    def test_should_render_again_when_an_image_or_tag_of_a_story_without_a_revision_changes(self):
+        story = self.story(last_modified=None)
+        story['tags'] = [{'id': 'tone/news', 'type': 'tone'}]
+        story['elements'] = [{'relation': 'thumbnail', 'assets': [{'file': 'http://media.guim.co.uk/old.jpg'}]}]
+        key = templates.fragment_key('stories.html', story, {})
+
+        story['elements'][0]['assets'][0]['file'] = 'http://media.guim.co.uk/new.jpg'
+        new_image_key = templates.fragment_key('stories.html', story, {})
+
+        story['tags'][0]['id'] = 'tone/comment'
+        new_tag_key = templates.fragment_key('stories.html', story, {})
+
+        self.assertEquals(len(set([key, new_image_key, new_tag_key])), 3)
+
+    def test_should_key_a_story_with_a_revision_on_the_revision_alone(self):
+        story = self.story()
+        story['elements'] = [{'relation': 'thumbnail', 'assets': [{'file': 'http://media.guim.co.uk/old.jpg'}]}]
+        key = templates.fragment_key('stories.html', story, {})
+
+        story['elements'][0]['assets'][0]['file'] = 'http://media.guim.co.uk/new.jpg'
+        self.assertEquals(templates.fragment_key('stories.html', story, {}), key)
+
+        story['fields']['lastModified'] = '2016-01-01T11:00:00Z'
+        self.assertNotEquals(templates.fragment_key('stories.html', story, {}), key)
+
+    def test_story_macros_should_render_the_same_with_the_fragment_cache(self):
+        real_production = templates.production
+        templates.production = lambda: True
+        try:
+            cached = templates.build_environment(globals={'URL_ROOT': ''}, filters=handlers.jinja_environment.filters)
+        finally:
+            templates.production = real_production
+
+        uncached = templates.build_environment(globals={'URL_ROOT': ''}, filters=handlers.jinja_environment.filters)
+
+        source = "{% import 'macro/stories.html' as story_blocks %}{{ story_blocks.story(story, True) }}"
+        story = {'id': 'world/story', 'webUrl': 'http://gu.com/world/story', 'webTitle': 'Title',
+            'fields': {'trailText': 'Trail', 'headline': 'Headline'}}
+
+        expected = htmlmin.minify(uncached.from_string(source).render(story=story))
+        self.assertEquals(htmlmin.minify(cached.from_string(source).render(story=story)), expected)
+        self.assertEquals(htmlmin.minify(cached.from_string(source).render(story=story)), expected)
+        self.assertTrue('Title' in expected)
@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+from google.appengine.api import urlfetch
+from google.appengine.ext import testbed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import faults
+import upstreams
+
+CAPI_URL = 'http://capi.upstream.test/search?q=storm&api-key=stand-in'
+REAL_CONFIGURATION = dict(upstreams.CONFIGURATION, CAPI_BASE_URL='http://capi.real.test', CAPI_KEY='real-key')
+
+class StubFetchUpstream(object):
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def __call__(self, url, timeout=30):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+class TestFaults(unittest.TestCase):
+
+    def test_should_fault_requests_at_the_given_rates_and_repeat_with_a_seed(self):
+        def run():
+            injected = faults.Faults(error_rate=0.2, timeout_rate=0.1, seed=7)
+            return [injected.fault('capi') for i in range(2000)]
+
+        outcomes = run()
+
+        self.assertEquals(outcomes, run())
+        self.assertTrue(150 < outcomes.count(faults.TIMEOUT) < 250)
+        self.assertTrue(330 < outcomes.count(faults.ERROR) < 470)
+
+    def test_should_add_latency_with_jitter_only_to_the_faulty_upstreams(self):
+        injected = faults.Faults(latency=0.1, jitter=0.05, error_rate=1.0, upstreams=['capi'], seed=7)
+        delays = [injected.delay('capi') for i in range(500)]
+
+        self.assertTrue(all(0.05 <= delay <= 0.15 for delay in delays))
+        self.assertTrue(max(delays) - min(delays) > 0.08)
+        self.assertEquals(injected.delay('ophan'), 0.0)
+        self.assertEquals(injected.fault('ophan'), None)
+
+    def test_delays_should_never_be_negative(self):
+        injected = faults.Faults(latency=0.01, jitter=0.05, seed=7)
+        self.assertEquals(min(injected.delay('capi') for i in range(500)), 0.0)
+
+
+class TestStandIn(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.recordings = upstreams.Recordings(self.directory)
+        self.real_fetch_upstream = upstreams.fetch_upstream
+
+    def tearDown(self):
+        upstreams.fetch_upstream = self.real_fetch_upstream
+        shutil.rmtree(self.directory)
+
+    def test_should_record_a_response_once_and_replay_it_after(self):
+        fetch = StubFetchUpstream((200, {'content-type': 'application/json'}, '{"response": {"results": []}}'))
+        upstreams.fetch_upstream = fetch
+
+        recording = upstreams.StandIn(self.recordings, record_from=REAL_CONFIGURATION)
+        status, headers, content = recording.response_for(CAPI_URL, accepts_gzip=False)
+
+        self.assertEquals((status, content), (200, '{"response": {"results": []}}'))
+        self.assertEquals(fetch.urls, ['http://capi.real.test/search?q=storm&api-key=real-key'])
+        self.assertEquals(recording.recorded, 1)
+
+        replaying = upstreams.StandIn(self.recordings, record_from=REAL_CONFIGURATION)
+        self.assertEquals(replaying.response_for(CAPI_URL, accepts_gzip=False), (status, headers, content))
+        self.assertEquals((len(fetch.urls), replaying.recorded, replaying.synthetic), (1, 0, 0))
+
+    def test_should_not_record_or_keep_server_errors(self):
+        fetch = StubFetchUpstream((503, {}, 'Service unavailable'), (200, {}, '{}'))
+        upstreams.fetch_upstream = fetch
+        stand_in = upstreams.StandIn(self.recordings, record_from=REAL_CONFIGURATION)
+
+        self.assertEquals(stand_in.response_for(CAPI_URL, accepts_gzip=False)[0], 503)
+        self.assertEquals(self.recordings.get('capi', 'search?q=storm'), None)
+        self.assertEquals(stand_in.response_for(CAPI_URL, accepts_gzip=False)[0], 200)
+        self.assertEquals(len(fetch.urls), 2)
+
+    def test_should_answer_without_a_recording_with_the_same_synthetic_response(self):
+        stand_in = upstreams.StandIn(self.recordings)
+
+        first = stand_in.response_for(CAPI_URL, accepts_gzip=False)
+        again = upstreams.StandIn(self.recordings).response_for(CAPI_URL.replace('stand-in', 'other-key'), accepts_gzip=False)
+
+        self.assertEquals(first, again)
+        self.assertEquals(len(json.loads(first[2])['response']['results']), 10)
+        self.assertEquals(stand_in.synthetic, 1)
+        self.assertRaises(ValueError, stand_in.response_for, 'http://elsewhere.test/', False)
+
+    def test_should_inject_errors_and_timeouts(self):
+        stand_in = upstreams.StandIn(self.recordings, faults=faults.Faults(error_rate=1.0, seed=7))
+        self.assertEquals(stand_in.answer(CAPI_URL, False, 5)[0], 503)
+
+        stand_in = upstreams.StandIn(self.recordings, faults=faults.Faults(timeout_rate=1.0, seed=7))
+        started = time.time()
+        self.assertEquals(stand_in.answer(CAPI_URL, False, 0.05), None)
+        self.assertTrue(time.time() - started >= 0.05)
+        self.assertEquals((stand_in.faulted, stand_in.calls), (1, {}))
+
+
+class TestUpstreamStub(unittest.TestCase):
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_urlfetch_stub()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+        shutil.rmtree(self.directory)
+
+    def install(self, injected):
+        return upstreams.install(upstreams.Recordings(self.directory), faults=injected)
+
+    def test_a_timeout_should_reach_urlfetch_as_an_exceeded_deadline(self):
+        self.install(faults.Faults(timeout_rate=1.0, seed=7))
+
+        self.assertRaises(urlfetch.DeadlineExceededError, urlfetch.fetch, CAPI_URL, deadline=0.05)
+
+    def test_calls_made_together_should_overlap(self):
+        stub = self.install(faults.Faults(latency=0.2, seed=7))
+
+        started = time.time()
+        rpcs = []
+        for index in range(5):
+            rpc = urlfetch.create_rpc(deadline=5)
+            urlfetch.make_fetch_call(rpc, CAPI_URL + '&page={0}'.format(index), headers={'Accept-Encoding': 'gzip'})
+            rpcs.append(rpc)
+        statuses = [rpc.get_result().status_code for rpc in rpcs]
+
+        self.assertEquals(statuses, [200] * 5)
+        self.assertTrue(time.time() - started < 0.6)
+        self.assertEquals(stub.calls, {'capi': 5})
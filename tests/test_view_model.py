@@ -0,0 +1,92 @@
+import copy
+import json
+import unittest
+
+import tags
+import template_filters
+from guardianapi import view_model
+
+def asset(width):
+    return {'file': 'http://media.guim.co.uk/%s.jpg' % width,
+        'typeData': {'width': str(width), 'height': str(width * 3 / 5), 'altText': 'alt %s' % width}}
+
+def content_item():
+    return {
+        'id': 'world/2016/jan/01/story',
+        'tags': [
+            {'id': 'tone/news', 'type': 'tone', 'webTitle': 'News'},
+            {'id': 'world/world', 'type': 'keyword', 'webTitle': 'World news', 'sectionId': 'world'},
+            {'id': 'world/france', 'type': 'keyword', 'webTitle': 'France', 'sectionId': 'world'},
+            {'id': 'tone/comment', 'type': 'tone', 'webTitle': 'Comment'},
+        ],
+        'elements': [
+            {'relation': 'body', 'assets': [asset(2000)]},
+            {'relation': 'thumbnail', 'assets': [asset(140), asset(500), asset(1000), asset(2000)]},
+        ],
+    }
+
+class TestViewModel(unittest.TestCase):
+
+    def test_should_index_tags_and_pick_the_tone_and_keyword(self):
+        view = view_model.view(content_item())
+
+        self.assertEquals(view['tags']['world/france'], 'keyword')
+        self.assertEquals(view['tone'], 'tone/comment')
+        self.assertEquals(view['keyword'], 'France')
+
+    def test_filters_should_read_the_view(self):
+        item = content_item()
+
+        self.assertEquals(template_filters.get_tone(item), 'tone/comment')
+        self.assertEquals(template_filters.get_tone(item, is_container=True), 'Article')
+        self.assertEquals(template_filters.get_keyword(dict(content_item(), tags=[])), 'Article')
+        self.assertTrue(tags.has_tag('world/france', item))
+        self.assertFalse(tags.has_tag('world/iraq', item))
+
+    def test_should_pick_the_same_images_as_before(self):
+        item = content_item()
+
+        self.assertEquals(template_filters.get_image(item, max_width=600), asset(500))
+        self.assertEquals(template_filters.get_image(item, image_type='main'), None)
+        self.assertEquals(template_filters.image_of_width(item, 1000), asset(1000))
+        self.assertEquals(template_filters.image_of_width(item, 620), None)
+
+    def test_should_pick_as_pick_image_would_for_any_max_width(self):
+        item = view_model.normalise(content_item())
+        assets = item['elements'][1]['assets']
+
+        for max_width in [None, 0, 1, 139, 140, 141, 499, 500, 999, 1000, 1999, 2000, 5000]:
+            self.assertEquals(view_model.image(item, 'thumbnail', max_width),
+                assets[view_model.pick_image(assets, max_width)])
+
+    def test_should_not_change_items_it_reads(self):
+        cached = view_model.normalise(content_item())
+        stale = dict(content_item(), _view={'version': 0})
+        before = (copy.deepcopy(cached), copy.deepcopy(stale))
+
+        template_filters.get_image(cached, max_width=600)
+        template_filters.get_image(stale, max_width=600)
+        template_filters.image_of_width(cached, 1000)['typeData']['width'] = 'changed'
+
+        self.assertEquals((cached, stale), before)
+
+    def test_should_find_the_video_poster(self):
+        item = dict(content_item(), elements=[{'relation': 'main', 'assets': [asset(140), asset(480), asset(1000)]}])
+        self.assertEquals(template_filters.get_video_assets(item), {'file': asset(480)['file'], 'alt_text': 'alt 480'})
+
+        atom = {'data': {'media': {'title': 'Video', 'posterImage': {'assets': [asset(700)]}}}}
+        item = dict(content_item(), elements=[], atoms={'media': [atom]})
+        self.assertEquals(template_filters.get_video_assets(item), {'file': asset(700)['file'], 'alt_text': 'Video'})
+
+        self.assertRaises(ValueError, template_filters.get_video_assets, dict(content_item(), elements=[], atoms={}))
+
+    def test_should_keep_the_view_through_json(self):
+        item = json.loads(json.dumps(view_model.normalise(content_item())))
+
+        self.assertEquals(item[view_model.VIEW_KEY], view_model.build_view(content_item()))
+        self.assertEquals(template_filters.get_image(item, max_width=1200), asset(500))
+
+    def test_should_rebuild_views_of_an_older_version(self):
+        item = dict(content_item(), _view={'version': 0})
+
+        self.assertEquals(view_model.view(item)['tone'], 'tone/comment')
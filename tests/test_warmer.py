@@ -0,0 +1,60 @@
+import datetime
+import unittest
+
+import webapp2
+from google.appengine.ext import testbed
+
+import warmer
+from handlers import EmailTemplate
+
+class SydneyEmail(EmailTemplate):
+    recognized_versions = ['v1', 'v2']
+    send_time = '06:00'
+    send_timezone = 'Australia/Sydney'
+
+class UnscheduledEmail(EmailTemplate):
+    recognized_versions = ['v1']
+
+app = webapp2.WSGIApplication([('/sydney/(.+)', SydneyEmail),
+                               ('/unscheduled/(.+)', UnscheduledEmail),
+                               ('/tasks/warm-pages', warmer.WarmPages)])
+
+class TestWarmer(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub()
+        self.taskqueue = self.testbed.get_stub(testbed.TASKQUEUE_SERVICE_NAME)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_sends_follow_daylight_saving(self):
+        # Sydney is UTC+10 in June and UTC+11 in January
+        self.assertEquals(warmer.next_send('06:00', 'Australia/Sydney', datetime.datetime(2016, 6, 30, 19, 0)),
+            datetime.datetime(2016, 6, 30, 20, 0))
+        self.assertEquals(warmer.next_send('06:00', 'Australia/Sydney', datetime.datetime(2016, 1, 14, 18, 0)),
+            datetime.datetime(2016, 1, 14, 19, 0))
+
+    def test_the_next_send_is_tomorrow_once_today_has_gone(self):
+        self.assertEquals(warmer.next_send('06:00', 'Europe/London', datetime.datetime(2016, 12, 1, 6, 1)),
+            datetime.datetime(2016, 12, 2, 6, 0))
+
+    def test_every_version_of_an_email_about_to_be_sent_is_due(self):
+        pages = warmer.due_pages(app, datetime.datetime(2016, 6, 30, 19, 50), lead_time=15 * 60)
+
+        self.assertEquals(sorted(url for url, send in pages), ['/sydney/v1', '/sydney/v2'])
+        self.assertEquals(warmer.due_pages(app, datetime.datetime(2016, 6, 30, 19, 30), lead_time=15 * 60), [])
+
+    def test_each_page_is_queued_once_per_send(self):
+        send = datetime.datetime(2016, 6, 30, 20, 0)
+
+        self.assertTrue(warmer.queue_warming('/sydney/v1', send))
+        self.assertFalse(warmer.queue_warming('/sydney/v1', send))
+        self.assertTrue(warmer.queue_warming('/sydney/v1', send + datetime.timedelta(days=1)))
+
+        tasks = self.taskqueue.get_filtered_tasks(queue_names=[warmer.WARM_QUEUE])
+        self.assertEquals(len(tasks), 2)
+        self.assertEquals(tasks[0].url, '/sydney/v1?warm=1')
+        self.assertEquals(tasks[0].method, 'GET')
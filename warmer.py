@@ -0,0 +1,95 @@
+"""
+Renders every version of an email into the page cache shortly before it
+is sent, so that the scrapes of a send find the pages already cached
+instead of the first scrape of each version rendering it under load.
+
+A cron requests WarmPages every few minutes. For each email whose send
+time falls within the lead time it queues a task per version, named after
+the send so that a page is warmed once per send however often the cron
+runs. The task requests the page itself with warm=1, which renders it
+afresh and caches it for the whole send (see EmailTemplate.is_warming).
+"""
+
+import re
+import logging
+import datetime
+
+import pytz
+import webapp2
+
+from google.appengine.api import taskqueue
+
+import defaults
+import handlers
+
+WARM_QUEUE = 'default'
+
+def email_routes(app):
+	"""
+	The url pattern and handler of every email route of the app.
+	"""
+	for route in app.router.match_routes:
+		handler = getattr(route, 'handler', None)
+		if isinstance(route, webapp2.SimpleRoute) and isinstance(handler, type) and issubclass(handler, handlers.EmailTemplate):
+			yield route.template, handler
+
+def next_send(send_time, timezone, now):
+	"""
+	The first send at or after now for an email sent daily at send_time
+	('HH:MM') local time in timezone. Times are naive UTC datetimes.
+	"""
+	zone = pytz.timezone(timezone)
+	hour, minute = [int(part) for part in send_time.split(':')]
+	today = pytz.utc.localize(now).astimezone(zone).date()
+
+	for days in (0, 1):
+		day = today + datetime.timedelta(days=days)
+		send = zone.localize(datetime.datetime(day.year, day.month, day.day, hour, minute))
+		send = send.astimezone(pytz.utc).replace(tzinfo=None)
+
+		if send >= now:
+			return send
+
+def due_pages(app, now, lead_time=defaults.WARM_LEAD_TIME):
+	"""
+	(url, send) for every version of every email sent within lead_time
+	seconds of now.
+	"""
+	pages = []
+
+	for pattern, handler in email_routes(app):
+		if not handler.send_time:
+			continue
+
+		send = next_send(handler.send_time, handler.send_timezone, now)
+
+		if send - now <= datetime.timedelta(seconds=lead_time):
+			pages.extend((pattern.replace('(.+)', version), send) for version in handler.recognized_versions)
+
+	return pages
+
+def task_name(url, send):
+	return 'warm{0}-{1}'.format(re.sub(r'[^a-zA-Z0-9_-]', '-', url), send.strftime('%Y%m%d%H%M'))
+
+def queue_warming(url, send):
+	"""
+	Queues the task that warms a page for a send, returning False if it
+	has already been queued.
+	"""
+	try:
+		taskqueue.add(url=url, method='GET', params={'warm': '1'}, name=task_name(url, send), queue_name=WARM_QUEUE)
+	except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+		return False
+
+	return True
+
+
+class WarmPages(webapp2.RequestHandler):
+	def get(self):
+		queued = [url for url, send in due_pages(self.app, datetime.datetime.utcnow()) if queue_warming(url, send)]
+
+		if queued:
+			logging.info('Queued warming of %s' % ', '.join(queued))
+
+		self.response.headers['Content-Type'] = 'text/plain'
+		self.response.out.write('\n'.join(queued))